@@ -38,12 +38,15 @@
 
 # Code:
 
+import os
+import sys
 from parsers import parser
 from exprs import expr_transforms
 from verifiers import verifiers
 from termsolvers import termsolvers
 from utils import lia_massager
 from utils import utils
+from utils import bitsets
 from termsolvers import termsolvers_lia
 from core import specifications
 from unifiers import unifiers
@@ -55,6 +58,14 @@ from exprs import exprtypes
 from semantics import semantics_core
 from core import grammars
 
+# Print the clause statistics of the specification (see
+# specifications.ClauseStatistics) once the benchmark is solved
+show_clause_statistics = os.environ.get('EUSOLVER_CLAUSE_STATISTICS', '0') != '0'
+
+# Print the size of the signature index of the generator factory (see
+# enumerators.SignatureIndex) once the benchmark is solved
+show_signature_statistics = os.environ.get('EUSOLVER_SIGNATURE_STATISTICS', '0') != '0'
+
 def get_pbe_valuations(constraints, synth_fun):
     valuations = []
     for constraint in constraints:
@@ -191,6 +202,23 @@ def full_lia_grammars(grammar_map):
             return False, None
     return True, massaging
 
+def set_output_substring_pruning(generator_factory, grammar, specification, start=None):
+    """For PBE specifications with string outputs, makes the generator
+    factory drop the terms of the string non-terminals of grammar that no
+    operator can shrink again and that are not substrings of the expected
+    output on any point. start is the name the start non-terminal has in
+    the grammars given to the factory, if it was renamed."""
+    if not isinstance(specification, specifications.PBESpec):
+        return
+    if specification.synth_fun.range_type != exprtypes.StringType():
+        return
+    nts = grammar.output_substring_non_terminals()
+    if start is not None and grammar.start in nts:
+        nts.remove(grammar.start)
+        nts.add(start)
+    generator_factory.set_output_substring_pruning(
+            grammars.nts_to_generator_names(nts), specification)
+
 class UnsuitableSolverException(Exception):
     def __init__(self, message):
         self.message = message
@@ -242,6 +270,7 @@ def std_unification_solver(theory, syn_ctx, synth_funs, grammar_map, specificati
     term_grammar, pred_grammar, reverse_mapping = decomposed_grammar
 
     generator_factory = enumerators.PointDistinctGeneratorFactory(specification)
+    set_output_substring_pruning(generator_factory, grammar, specification, term_grammar.start)
     term_generator = term_grammar.to_generator(generator_factory)
     pred_generator = pred_grammar.to_generator(generator_factory)
     solver = solvers.Solver(syn_ctx)
@@ -256,6 +285,8 @@ def std_unification_solver(theory, syn_ctx, synth_funs, grammar_map, specificati
             verify_term_solve=True
             )
     solution = next(solutions)
+    if show_signature_statistics:
+        print_signature_statistics(generator_factory)
     final_solution = rewrite_solution([synth_fun], solution, reverse_mapping)
     return final_solution
 
@@ -270,6 +301,7 @@ def classic_esolver(theory, syn_ctx, synth_funs, grammar_map, specification, ver
 
     TermSolver = termsolvers.PointDistinctTermSolver
     grammar = grammar_map[synth_funs[0]]
+    set_output_substring_pruning(generator_factory, grammar, specification)
     term_generator = grammar.to_generator(generator_factory)
 
     term_solver = TermSolver(specification.term_signature, term_generator)
@@ -288,6 +320,9 @@ def classic_esolver(theory, syn_ctx, synth_funs, grammar_map, specification, ver
         solution = next(solutions)
     except StopIteration:
         return "NO SOLUTION"
+    finally:
+        if show_signature_statistics:
+            print_signature_statistics(generator_factory)
     rewritten_solutions = rewrite_solution(synth_funs, solution, reverse_mapping=None)
     return rewritten_solutions
 
@@ -385,6 +420,36 @@ def make_solver(file_sexp):
         # print("Unable to solve!")
         pass
 
+    if show_clause_statistics:
+        print_clause_statistics(specification)
+
+def print_clause_statistics(specification):
+    """Prints, to stderr, how often each clause of the specification (each
+    example, for PBE specifications) was checked and how often it failed,
+    most often failing first, and how often the specification found the
+    values of the applications of the functions being synthesized in its
+    memo (see evaluation.ApplicationMemo), if it has one."""
+    for clause, checks, failures in specification.get_clause_statistics().get_statistics():
+        if exprs.is_expression(clause):
+            clause_string = exprs.expression_to_string(clause)
+        else:
+            clause_string = ' '.join([ str(v.value_object) for v in clause ])
+        print('%d/%d\t%s' % (failures, checks, clause_string), file=sys.stderr)
+    if isinstance(specification, specifications.FormulaSpec):
+        memo = specification.get_application_memo()
+        if memo is not None:
+            print('%d hits, %d misses\tapplication memo' % (memo.hits, memo.misses),
+                  file=sys.stderr)
+
+def print_signature_statistics(generator_factory):
+    """Prints, to stderr, the number of distinct signatures of the terms of
+    each placeholder of the generator factory, and the approximate memory
+    used to index them."""
+    usage = generator_factory.signature_memory_usage()
+    for placeholder, (num_signatures, num_bytes) in sorted(usage.items()):
+        print('%d signatures, %d bytes\t%s' % (num_signatures, num_bytes, placeholder),
+              file=sys.stderr)
+
 def print_solutions(synth_funs, final_solutions):
     for sf, sol in zip(synth_funs, final_solutions):
         fp_infos = []
@@ -436,7 +501,15 @@ def find_grammar_anamolies():
 
 
 if __name__ == "__main__":
-    import sys
-    benchmark_files = sys.argv[1:]
+    benchmark_files = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--bitset-backend='):
+            bitsets.set_backend(arg[len('--bitset-backend='):])
+        elif arg == '--clause-statistics':
+            show_clause_statistics = True
+        elif arg == '--signature-statistics':
+            show_signature_statistics = True
+        else:
+            benchmark_files.append(arg)
     test_make_solver(benchmark_files)
     # find_grammar_anamolies()
@@ -49,6 +49,11 @@ from enumerators import enumerators
 def _nt_to_generator_name(nt):
     return nt + '_Generator'
 
+def nts_to_generator_names(nts):
+    """The identifiers of the placeholders that to_generator() makes for
+    the given non-terminals in a generator factory."""
+    return [ _nt_to_generator_name(nt) for nt in nts ]
+
 class RewriteBase(object):
     def __init__(self, type):
         self.type = type
@@ -508,6 +513,42 @@ class Grammar(object):
                     for rew in rewrites ]
         return Grammar(new_nts, new_nt_type, new_rules)
 
+    def output_substring_non_terminals(self):
+        """Returns the string non-terminals whose values are substrings of the
+        value of the start non-terminal in every term: the ones that (are
+        the start, or) only occur as arguments of str.++ or branches of
+        ites in rules of such non-terminals, so that no operator of the
+        grammar can shrink their values again. Empty if the start
+        non-terminal is not a string."""
+        string_type = exprtypes.StringType()
+        if self.nt_type.get(self.start) != string_type:
+            return set()
+
+        # (non-terminal, the non-terminal whose value it is a substring of,
+        # or None) for every occurrence of a non-terminal in a rule
+        occurrences = []
+        def add_occurrences(rewrite, nt, preserved):
+            if type(rewrite) == NTRewrite:
+                occurrences.append((rewrite.non_terminal, nt if preserved else None))
+            elif type(rewrite) == FunctionRewrite:
+                function_name = rewrite.function_info.function_name
+                for i, child in enumerate(rewrite.children):
+                    add_occurrences(child, nt, preserved and
+                            (function_name == 'str.++' or (function_name == 'ite' and i > 0)))
+        for nt in self.non_terminals:
+            for rewrite in self.rules[nt]:
+                add_occurrences(rewrite, nt, True)
+
+        result = set([ nt for nt in self.non_terminals if self.nt_type[nt] == string_type ])
+        changed = True
+        while changed:
+            changed = False
+            for nt, outer_nt in occurrences:
+                if nt in result and outer_nt not in result:
+                    result.remove(nt)
+                    changed = True
+        return result
+
     # Quick and dirty for now
     def decompose(self, macro_instantiator):
         start_nt = self.start
@@ -596,3 +637,28 @@ class Grammar(object):
         return term_grammar, pred_grammar, reverse_mapping
 
 # Tests:
+
+def test_output_substring_non_terminals():
+    from parsers import parser
+    benchmark = '''
+    (set-logic SLIA)
+    (synth-fun f ((x String) (y String)) String
+        ((Start String (ntString (ite ntBool ntString Start)))
+         (ntString String (x y " " (str.++ ntString ntString) %s))
+         (ntInt Int (0 1 (str.len x)))
+         (ntBool Bool ((str.contains x y) %s))))
+    (constraint (= (f "a" "b") "a b"))
+    (check-synth)
+    '''
+    # (string rule, bool rule, whether the terms of ntString can be pruned)
+    cases = [ ('', '', True),
+              ('(str.replace ntString ntString ntString)', '', False),
+              ('(str.substr ntString ntInt ntInt)', '', False),
+              ('', '(str.prefixof ntString y)', False) ]
+    for (string_rule, bool_rule, prunable) in cases:
+        file_sexp = parser.sexpFromString(benchmark % (string_rule, bool_rule))
+        grammar_map = parser.extract_benchmark(file_sexp)[6]
+        [ grammar ] = grammar_map.values()
+        nts = grammar.output_substring_non_terminals()
+        assert 'Start' in nts and ('ntString' in nts) == prunable, (string_rule, bool_rule, nts)
+    print('Checked the output substring non-terminals of %d grammars.' % len(cases))
@@ -40,9 +40,16 @@
 
 from utils import basetypes
 from exprs import evaluation
+from exprs import batch_evaluation
+from exprs import compilation
 from exprs import expr_transforms
 from exprs import exprs
 
+# With fewer points than this, the fixed cost of the numpy operations of a
+# batch evaluation of the clauses is more than that of evaluating the
+# residual clauses point by point
+_min_batch_points = 128
+
 class SpecInterface(object):
     def term_signature(self, term, points):
         raise basetypes.AbstractMethodError('SpecInterface.check_on_point()')
@@ -50,35 +57,261 @@ class SpecInterface(object):
     def is_pointwise(self):
         return not self.is_multipoint
 
+class ClauseStatistics(object):
+    """Per clause counts of checks and failures for a specification that is a
+    conjunction of clauses (or, for a PBE specification, a set of examples),
+    kept over the whole run.  The clauses are checked most often failing
+    first, and checking stops at the first clause that fails, so the order
+    is the clause indices sorted by decreasing failure rate, ties broken by
+    the position of the clause in the specification."""
+    def __init__(self, clauses):
+        self.clauses = clauses
+        self.checks = [0] * len(clauses)
+        self.failures = [0] * len(clauses)
+        self.ordering = list(range(len(clauses)))
+        self.ranks = list(range(len(clauses)))
+        # bumped every time the ordering changes, so that users can tell
+        # when anything they keep sorted by it is stale
+        self.version = 0
+
+    def record(self, index, holds):
+        self.checks[index] += 1
+        if not holds:
+            self.failures[index] += 1
+
+    def failure_rate(self, index):
+        checks = self.checks[index]
+        if checks == 0:
+            return 0.0
+        return self.failures[index] / checks
+
+    def update_ordering(self):
+        """Sorts the clauses by the statistics gathered so far and returns
+        the ordering."""
+        ordering = sorted(range(len(self.clauses)),
+                          key=lambda i: (-self.failure_rate(i), i))
+        if ordering != self.ordering:
+            self.ordering = ordering
+            for rank, index in enumerate(ordering):
+                self.ranks[index] = rank
+            self.version += 1
+        return self.ordering
+
+    def get_statistics(self):
+        """Returns a (clause, checks, failures) tuple for every clause, in the
+        order the clauses are currently checked in."""
+        return [ (self.clauses[i], self.checks[i], self.failures[i])
+                 for i in self.ordering ]
+
 class FormulaSpec(SpecInterface):
     def __init__(self, spec_expr, syn_ctx, synth_funs):
         self.syn_ctx = syn_ctx
         self.eval_ctx = evaluation.EvaluationContext()
         self.synth_funs = synth_funs
         self.spec_expr = spec_expr
+        # The raw values of the points of the last point list seen (the
+        # term solvers pass in the same, growing, list over and over), the
+        # residual clauses at each of them, and the version of the clause
+        # ordering they are sorted by
+        self.points_cache = (None, [], [], None)
+        self.synth_dependence = {}
+        # The batch evaluation columns of the last point list seen
+        self.columns_cache = (None, 0, None)
+        self.clause_statistics = None
+        # Set to an evaluation.ApplicationMemo to memoize the applications of
+        # the functions being synthesized within each term_signature() call
+        self.application_memo = None
 
-    def term_signature(self, term, points):
+    def _init_clauses(self):
+        """Splits the canonical specification into its top level conjuncts,
+        the clauses that are checked in adaptive order (see
+        ClauseStatistics)."""
+        if exprs.is_application_of(self.canon_spec, 'and'):
+            clauses = list(self.canon_spec.children)
+        else:
+            clauses = [ self.canon_spec ]
+        self.clause_statistics = ClauseStatistics(clauses)
+
+    def get_clause_statistics(self):
+        return self.clause_statistics
+
+    def get_application_memo(self):
+        return self.application_memo
+
+    def _residual_clauses(self, point):
+        """The clauses at the point, with all the subterms that do not depend
+        on the functions being synthesized folded into constants, as
+        (clause index, residual, compiled residual) triples, the compiled
+        residual being None if it cannot be compiled.  Clauses that hold at
+        the point whatever the functions being synthesized are left out, and
+        a clause that fails at the point whatever they are is the only one
+        kept."""
+        retval = []
+        for index, clause in enumerate(self.clause_statistics.clauses):
+            residual = expr_transforms.fold_synth_free_subterms(clause, point, self.eval_ctx,
+                                                                self.synth_dependence)
+            if residual.expr_kind == exprs.ExpressionKinds.constant_expression:
+                if residual.value_object.value_object:
+                    continue
+                return [ (index, residual, compilation.compile_expression(residual)) ]
+            retval.append((index, residual, compilation.compile_expression(residual)))
+        return retval
+
+    def _point_data(self, points):
+        (cached_points, raw_points, residuals, version) = self.points_cache
+        if cached_points is not points or len(raw_points) > len(points):
+            raw_points = []
+            residuals = []
+        num_sorted = len(residuals)
+        for point in points[len(raw_points):]:
+            raw_points.append(compilation.raw_point(point))
+            residuals.append(self._residual_clauses(point))
+
+        statistics = self.clause_statistics
+        if version != statistics.version:
+            num_sorted = 0
+        ranks = statistics.ranks
+        for residual_clauses in residuals[num_sorted:]:
+            residual_clauses.sort(key=lambda c: ranks[c[0]])
+        self.points_cache = (points, raw_points, residuals, statistics.version)
+        return (raw_points, residuals)
+
+    def _compiled_term_signature(self, interpretations, raw_points, residuals):
+        compiled_interpretations = compilation.compile_interpretations(self.synth_funs,
+                                                                       interpretations,
+                                                                       self.application_memo)
+        if compiled_interpretations is None:
+            return None
+
+        # The spec does not hold where it is undefined, whether that is
+        # signalled by poison or by an exception
+        undefined_value = evaluation.undefined_value
+        statistics = self.clause_statistics
+        checks = statistics.checks
+        failures = statistics.failures
+        retval = []
+        for raw_point, residual_clauses in zip(raw_points, residuals):
+            r = True
+            for (index, _, compiled_residual) in residual_clauses:
+                checks[index] += 1
+                try:
+                    r = compiled_residual(raw_point, compiled_interpretations)
+                except (basetypes.PartialFunctionError, basetypes.UnboundLetVariableError):
+                    r = False
+                if r is undefined_value or not r:
+                    failures[index] += 1
+                    r = False
+                    break
+            retval.append(r)
+        return retval
+
+    def _interpreted_term_signature(self, interpretations, points, residuals):
         eval_ctx = self.eval_ctx
+        for func, interpretation in zip(self.synth_funs, interpretations):
+            eval_ctx.set_interpretation(func, interpretation)
+
+        statistics = self.clause_statistics
+        retval = []
+        for point, residual_clauses in zip(points, residuals):
+            eval_ctx.set_valuation_map(point)
+            r = True
+            for (index, residual, _) in residual_clauses:
+                try:
+                    r = evaluation.evaluate_expression_raw(residual, eval_ctx)
+                except (basetypes.PartialFunctionError, basetypes.UnboundLetVariableError):
+                    # Exceptions may be raised when applying partial functions like div, mod, etc
+                    r = False
+                statistics.record(index, r)
+                if not r:
+                    break
+            retval.append(r)
+        return retval
+
+    def _batch_term_signature(self, interpretations, points):
+        """Evaluates the clauses, with the interpretations inlined, on all the
+        points at once (see exprs.batch_evaluation), each clause only on the
+        points where the ones before it hold.  Returns None if any of them
+        cannot be evaluated this way, or if there are too few points for it
+        to pay off."""
+        if len(points) < _min_batch_points:
+            return None
+        (cached_points, num_points, columns) = self.columns_cache
+        if cached_points is not points or num_points != len(points):
+            columns = batch_evaluation.make_columns(points)
+            self.columns_cache = (points, len(points), columns)
+        if columns is None:
+            return None
+
+        interpretation_map = dict([ (f.unknown_function_id, i)
+                                    for (f, i) in zip(self.synth_funs, interpretations) ])
+        statistics = self.clause_statistics
+        numpy = batch_evaluation.numpy
+        holds = numpy.ones(len(points), dtype=numpy.bool_)
+        counts = []
+        for index in statistics.ordering:
+            num_checked = int(numpy.count_nonzero(holds))
+            if num_checked == 0:
+                break
+            clause = expr_transforms.inline_interpretations(statistics.clauses[index],
+                                                            interpretation_map)
+            if clause is None:
+                return None
+            if num_checked == len(points):
+                clause_columns = columns
+            else:
+                clause_columns = [ c[holds] if c is not None else None for c in columns ]
+            evaluated = batch_evaluation.evaluate_expression_batch_with_definedness(clause,
+                    clause_columns, num_checked)
+            if evaluated is None:
+                return None
+            (values, defined) = evaluated
+            if defined is not None:
+                # The spec does not hold where it is undefined
+                values = values & defined
+            holds[holds] = values
+            counts.append((index, num_checked, num_checked - int(numpy.count_nonzero(values))))
+
+        for (index, num_checked, num_failed) in counts:
+            statistics.checks[index] += num_checked
+            statistics.failures[index] += num_failed
+        return holds.tolist()
+
+    def term_signature(self, term, points):
+        """Evaluates the clauses on all the points at once if they can be
+        batch evaluated (see _batch_term_signature()), and otherwise, at
+        each point, only the residual clauses there (see
+        _residual_clauses()), so the cost per term is that of the
+        applications of the functions being synthesized.  The clauses are
+        checked in the order kept by the clause statistics, up to the first
+        one that fails.  If there is an application memo, the values of the
+        applications of the functions being synthesized are shared by all
+        the points, for the duration of the call."""
         if len(self.synth_funs) > 1:
             assert exprs.is_application_of(term, ',')
             interpretations = term.children
-            for func, interpretation in zip(self.synth_funs, interpretations):
-                eval_ctx.set_interpretation(func, interpretation)
         else:
-            eval_ctx.set_interpretation(self.synth_funs[0], term)
+            interpretations = (term,)
 
-        retval = []
-        for point in points:
-            eval_ctx.set_valuation_map(point)
+        retval = self._batch_term_signature(interpretations, points)
+        if retval is None:
+            (raw_points, residuals) = self._point_data(points)
+            if all([ compiled is not None
+                     for residual_clauses in residuals
+                     for (_, _, compiled) in residual_clauses ]):
+                retval = self._compiled_term_signature(interpretations, raw_points,
+                                                       residuals)
+        if retval is None:
+            memo = self.application_memo
+            if memo is not None:
+                memo.clear()
+            self.eval_ctx.application_memo = memo
             try:
-                r = evaluation.evaluate_expression_raw(self.canon_spec, eval_ctx)
-                # print(exprs.expression_to_string(term), "is", r, "on", [ p.value_object for p in point ])
-                # print(eval_ctx.eval_stack_top)
-                retval.append(r)
-            except (basetypes.PartialFunctionError, basetypes.UnboundLetVariableError):
-                # Exceptions may be raised when applying partial functions like div, mod, etc
-                retval.append(False)
-
+                retval = self._interpreted_term_signature(interpretations, points, residuals)
+            finally:
+                self.eval_ctx.application_memo = None
+                if memo is not None:
+                    memo.clear()
+        self.clause_statistics.update_ordering()
         return retval
 
     def get_canonical_specification(self):
@@ -91,6 +324,10 @@ class MultiPointSpec(FormulaSpec):
         super().__init__(spec_expr, syn_ctx, synth_funs)
         self.point_vars, self.canon_spec = \
                 expr_transforms.canonicalize_multipoint_specification(spec_expr, syn_ctx)
+        self._init_clauses()
+        # The spec applies the functions being synthesized several times per
+        # point, and often to the same arguments at different points
+        self.application_memo = evaluation.ApplicationMemo()
         self.is_multipoint = True
 
     def get_point_variables(self):
@@ -127,6 +364,7 @@ class StandardSpec(FormulaSpec):
         self.intro_vars = intro_vars
         self.point_vars = variables_list
         self.canon_clauses = canon_clauses
+        self._init_clauses()
 
         self.canon_application = {}
         for fun in self.synth_funs:
@@ -148,10 +386,6 @@ class PBESpec(SpecInterface):
         self.eval_ctx = evaluation.EvaluationContext()
         
         self._initialize_valuations(expr_valuations)
-
-        args = [ exprs.FormalParameterExpression(synth_fun, argtype, i) 
-                for i, argtype in enumerate(synth_fun.domain_types)] 
-        self.synth_fun_expr = exprs.FunctionExpression(synth_fun, tuple(args))
         self.is_multipoint = False
 
     def _initialize_valuations(self, expr_valuations):
@@ -164,11 +398,73 @@ class PBESpec(SpecInterface):
             raw_value = evaluation.evaluate_expression_raw(value, eval_ctx)
             self.valuations[raw_args] = raw_value
 
+        # The examples are the clauses of a PBE specification: the verifier
+        # checks them in adaptive order
+        self.clause_statistics = ClauseStatistics(list(self.valuations.keys()))
+        self.ordered_examples = (None, None)
+
+        # Columnar copies of the valuations for batch evaluation
+        all_points = list(self.valuations.keys())
+        self.point_indices = dict([ (p, i) for i, p in enumerate(all_points) ])
+        self.batch_columns = batch_evaluation.make_columns(all_points)
+        self.batch_outputs = batch_evaluation.make_value_column(
+                [ self.valuations[p] for p in all_points ], self.synth_fun.range_type)
+        self.batch_points = None
+        self.batch_point_columns = None
+        self.batch_point_outputs = None
+
+    def get_clause_statistics(self):
+        return self.clause_statistics
+
+    def get_output(self, point):
+        """Returns the expected output at an example, None if the point is
+        not one."""
+        return self.valuations.get(point, None)
+
+    def get_ordered_examples(self):
+        """Returns the examples as (index, point, value) triples, in the
+        order the clause statistics currently check them in."""
+        statistics = self.clause_statistics
+        (version, examples) = self.ordered_examples
+        if version != statistics.version:
+            points = statistics.clauses
+            examples = [ (i, points[i], self.valuations[points[i]])
+                         for i in statistics.ordering ]
+            self.ordered_examples = (statistics.version, examples)
+        return examples
+
+    def _batch_term_signature(self, term, points):
+        if self.batch_columns is None or self.batch_outputs is None:
+            return None
+        if points is not self.batch_points or len(points) != len(self.batch_point_outputs):
+            try:
+                indices = [ self.point_indices[p] for p in points ]
+            except KeyError:
+                return None
+            self.batch_points = points
+            self.batch_point_columns = [ c[indices] if c is not None else None
+                    for c in self.batch_columns ]
+            self.batch_point_outputs = self.batch_outputs[indices]
+        evaluated = batch_evaluation.evaluate_expression_batch_with_definedness(term,
+                self.batch_point_columns, len(points))
+        if evaluated is None:
+            return None
+        (outputs, defined) = evaluated
+        matches = (outputs == self.batch_point_outputs)
+        if defined is not None:
+            # The term does not match the outputs where it is undefined
+            matches &= defined
+        return matches.tolist()
+
     def term_signature(self, term, points):
         # try:
-            eval_ctx = self.eval_ctx
-            eval_ctx.set_interpretation(self.synth_fun, term)
-            synth_fun_expr = self.synth_fun_expr
+            batch_retval = self._batch_term_signature(term, points)
+            if batch_retval is not None:
+                return batch_retval
+
+            # the term is over the formal parameters of the synth function,
+            # so it can be evaluated on the points directly
+            evaluate = compilation.make_point_evaluator(term, self.eval_ctx)
 
             retval = []
             for point in points:
@@ -176,9 +472,8 @@ class PBESpec(SpecInterface):
                     # print("Something is almost certainly wrong!")
                     retval.append(True)
                     continue
-                eval_ctx.set_valuation_map(point)
                 try:
-                    retval.append(self.valuations[point] == evaluation.evaluate_expression_raw(synth_fun_expr, eval_ctx))
+                    retval.append(self.valuations[point] == evaluate(point))
                 except (basetypes.PartialFunctionError, basetypes.UnboundLetVariableError):
                     retval.append(False)
 
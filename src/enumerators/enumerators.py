@@ -38,8 +38,11 @@
 
 # Code:
 
+import sys
+
 from utils import utils
 from exprs import evaluation
+from exprs import batch_evaluation
 from utils import basetypes
 from exprs import exprs
 from exprs import exprtypes
@@ -336,6 +339,99 @@ class PointDistinctGenerator(GeneratorBase):
         raise basetypes.UnhandledCaseError('PointDistinctGenerator.clone()')
 
 
+class SignatureIndex(object):
+    """The equivalence classes (terms with equal signatures) of the terms
+    generated for one placeholder. Each signature is stored in a packed
+    form: the raw bytes of a batch evaluated value vector (unless it holds
+    python ints), or a tuple of the values otherwise. A lookup is then a
+    hash probe, with an exact comparison of the packed signatures on hash
+    collisions, instead of a scan over every earlier signature.
+
+    Each class is a pair (signature, members), where the members are
+    (size, sequence number, term) triples and the first member is the
+    representative of the class. The other members (the duplicates) are
+    only retained if add() is asked to."""
+
+    def __init__(self):
+        self.classes = {}
+        self.key_bytes = 0
+
+    @staticmethod
+    def _make_key(signature):
+        if isinstance(signature, list):
+            if len(signature) > 0 and isinstance(signature[0], list):
+                return tuple([ tuple(s) for s in signature ])
+            return tuple(signature)
+        if isinstance(signature, tuple):
+            return signature
+        if signature.dtype == batch_evaluation.numpy.object_:
+            # integers too large for int64, the bytes are just pointers
+            return tuple(signature.tolist())
+        return signature.tobytes()
+
+    def add(self, signature, member, retain=True):
+        """Adds a term to the class of its signature. Returns True if the
+        term is the first one with this signature (and hence the
+        representative of a new class). A term that is not is only kept
+        with the class if retain is set."""
+        key = self._make_key(signature)
+        eq_class = self.classes.get(key, None)
+        if eq_class is not None:
+            if retain:
+                eq_class[1].append(member)
+            return False
+        self.classes[key] = (signature, [ member ])
+        self.key_bytes += sys.getsizeof(key)
+        return True
+
+    def add_class(self, signature, members):
+        key = self._make_key(signature)
+        assert key not in self.classes
+        self.classes[key] = (signature, members)
+        self.key_bytes += sys.getsizeof(key)
+
+    def drop_duplicates(self, min_size):
+        """Drops the duplicates of size min_size or more. Returns the number
+        of duplicates left."""
+        num_duplicates = 0
+        for (_, members) in self.classes.values():
+            members[1:] = [ m for m in members[1:] if m[0] < min_size ]
+            num_duplicates += len(members) - 1
+        return num_duplicates
+
+    def __contains__(self, signature):
+        return self._make_key(signature) in self.classes
+
+    def __len__(self):
+        return len(self.classes)
+
+    def memory_usage(self):
+        """Approximate number of bytes used by the index: the map, the
+        packed signatures, the member lists and the members, and the
+        duplicates (whose root nodes are only referenced from here), but
+        not the representatives and subterms, which the caches share."""
+        usage = sys.getsizeof(self.classes) + self.key_bytes
+        for (_, members) in self.classes.values():
+            usage += sys.getsizeof(members) + sum([ sys.getsizeof(m) for m in members ])
+            for (_, _, term) in members[1:]:
+                usage += sys.getsizeof(term)
+                if exprs.is_function_expression(term):
+                    usage += sys.getsizeof(term.children)
+        return usage
+
+
+# The number of duplicates (terms that are not representatives) that the
+# signature indices of a PointDistinctGeneratorFactory retain, to split
+# their classes on new points; beyond it, duplicates of the sizes being
+# generated are dropped, and those sizes are generated again on new points
+_max_retained_duplicates = 1 << 16
+
+def _concatenate_signatures(old_signature, new_signature):
+    if isinstance(old_signature, list):
+        return old_signature + new_signature
+    return batch_evaluation.numpy.concatenate((old_signature, new_signature))
+
+
 class PointDistinctGeneratorFactory(GeneratorFactoryBase):
     def __init__(self, spec):
         super().__init__()
@@ -345,6 +441,27 @@ class PointDistinctGeneratorFactory(GeneratorFactoryBase):
         self.base_generators = {}
         self.finished_generators = {}
         self.eval_ctx = evaluation.EvaluationContext()
+        self.batch_columns = None
+        self.value_lists = None
+        # Value vectors of the terms in the cache, keyed by id(term). The
+        # cache keeps these terms alive, so the ids are never reused while
+        # the entries are present.
+        self.term_values = {}
+        self.num_generated = 0
+        # The duplicates of this size or more are not retained (None if they
+        # all are), and the number that are
+        self.duplicate_size_bound = None
+        self.num_duplicates = 0
+        # Terms of these placeholders are dropped if their value on every
+        # point is not a substring of the expected output there, see
+        # set_output_substring_pruning()
+        self.output_substring_placeholders = frozenset()
+        self.output_spec = None
+        self.expected_outputs = []
+        # The pruned terms, as (placeholder, member, signature) triples, to
+        # check again on new points. They count towards the retained
+        # duplicates, and are dropped with them.
+        self.pruned = []
 
         if spec.is_multipoint:
             assert len(spec.synth_funs) == 1
@@ -353,7 +470,13 @@ class PointDistinctGeneratorFactory(GeneratorFactoryBase):
                 for child in app.children:
                     if exprs.find_application(child, spec.synth_funs[0].function_name) is not None:
                         raise Exception("Unable to form point out of forall variables")
+            # The profile of a point is the list of the argument tuples of
+            # the applications at it, given as indices into
+            # distinct_profiles, so that the argument tuples that several
+            # points (or applications) share are evaluated on once
             self.point_profiles = []
+            self.distinct_profiles = []
+            self.profile_indices = {}
         else:
             self.applications = None
             self.point_profiles = None
@@ -364,6 +487,31 @@ class PointDistinctGeneratorFactory(GeneratorFactoryBase):
         self.signatures = {}
         self.base_generators = {}
         self.finished_generators = {}
+        self.term_values = {}
+        self.pruned = []
+        self.duplicate_size_bound = None
+        self.num_duplicates = 0
+
+    def _retains_duplicates(self, size):
+        bound = self.duplicate_size_bound
+        return bound is None or size < bound
+
+    def _count_duplicate(self, size):
+        """Counts a retained duplicate of the given size. Past
+        _max_retained_duplicates, the duplicates of this size and more are
+        dropped, and not retained from then on."""
+        self.num_duplicates += 1
+        if self.num_duplicates > _max_retained_duplicates:
+            self.duplicate_size_bound = size
+            self.pruned = [ p for p in self.pruned if p[1][0] < size ]
+            self.num_duplicates = len(self.pruned) + sum([ index.drop_duplicates(size)
+                                                           for index in self.signatures.values() ])
+
+    def signature_memory_usage(self):
+        """Returns a map from placeholder identifiers to the number of
+        distinct signatures and the approximate memory used to store them."""
+        return dict([ (placeholder, (len(index), index.memory_usage()))
+                      for placeholder, index in self.signatures.items() ])
 
     def print_caches(self):
         # print('++++++++++++')
@@ -374,52 +522,235 @@ class PointDistinctGeneratorFactory(GeneratorFactoryBase):
                 # print(exprs.expression_to_string(term))
         # print('++++++++++++')
 
+    def set_output_substring_pruning(self, placeholders, spec):
+        """Drops the terms of the given placeholders whose value is not a
+        substring of the expected output of the PBE specification spec on
+        any of the points. The placeholders must be ones whose values are
+        substrings of the value of every term they occur in (see
+        Grammar.output_substring_non_terminals()), so such terms cannot be
+        part of a term that is correct on any point."""
+        self.output_substring_placeholders = frozenset(placeholders)
+        self.output_spec = spec
+        self.expected_outputs = [ spec.get_output(point) for point in self.points ]
+
+    def _is_output_substring(self, signature, expected_outputs=None):
+        if expected_outputs is None:
+            expected_outputs = self.expected_outputs
+        if len(expected_outputs) == 0:
+            return True
+        for value, output in zip(signature, expected_outputs):
+            if output is None or value in output:
+                return True
+        return False
+
     def add_points(self, points):
+        num_old_points = len(self.points)
         self.points.extend(points)
+        if self.output_spec is not None:
+            self.expected_outputs.extend([ self.output_spec.get_output(point) for point in points ])
         if self.applications is not None:
             for point in points:
                 self.eval_ctx.set_valuation_map(point)
                 point_profile = []
                 for app in self.applications:
                     profile = tuple([ evaluation.evaluate_expression(c, self.eval_ctx) for c in app.children ])
-                    point_profile.append(profile)
+                    if profile not in self.profile_indices:
+                        self.profile_indices[profile] = len(self.distinct_profiles)
+                        self.distinct_profiles.append(profile)
+                    point_profile.append(self.profile_indices[profile])
                 self.point_profiles.append(point_profile)
+        else:
+            self.batch_columns = batch_evaluation.make_columns(self.points)
+            self.value_lists = batch_evaluation.make_value_lists(self.points)
+        if num_old_points == 0:
+            self.clear_caches()
+        else:
+            self._extend_caches(num_old_points)
+
+    def _points_from(self, start):
+        """The points (and their columns and profiles) from index start on,
+        in the form expected by _compute_signature."""
+        return (self.points[start:],
+                None if self.batch_columns is None else
+                [ c[start:] if c is not None else None for c in self.batch_columns ],
+                None if self.value_lists is None else
+                [ l[start:] for l in self.value_lists ],
+                None if self.point_profiles is None else self.point_profiles[start:])
+
+    def _extend_caches(self, num_old_points):
+        """Extends the signatures of all the terms generated so far with their
+        values on the points from num_old_points on, instead of starting
+        the enumeration over. The equivalence classes that the new points
+        distinguish are split, and the smallest (then earliest generated)
+        term of every class becomes its representative. The caches and
+        generator states are kept for all sizes below the smallest one
+        whose representatives changed, and below the sizes whose duplicates
+        were not all retained; the other sizes are generated again: their
+        terms may have subterms (or, through nonterminal aliases,
+        alternatives) that were not representatives before. Pruned terms
+        that are output substrings on a new point are added back."""
+        new_points = self._points_from(num_old_points)
+        new_outputs = self.expected_outputs[num_old_points:]
+        bound = self.duplicate_size_bound
+
+        members = []
+        for placeholder, index in self.signatures.items():
+            for old_signature, eq_class in index.classes.values():
+                for member in eq_class:
+                    if bound is None or member[0] < bound:
+                        members.append((member, placeholder, old_signature, eq_class))
+        # Pruned terms are not in any class; their old signatures fail the
+        # pruning check, so they differ from those of all classes
+        members.extend([ (member, placeholder, old_signature, None)
+                         for (placeholder, member, old_signature) in self.pruned ])
+        # Subterms are smaller, and hence have their values on the new points
+        # computed before the terms containing them
+        members.sort(key=lambda m: (m[0][0], m[0][1]))
+
+        new_values = {}
+        new_classes = {}
+        still_pruned = []
+        for member, placeholder, old_signature, old_class in members:
+            term = member[2]
+            new_signature = self._compute_signature(term, new_points, new_values)
+            if new_signature is None:
+                continue
+            if old_class is None:
+                if not self._is_output_substring(new_signature, new_outputs):
+                    still_pruned.append((placeholder, member,
+                                         _concatenate_signatures(old_signature, new_signature)))
+                    continue
+                key = (placeholder, SignatureIndex._make_key(old_signature),
+                       SignatureIndex._make_key(new_signature))
+            else:
+                key = (id(old_class), SignatureIndex._make_key(new_signature))
+            if self.applications is None:
+                new_values[id(term)] = new_signature
+            new_class = new_classes.get(key, None)
+            if new_class is None:
+                new_class = (placeholder, _concatenate_signatures(old_signature, new_signature), [])
+                new_classes[key] = new_class
+            new_class[2].append(member)
+
+        old_reps = [ eq_class[0] for index in self.signatures.values()
+                     for (_, eq_class) in index.classes.values() ]
+        new_reps = [ eq_class[0] for (_, _, eq_class) in new_classes.values() ]
+        old_rep_ids = set([ id(rep[2]) for rep in old_reps ])
+        new_rep_ids = set([ id(rep[2]) for rep in new_reps ])
+        changed_sizes = ([ size for (size, _, term) in old_reps if id(term) not in new_rep_ids ] +
+                         [ size for (size, _, term) in new_reps if id(term) not in old_rep_ids ])
+        if bound is not None:
+            changed_sizes.append(bound)
+        first_changed_size = min(changed_sizes) if len(changed_sizes) > 0 else None
+
+        old_cache = self.cache
+        old_base_generators = self.base_generators
+        old_finished_generators = self.finished_generators
+        placeholders = list(self.signatures.keys())
         self.clear_caches()
+        for placeholder in placeholders:
+            self.signatures[placeholder] = SignatureIndex()
+        for cache_key in old_cache:
+            if first_changed_size is None or cache_key[1] < first_changed_size:
+                self.cache[cache_key] = []
+                self.base_generators[cache_key] = old_base_generators[cache_key]
+                self.finished_generators[cache_key] = old_finished_generators[cache_key]
+
+        for placeholder, signature, eq_class in new_classes.values():
+            if first_changed_size is not None:
+                eq_class = [ m for m in eq_class if m[0] < first_changed_size ]
+                if len(eq_class) == 0:
+                    continue
+            self.signatures[placeholder].add_class(signature, eq_class)
+            self.num_duplicates += len(eq_class) - 1
+            (size, _, term) = eq_class[0]
+            self.cache[(placeholder, size)].append(eq_class[0])
+            if self.applications is None:
+                self.term_values[id(term)] = signature
+        for cache_key, reps in self.cache.items():
+            reps.sort(key=lambda m: m[1])
+            self.cache[cache_key] = [ term for (_, _, term) in reps ]
+        self.pruned = [ p for p in still_pruned
+                        if first_changed_size is None or p[1][0] < first_changed_size ]
+        self.num_duplicates += len(self.pruned)
 
     def _initialize_base_generator(self, placeholder, size):
         self.cache[(placeholder, size)] = []
         if placeholder not in self.signatures:
-            self.signatures[placeholder] = []
+            self.signatures[placeholder] = SignatureIndex()
+        self.base_generators[(placeholder, size)] = self._make_base_generator(placeholder, size)
+        self.finished_generators[(placeholder, size)] = False
+
+    def _make_base_generator(self, placeholder, size):
         (constructor, arg_tuple) = self.generator_constructors[placeholder]
         generator = constructor(*arg_tuple)
         generator.set_size(size)
-        self.base_generators[(placeholder, size)] = generator.generate()
-        self.finished_generators[(placeholder, size)] = False
+        return generator.generate()
+
+    def _compute_signature(self, expr, points_data=None, value_cache=None):
+        """Returns the signature of expr, None if it is undefined on any of
+        the points."""
+        if points_data is None:
+            points_data = (self.points, self.batch_columns, self.value_lists, self.point_profiles)
+            value_cache = self.term_values
+        (points, batch_columns, value_lists, point_profiles) = points_data
 
-    def _compute_signature(self, expr):
         if self.applications is None:
             # Single invocation (not multifunction)
-            points = self.points
-            res = [ None ] * len(points)
-            for i in range(len(points)):
-                # Assumes introvars are at the beginning of the point
-                self.eval_ctx.set_valuation_map(points[i])
-                res[i] = evaluation.evaluate_expression_raw(expr, self.eval_ctx)
-            return res
+            if batch_columns is not None:
+                # Signatures are numpy arrays when the points can be batch
+                # evaluated, so that batch and scalar results compare equal
+                evaluated = batch_evaluation.evaluate_expression_batch_with_definedness(expr,
+                        batch_columns, len(points), value_cache)
+            else:
+                # Only the operators above the (already cached) subterms are
+                # evaluated
+                evaluated = batch_evaluation.evaluate_expression_pointwise_with_definedness(expr,
+                        value_lists, len(points), value_cache)
+            if evaluated is not None:
+                (res, defined) = evaluated
+                return res if defined is None else None
+            try:
+                return self._interpret_signature(expr, points, batch_columns)
+            except (basetypes.PartialFunctionError, basetypes.UnboundLetVariableError):
+                return None
         else:
-            points = self.points
-            res = [ None ] * len(points)
-            for i in range(len(points)):
-                sig = []
-                for profile in self.point_profiles[i]:
-                    self.eval_ctx.set_valuation_map(profile)
-                    sig.append(evaluation.evaluate_expression_raw(expr, self.eval_ctx))
-                res[i] = sig
-            return res
+            try:
+                return self._interpret_multifunction_signature(expr, points, point_profiles)
+            except (basetypes.PartialFunctionError, basetypes.UnboundLetVariableError):
+                return None
+
+    def _interpret_signature(self, expr, points, batch_columns):
+        res = [ None ] * len(points)
+        for i in range(len(points)):
+            # Assumes introvars are at the beginning of the point
+            self.eval_ctx.set_valuation_map(points[i])
+            res[i] = evaluation.evaluate_expression_raw(expr, self.eval_ctx)
+        if batch_columns is not None:
+            column = batch_evaluation.make_value_column(res,
+                    exprs.get_expression_type(expr))
+            if column is not None:
+                return column
+        return res
+
+    def _interpret_multifunction_signature(self, expr, points, point_profiles):
+        values = {}
+        res = [ None ] * len(points)
+        for i in range(len(points)):
+            sig = []
+            for profile_index in point_profiles[i]:
+                if profile_index not in values:
+                    self.eval_ctx.set_valuation_map(self.distinct_profiles[profile_index])
+                    values[profile_index] = evaluation.evaluate_expression_raw(expr,
+                                                                               self.eval_ctx)
+                sig.append(values[profile_index])
+            res[i] = sig
+        return res
 
     def get_from(self, placeholder, size, position):
-        placeholder = placeholder.identifier
+        return self._get_from(placeholder.identifier, size, position)
 
+    def _get_from(self, placeholder, size, position):
         # Have not started generation
         if (placeholder, size) not in self.cache:
             self._initialize_base_generator(placeholder, size)
@@ -437,25 +768,35 @@ class PointDistinctGeneratorFactory(GeneratorFactoryBase):
 
         # In the middle of generation
         while True:
-            next_expr = next(self.base_generators[(placeholder, size)])
+            next_expr = next(self.base_generators[(placeholder, size)], None)
             if next_expr is None:
                 self.finished_generators[(placeholder, size)] = True
                 return None
-            try:
-                signature = self._compute_signature(next_expr)
-                if signature not in self.signatures[placeholder]:
-                    cached_exprs.append(next_expr)
-                    self.signatures[placeholder].append(signature)
-                    # print('Generated', placeholder, size, ':', exprs.expression_to_string(next_expr),
-                    #         'with signature', signature)
-                    return next_expr 
-                else:
-                    pass
-                    # print('Eliminated', placeholder, size, ':', exprs.expression_to_string(next_expr),
-                    #         'with signature', signature)
-            except (basetypes.PartialFunctionError, basetypes.UnboundLetVariableError):
+            signature = self._compute_signature(next_expr)
+            if signature is None:
                 # print('Undefined', placeholder, size, ':', exprs.expression_to_string(next_expr))
-                pass
+                continue
+            member = (size, self.num_generated, next_expr)
+            self.num_generated += 1
+            retain = self._retains_duplicates(size)
+            if (placeholder in self.output_substring_placeholders and
+                    not self._is_output_substring(signature)):
+                if retain:
+                    self.pruned.append((placeholder, member, signature))
+                    self._count_duplicate(size)
+                continue
+            if self.signatures[placeholder].add(signature, member, retain):
+                cached_exprs.append(next_expr)
+                if self.applications is None:
+                    self.term_values[id(next_expr)] = signature
+                # print('Generated', placeholder, size, ':', exprs.expression_to_string(next_expr),
+                #         'with signature', signature)
+                return next_expr 
+            else:
+                if retain:
+                    self._count_duplicate(size)
+                # print('Eliminated', placeholder, size, ':', exprs.expression_to_string(next_expr),
+                #         'with signature', signature)
 
     def _instantiate_placeholder(self, placeholder):
         return PointDistinctGenerator(placeholder, self)
@@ -678,8 +1019,124 @@ def test_generators():
         for exp in bunch:
             print('    %s' % exprs.expression_to_string(exp))
 
+def _parse_test_benchmark(benchmark):
+    """Returns the grammar, the specification and the points of a PBE
+    benchmark for a single function, given as a string."""
+    from parsers import parser
+    import benchmarks
+    (theories, syn_ctx, synth_instantiator, _, _, constraints, grammar_map, _) = \
+            parser.extract_benchmark(parser.sexpFromString(benchmark))
+    [ synth_fun ] = synth_instantiator.get_functions().values()
+    specification, _ = benchmarks.make_specification([ synth_fun ], theories[0],
+                                                     syn_ctx, constraints)
+    return grammar_map[synth_fun], specification, list(specification.valuations.keys())
+
+def _generate_distinct_terms(generator_factory, generator, max_size):
+    """Generates the terms of generator up to max_size, and returns the
+    distinct terms the factory has generated, for each placeholder and
+    size."""
+    for size in range(1, max_size + 1):
+        generator.set_size(size)
+        for _ in generator.generate():
+            pass
+    return dict([ (cache_key, set([ exprs.expression_to_string(term) for term in terms ]))
+                  for cache_key, terms in generator_factory.cache.items() ])
+
+def _check_chunked_points(grammar, specification, points, chunks, max_size,
+                          configure=lambda generator_factory: None):
+    """Checks that adding the points to a factory in the given chunks gives
+    the same distinct terms as adding them all at once. Returns the factory
+    the chunks were added to."""
+    generator_factory = PointDistinctGeneratorFactory(specification)
+    configure(generator_factory)
+    generator = grammar.to_generator(generator_factory)
+    for (start, end) in zip(chunks, chunks[1:] + [ len(points) ]):
+        generator_factory.add_points(points[start:end])
+        chunked_terms = _generate_distinct_terms(generator_factory, generator, max_size)
+
+    fresh_factory = PointDistinctGeneratorFactory(specification)
+    configure(fresh_factory)
+    fresh_generator = grammar.to_generator(fresh_factory)
+    fresh_factory.add_points(points)
+    fresh_terms = _generate_distinct_terms(fresh_factory, fresh_generator, max_size)
+    assert chunked_terms == fresh_terms
+    return generator_factory
+
+def test_incremental_points():
+    global _max_retained_duplicates
+    benchmark = '''
+    (set-logic LIA)
+    (synth-fun f ((x Int) (y Int)) Int
+        ((Start Int (x y 0 1 (+ Start Start) (- Start Start) (ite StartBool Start Start)))
+         (StartBool Bool ((<= Start Start)))))
+    (constraint (= (f 0 0) 0))
+    (constraint (= (f 1 1) 1))
+    (constraint (= (f 2 0) 2))
+    (constraint (= (f 0 3) 3))
+    (constraint (= (f -1 4) 4))
+    (constraint (= (f 5 -2) 5))
+    (check-synth)
+    '''
+    (grammar, specification, points) = _parse_test_benchmark(benchmark)
+    # The first points leave many terms equivalent, so later ones split the
+    # classes, and the representatives of some of them change
+    points.sort(key=lambda point: (point[0].value_object != point[1].value_object,
+                                   abs(point[0].value_object)))
+    for chunks in [ [ 0, 1, 2 ], [ 0, 2, 3, 5 ], [ 0, 1, 2, 3, 4, 5 ] ]:
+        _check_chunked_points(grammar, specification, points, chunks, 6)
+
+    # With only some of the duplicates retained, the larger sizes are
+    # generated again
+    max_retained_duplicates = _max_retained_duplicates
+    _max_retained_duplicates = 10
+    try:
+        bounded = []
+        def record_bound(generator_factory):
+            extend_caches = generator_factory._extend_caches
+            def _extend_caches(num_old_points):
+                bounded.append(generator_factory.duplicate_size_bound is not None)
+                assert generator_factory.num_duplicates <= _max_retained_duplicates
+                extend_caches(num_old_points)
+            generator_factory._extend_caches = _extend_caches
+        _check_chunked_points(grammar, specification, points, [ 0, 1, 2, 4 ], 6, record_bound)
+        assert any(bounded)
+    finally:
+        _max_retained_duplicates = max_retained_duplicates
+    print('Checked the terms generated on points added in chunks.')
+
+def test_output_substring_pruning():
+    import benchmarks
+    benchmark = '''
+    (set-logic SLIA)
+    (synth-fun f ((x String)) String
+        ((Start String (x "-" "b" (str.++ Start Start)))))
+    (constraint (= (f "a") "a-a"))
+    (constraint (= (f "c") "c-b"))
+    (check-synth)
+    '''
+    (grammar, specification, points) = _parse_test_benchmark(benchmark)
+    configure = lambda generator_factory: benchmarks.set_output_substring_pruning(
+            generator_factory, grammar, specification)
+    generator_factory = PointDistinctGeneratorFactory(specification)
+    configure(generator_factory)
+    generator = grammar.to_generator(generator_factory)
+    for (num_points, pruned) in [ (1, True), (2, False) ]:
+        generator_factory.add_points(points[len(generator_factory.points):num_points])
+        terms = _generate_distinct_terms(generator_factory, generator, 5)
+        # "b" is not a substring of the output on the first point, but it
+        # is on the second one
+        assert ('"b"' in terms[('Start_Generator', 1)]) != pruned
+        assert ('(str.++ "-" "b")' in terms[('Start_Generator', 3)]) != pruned
+        pruned_terms = [ exprs.expression_to_string(member[2])
+                         for (_, member, _) in generator_factory.pruned ]
+        assert ('"b"' in pruned_terms) == pruned
+    _check_chunked_points(grammar, specification, points, [ 0, 1 ], 5, configure)
+    print('Checked the pruning of terms that are not output substrings.')
+
 if __name__ == '__main__':
     test_generators()
+    test_incremental_points()
+    test_output_substring_pruning()
 
 #
 # enumerators.py ends here
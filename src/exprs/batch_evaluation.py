@@ -0,0 +1,1008 @@
+#!/usr/bin/env python3
+# batch_evaluation.py ---
+#
+# Filename: batch_evaluation.py
+#
+#
+# Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by The University of Pennsylvania
+# 4. Neither the name of the University of Pennsylvania nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+
+# Code:
+
+"""Evaluates 64-bit bitvector, integer (and boolean) expressions on a whole
+batch of points at once.  Each point coordinate is transposed into a numpy
+column (uint64 for bitvectors, int64 for integers, bool for booleans) and
+every operator is applied to entire columns.  Expressions that cannot be
+handled here (other theories, other bitvector widths, let bindings, ...) are
+reported as unsupported and the caller is expected to fall back to the
+scalar evaluator in exprs.evaluation.
+
+Integers are unbounded, so the integer operators check their int64 results
+for overflow, and redo the operation on columns of python ints (numpy
+object arrays) wherever it wraps around.  An integer column is an object
+column only if some of its values do not fit in an int64 (results are
+narrowed back to int64 otherwise), so that equal integer columns have the
+same representation.
+
+The ite and the boolean connectives short circuit as in the scalar
+evaluator: the branches of an ite are evaluated only on the points where
+they are taken, the operands of and/or/=> only on the points where the
+value is not yet known, and macros whose bodies contain these (such as the
+if0 of the ICFP benchmarks) are evaluated with their arguments substituted
+into the body.  So a point where a branch is not taken costs nothing, and
+a partial function that is undefined on it does not make the whole batch
+fail.
+
+The *_with_definedness variants of the evaluation functions do not raise
+basetypes.PartialFunctionError where the expression is undefined: they
+return a mask of the points where it is defined along with the values,
+so that a single point outside the domain of a division does not throw
+away the values on all the others."""
+
+import functools
+
+from exprs import exprs
+from exprs import exprtypes
+from semantics import semantics_types
+from utils import basetypes
+from utils import bitvectors
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# if __name__ == '__main__':
+#     utils.print_module_misuse_and_exit()
+
+_variable_expression = exprs.ExpressionKinds.variable_expression
+_constant_expression = exprs.ExpressionKinds.constant_expression
+_function_expression = exprs.ExpressionKinds.function_expression
+_formal_parameter_expression = exprs.ExpressionKinds.formal_parameter_expression
+
+_bv_size = 64
+
+class _UnsupportedExpression(Exception):
+    pass
+
+def is_available():
+    return numpy is not None
+
+class _UndefinedPoints(object):
+    """Collects the points of a batch on which the expression being evaluated
+    is undefined (a partial function is applied outside its domain there),
+    for the evaluations that report definedness instead of raising
+    basetypes.PartialFunctionError.  The evaluation of a short circuiting
+    operand on a selection of the points records the points through a
+    selection of the collector, which maps their positions back to the
+    batch, and does so only when there is something to record."""
+    def __init__(self, parent=None, to_parent=None):
+        self.parent = parent
+        self.to_parent = to_parent
+        self.positions = set() if parent is None else None
+
+    def select(self, to_parent):
+        """to_parent maps a list of positions in the selection to their
+        positions among the points of this collector."""
+        return _UndefinedPoints(self, to_parent)
+
+    def add(self, positions):
+        if self.parent is not None:
+            self.parent.add(self.to_parent(positions))
+        else:
+            self.positions.update([ int(p) for p in positions ])
+
+def _check_divisor(divisor, undefined):
+    """Returns the divisor column to use, with the points where it is zero
+    either recorded in undefined (and the divisor replaced by one there,
+    so the value computed for them is garbage), or, if undefined is None,
+    signalled by raising basetypes.PartialFunctionError."""
+    zero = (divisor == 0)
+    if not zero.any():
+        return divisor
+    if undefined is None:
+        raise basetypes.PartialFunctionError()
+    undefined.add(numpy.flatnonzero(zero))
+    return numpy.where(zero, divisor.dtype.type(1), divisor)
+
+def _negate(a):
+    return numpy.uint64(0) - a
+
+def _signed(a):
+    return a.view(numpy.int64)
+
+def _is_negative(a):
+    return _signed(a) < 0
+
+def _udiv(a, b):
+    return a // b
+
+def _urem(a, b):
+    return a % b
+
+def _sdiv(a, b):
+    a_neg = _is_negative(a)
+    b_neg = _is_negative(b)
+    q = numpy.where(a_neg, _negate(a), a) // numpy.where(b_neg, _negate(b), b)
+    return numpy.where(a_neg != b_neg, _negate(q), q)
+
+def _srem(a, b):
+    a_neg = _is_negative(a)
+    b_neg = _is_negative(b)
+    r = numpy.where(a_neg, _negate(a), a) % numpy.where(b_neg, _negate(b), b)
+    return numpy.where(a_neg, _negate(r), r)
+
+def _shl(a, b):
+    return numpy.where(b >= _bv_size, numpy.uint64(0), a << (b & numpy.uint64(_bv_size - 1)))
+
+def _lshr(a, b):
+    return numpy.where(b >= _bv_size, numpy.uint64(0), a >> (b & numpy.uint64(_bv_size - 1)))
+
+def _ashr(a, b):
+    amount = numpy.minimum(b, numpy.uint64(_bv_size - 1)).view(numpy.int64)
+    return (_signed(a) >> amount).view(numpy.uint64)
+
+_int64_min = -(1 << 63)
+
+def _objects(a):
+    return a if a.dtype == numpy.object_ else a.astype(numpy.object_)
+
+def _narrow(a):
+    """Returns an integer column as an int64 column if all its values fit."""
+    if a.dtype != numpy.object_:
+        return a
+    try:
+        return a.astype(numpy.int64)
+    except (OverflowError, TypeError):
+        return a
+
+def _with_objects(operator, *operands):
+    """Applies operator to the operands as columns of python ints."""
+    return _narrow(operator(*[ _objects(o) for o in operands ]))
+
+def _is_int64(*operands):
+    return all([ o.dtype == numpy.int64 for o in operands ])
+
+def _int_add(a, b):
+    if _is_int64(a, b):
+        r = a + b
+        # the sum overflows where its sign differs from those of both operands
+        if not (((a ^ r) & (b ^ r)) < 0).any():
+            return r
+    return _with_objects(numpy.add, a, b)
+
+def _int_sub(a, b):
+    if _is_int64(a, b):
+        r = a - b
+        if not (((a ^ b) & (a ^ r)) < 0).any():
+            return r
+    return _with_objects(numpy.subtract, a, b)
+
+def _int_mul(a, b):
+    if _is_int64(a, b) and not ((a == -1) & (b == _int64_min)).any():
+        r = a * b
+        # the product is exact where dividing it by a gives back b
+        nonzero = (a != 0)
+        if not (nonzero & (r // numpy.where(nonzero, a, 1) != b)).any():
+            return r
+    return _with_objects(numpy.multiply, a, b)
+
+def _int_negate(a):
+    if _is_int64(a) and not (a == _int64_min).any():
+        return -a
+    return _with_objects(numpy.negative, a)
+
+def _int_divide_overflows(a, b):
+    return not _is_int64(a, b) or ((a == _int64_min) & (b == -1)).any()
+
+def _lia_div(a, b):
+    if _int_divide_overflows(a, b):
+        return _with_objects(numpy.floor_divide, a, b)
+    return a // b
+
+def _lia_mod(a, b):
+    # (mod a b) is a % b for a positive b, and (-a) % (-b) otherwise
+    mod = lambda a, b: numpy.where(b > 0, a % b, -(a % b))
+    if _int_divide_overflows(a, b):
+        return _with_objects(mod, a, b)
+    return mod(a, b)
+
+def _fold(operator):
+    """The n-ary version of a binary operator."""
+    return lambda *operands: functools.reduce(operator, operands)
+
+_operators = {
+        'bvnot' : lambda a: ~a,
+        'bvneg' : _negate,
+        'bvand' : lambda a, b: a & b,
+        'bvor' : lambda a, b: a | b,
+        'bvxor' : lambda a, b: a ^ b,
+        'bvxnor' : lambda a, b: ~(a ^ b),
+        'bvnand' : lambda a, b: ~(a & b),
+        'bvnor' : lambda a, b: ~(a | b),
+        'bvadd' : lambda a, b: a + b,
+        'bvsub' : lambda a, b: a - b,
+        'bvmul' : lambda a, b: a * b,
+        'bvudiv' : _udiv,
+        'bvurem' : _urem,
+        'bvsdiv' : _sdiv,
+        'bvsrem' : _srem,
+        'bvshl' : _shl,
+        'bvlshr' : _lshr,
+        'bvashr' : _ashr,
+        'bvult' : lambda a, b: a < b,
+        'bvule' : lambda a, b: a <= b,
+        'bvugt' : lambda a, b: a > b,
+        'bvuge' : lambda a, b: a >= b,
+        'bvslt' : lambda a, b: _signed(a) < _signed(b),
+        'bvsle' : lambda a, b: _signed(a) <= _signed(b),
+        'bvsgt' : lambda a, b: _signed(a) > _signed(b),
+        'bvsge' : lambda a, b: _signed(a) >= _signed(b),
+        '=' : lambda a, b: a == b,
+        'ne' : lambda a, b: a != b,
+        'not' : lambda a: numpy.logical_not(a),
+        'iff' : lambda a, b: a == b,
+        'xor' : lambda a, b: a != b,
+        '+' : _fold(_int_add),
+        '-' : lambda *operands: (_int_negate(*operands) if len(operands) == 1 else
+                                 _int_sub(*operands)),
+        '*' : _fold(_int_mul),
+        'div' : _lia_div,
+        'mod' : _lia_mod,
+        '<' : lambda a, b: a < b,
+        '<=' : lambda a, b: a <= b,
+        '>' : lambda a, b: a > b,
+        '>=' : lambda a, b: a >= b,
+        }
+
+# The operators that are undefined where their second operand is zero, which
+# is checked (by _check_divisor()) before they are applied
+_partial_operators = frozenset([ 'bvudiv', 'bvurem', 'bvsdiv', 'bvsrem', 'div', 'mod' ])
+
+def _column_dtype(value_type):
+    if value_type.type_code == exprtypes.TypeCodes.boolean_type:
+        return numpy.bool_
+    if value_type.type_code == exprtypes.TypeCodes.integer_type:
+        return numpy.int64
+    if (value_type.type_code == exprtypes.TypeCodes.bit_vector_type and
+            value_type.size == _bv_size):
+        return numpy.uint64
+    return None
+
+_raw_value = bitvectors.raw_value
+
+def _make_column(values, dtype):
+    """Makes a column of the given dtype out of a list of raw values, or a
+    column of python ints if they are integers that do not fit in it."""
+    try:
+        return numpy.fromiter(values, dtype=dtype, count=len(values))
+    except OverflowError:
+        return numpy.array(values, dtype=numpy.object_)
+
+def make_columns(points):
+    """Transposes a list of points (tuples of exprs.Value objects) into a
+    list of numpy columns, one per point coordinate.  A coordinate that is
+    not a 64-bit bitvector, an integer or a boolean gets the column None.  Returns None
+    if none of the coordinates can be batch evaluated."""
+    if numpy is None or len(points) == 0:
+        return None
+    num_points = len(points)
+    columns = []
+    for i, value in enumerate(points[0]):
+        dtype = _column_dtype(value.value_type)
+        if dtype is None:
+            columns.append(None)
+            continue
+        columns.append(_make_column([ _raw_value(p[i].value_object) for p in points ], dtype))
+    if all([ c is None for c in columns ]):
+        return None
+    return columns
+
+def make_value_column(values, value_type):
+    """Makes a numpy column out of a list of raw values of the given type.
+    Returns None if values of this type cannot be batch evaluated."""
+    if numpy is None:
+        return None
+    dtype = _column_dtype(value_type)
+    if dtype is None:
+        return None
+    return _make_column([ _raw_value(v) for v in values ], dtype)
+
+class _SelectedValues(object):
+    """A view of a value cache, restricted to a selection of the points."""
+    def __init__(self, value_cache, select, value_class):
+        self.value_cache = value_cache
+        self.select = select
+        self.value_class = value_class
+
+    def get(self, key, default=None):
+        values = self.value_cache.get(key, None)
+        if isinstance(values, self.value_class):
+            return self.select(values)
+        return default
+
+_unselected = object()
+
+class _SelectedColumns(object):
+    """The columns restricted to a selection of the points.  A column is
+    selected only when it is first used, so that the operand of a short
+    circuiting operator costs only the columns it uses."""
+    def __init__(self, columns, select):
+        self.columns = columns
+        self.select = select
+        self.selected = [ _unselected ] * len(columns)
+
+    def __getitem__(self, index):
+        column = self.selected[index]
+        if column is _unselected:
+            column = self.columns[index]
+            if column is not None:
+                column = self.select(column)
+            self.selected[index] = column
+        return column
+
+    def __len__(self):
+        return len(self.columns)
+
+def _inline_macro_arguments(fun_info, expr_object):
+    """Returns the body of the macro with the arguments of expr_object
+    substituted for the parameters, so that the arguments get evaluated only
+    where the body needs them.  Returns None unless the body short circuits
+    and can be inlined."""
+    if not (fun_info.short_circuits and fun_info.is_inlinable):
+        return None
+    return fun_info.inline(expr_object)
+
+def _evaluate_selected(expr_object, columns, value_cache, undefined, selection):
+    """Evaluates expr_object on the points where the boolean array selection
+    is set."""
+    select = lambda values: _narrow(values[selection])
+    if value_cache is not None:
+        value_cache = _SelectedValues(value_cache, select, numpy.ndarray)
+    if undefined is not None:
+        undefined = undefined.select(lambda positions: numpy.flatnonzero(selection)[positions])
+    return _evaluate(expr_object, _SelectedColumns(columns, select),
+                     int(numpy.count_nonzero(selection)), value_cache, undefined)
+
+def _evaluate_ite(children, columns, num_points, value_cache, undefined):
+    (condition, then_branch, else_branch) = children
+    c = _evaluate(condition, columns, num_points, value_cache, undefined)
+    if c.all():
+        return _evaluate(then_branch, columns, num_points, value_cache, undefined)
+    if not c.any():
+        return _evaluate(else_branch, columns, num_points, value_cache, undefined)
+    not_c = ~c
+    t = _evaluate_selected(then_branch, columns, value_cache, undefined, c)
+    e = _evaluate_selected(else_branch, columns, value_cache, undefined, not_c)
+    dtype = t.dtype if t.dtype == e.dtype else numpy.object_
+    retval = numpy.empty(num_points, dtype=dtype)
+    retval[c] = t
+    retval[not_c] = e
+    return _narrow(retval)
+
+def _evaluate_connective(children, columns, num_points, value_cache, undefined,
+                         short_circuit_value):
+    """Evaluates an and (or an or, for a True short_circuit_value): each
+    operand is evaluated only on the points where all the previous ones were
+    true (false)."""
+    retval = numpy.array(_evaluate(children[0], columns, num_points, value_cache, undefined),
+                         dtype=numpy.bool_)
+    for child in children[1:]:
+        undecided = (retval != short_circuit_value)
+        if not undecided.any():
+            break
+        retval[undecided] = _evaluate_selected(child, columns, value_cache, undefined, undecided)
+    return retval
+
+def _evaluate_implies(children, columns, num_points, value_cache, undefined):
+    (antecedent, consequent) = children
+    a = numpy.array(_evaluate(antecedent, columns, num_points, value_cache, undefined),
+                    dtype=numpy.bool_)
+    retval = ~a
+    if a.any():
+        retval[a] = _evaluate_selected(consequent, columns, value_cache, undefined, a)
+    return retval
+
+_short_circuit_evaluators = {
+        'ite' : _evaluate_ite,
+        'and' : lambda *args: _evaluate_connective(*args, short_circuit_value=False),
+        'or' : lambda *args: _evaluate_connective(*args, short_circuit_value=True),
+        '=>' : _evaluate_implies,
+        }
+
+def _evaluate(expr_object, columns, num_points, value_cache, undefined):
+    """undefined collects the points on which expr_object is undefined; if
+    it is None, basetypes.PartialFunctionError is raised instead."""
+    kind = expr_object.expr_kind
+    if kind == _formal_parameter_expression:
+        column = columns[expr_object.parameter_position]
+    elif kind == _variable_expression:
+        offset = expr_object.variable_info.variable_eval_offset
+        if offset == exprs.VariableInfo._undefined_offset:
+            raise _UnsupportedExpression()
+        column = columns[offset]
+    elif kind == _constant_expression:
+        value = expr_object.value_object
+        dtype = _column_dtype(value.value_type)
+        if dtype is None:
+            raise _UnsupportedExpression()
+        try:
+            return numpy.full(num_points, _raw_value(value.value_object), dtype=dtype)
+        except OverflowError:
+            return numpy.full(num_points, value.value_object, dtype=numpy.object_)
+    elif kind == _function_expression:
+        if value_cache is not None:
+            cached = value_cache.get(id(expr_object), None)
+            if isinstance(cached, numpy.ndarray):
+                return cached
+        fun_info = expr_object.function_info
+        if fun_info.function_kind == semantics_types.FunctionKinds.interpreted_function:
+            evaluator = _short_circuit_evaluators.get(fun_info.function_name, None)
+            if evaluator is not None:
+                return evaluator(expr_object.children, columns, num_points, value_cache,
+                                 undefined)
+        elif fun_info.function_kind == semantics_types.FunctionKinds.macro_function:
+            inlined = _inline_macro_arguments(fun_info, expr_object)
+            if inlined is not None:
+                return _evaluate(inlined, columns, num_points, value_cache, undefined)
+        children = [ _evaluate(child, columns, num_points, value_cache, undefined)
+                     for child in expr_object.children ]
+        if fun_info.function_kind == semantics_types.FunctionKinds.macro_function:
+            return _evaluate(fun_info.interpretation_expression, children, num_points, None,
+                             undefined)
+        if fun_info.function_kind != semantics_types.FunctionKinds.interpreted_function:
+            raise _UnsupportedExpression()
+        operator = _operators.get(fun_info.function_name, None)
+        if operator is None:
+            raise _UnsupportedExpression()
+        if fun_info.function_name in _partial_operators:
+            children[1] = _check_divisor(children[1], undefined)
+        return operator(*children)
+    else:
+        raise basetypes.UnhandledCaseError('Odd expression kind: %s' % kind)
+
+    if column is None:
+        raise _UnsupportedExpression()
+    return column
+
+def evaluate_expression_batch(expr_object, columns, num_points, value_cache=None):
+    """Evaluates expr_object on all the points described by columns (as
+    returned by make_columns).  Returns a numpy array with one entry per
+    point, or None if the expression cannot be evaluated in batch mode.
+    Raises basetypes.PartialFunctionError if a partial function is undefined
+    on any of the points.
+
+    Only the points on which a partial function is actually evaluated count:
+    a division in a branch of an ite is not evaluated on the points where the
+    branch is not taken.
+
+    value_cache optionally maps id()s of (live) sub-expressions to their
+    already computed value vectors: those sub-expressions are not evaluated
+    again, so only the operators above them are applied."""
+    if columns is None:
+        return None
+    try:
+        return _evaluate(expr_object, columns, num_points, value_cache, None)
+    except _UnsupportedExpression:
+        return None
+
+def evaluate_expression_batch_with_definedness(expr_object, columns, num_points,
+                                               value_cache=None):
+    """Like evaluate_expression_batch(), but never raises
+    basetypes.PartialFunctionError: returns a pair of the values and a
+    boolean numpy array that is set at the points where expr_object is
+    defined, or None if it is defined everywhere.  The values at the points
+    where it is undefined are garbage.  Returns None if the expression cannot
+    be evaluated in batch mode."""
+    if columns is None:
+        return None
+    undefined = _UndefinedPoints()
+    try:
+        values = _evaluate(expr_object, columns, num_points, value_cache, undefined)
+    except _UnsupportedExpression:
+        return None
+    if len(undefined.positions) == 0:
+        return (values, None)
+    defined = numpy.ones(num_points, dtype=numpy.bool_)
+    defined[sorted(undefined.positions)] = False
+    return (values, defined)
+
+def make_value_lists(points):
+    """Transposes a list of points into plain lists of raw values, one per
+    point coordinate, for evaluate_expression_pointwise."""
+    if len(points) == 0:
+        return None
+    return [ [ p[i].value_object for p in points ] for i in range(len(points[0])) ]
+
+def _has_default_evaluate(fun_info):
+    return type(fun_info).evaluate is semantics_types.InterpretedFunctionBase.evaluate
+
+def _evaluate_pointwise_selected(expr_object, columns, value_cache, undefined, indices):
+    """Evaluates expr_object on the points with the given indices."""
+    select = lambda values: [ values[i] for i in indices ]
+    if value_cache is not None:
+        value_cache = _SelectedValues(value_cache, select, list)
+    if undefined is not None:
+        undefined = undefined.select(lambda positions: [ indices[p] for p in positions ])
+    return _evaluate_pointwise(expr_object, [ select(c) for c in columns ],
+                               len(indices), value_cache, undefined)
+
+def _scatter(retval, indices, values):
+    for (i, value) in zip(indices, values):
+        retval[i] = value
+
+def _evaluate_pointwise_ite(children, columns, num_points, value_cache, undefined):
+    (condition, then_branch, else_branch) = children
+    c = _evaluate_pointwise(condition, columns, num_points, value_cache, undefined)
+    then_indices = [ i for i in range(num_points) if c[i] ]
+    if len(then_indices) == num_points:
+        return _evaluate_pointwise(then_branch, columns, num_points, value_cache, undefined)
+    if len(then_indices) == 0:
+        return _evaluate_pointwise(else_branch, columns, num_points, value_cache, undefined)
+    else_indices = [ i for i in range(num_points) if not c[i] ]
+    retval = [ None ] * num_points
+    _scatter(retval, then_indices,
+             _evaluate_pointwise_selected(then_branch, columns, value_cache, undefined,
+                                          then_indices))
+    _scatter(retval, else_indices,
+             _evaluate_pointwise_selected(else_branch, columns, value_cache, undefined,
+                                          else_indices))
+    return retval
+
+def _evaluate_pointwise_connective(children, columns, num_points, value_cache, undefined,
+                                   short_circuit_value):
+    retval = [ bool(v) for v in _evaluate_pointwise(children[0], columns,
+                                                    num_points, value_cache, undefined) ]
+    for child in children[1:]:
+        undecided = [ i for i in range(num_points) if retval[i] != short_circuit_value ]
+        if len(undecided) == 0:
+            break
+        _scatter(retval, undecided,
+                 _evaluate_pointwise_selected(child, columns, value_cache, undefined,
+                                              undecided))
+    return retval
+
+def _evaluate_pointwise_implies(children, columns, num_points, value_cache, undefined):
+    (antecedent, consequent) = children
+    a = _evaluate_pointwise(antecedent, columns, num_points, value_cache, undefined)
+    retval = [ not v for v in a ]
+    undecided = [ i for i in range(num_points) if a[i] ]
+    if len(undecided) > 0:
+        _scatter(retval, undecided,
+                 _evaluate_pointwise_selected(consequent, columns, value_cache, undefined,
+                                              undecided))
+    return retval
+
+_pointwise_short_circuit_evaluators = {
+        'ite' : _evaluate_pointwise_ite,
+        'and' : lambda *args: _evaluate_pointwise_connective(*args, short_circuit_value=False),
+        'or' : lambda *args: _evaluate_pointwise_connective(*args, short_circuit_value=True),
+        '=>' : _evaluate_pointwise_implies,
+        }
+
+def _apply_partial_pointwise(eval_children, children, undefined):
+    """Applies the kernel of a partial function to the value lists of its
+    children, recording the points where it raises in undefined.  The
+    first argument stands in for the value at those points: it is of the
+    right type, as partial functions (div, mod, bvudiv, ...) have the type
+    of their first argument."""
+    retval = []
+    undefined_positions = []
+    for (i, args) in enumerate(zip(*children)):
+        try:
+            retval.append(eval_children(*args))
+        except basetypes.PartialFunctionError:
+            undefined_positions.append(i)
+            retval.append(args[0])
+    if len(undefined_positions) > 0:
+        undefined.add(undefined_positions)
+    return retval
+
+def _evaluate_pointwise(expr_object, columns, num_points, value_cache, undefined):
+    """undefined collects the points on which expr_object is undefined; if
+    it is None, basetypes.PartialFunctionError is raised instead."""
+    kind = expr_object.expr_kind
+    if kind == _formal_parameter_expression:
+        return columns[expr_object.parameter_position]
+    elif kind == _variable_expression:
+        offset = expr_object.variable_info.variable_eval_offset
+        if offset == exprs.VariableInfo._undefined_offset:
+            raise _UnsupportedExpression()
+        return columns[offset]
+    elif kind == _constant_expression:
+        return [ expr_object.value_object.value_object ] * num_points
+    elif kind == _function_expression:
+        if value_cache is not None:
+            cached = value_cache.get(id(expr_object), None)
+            if isinstance(cached, list):
+                return cached
+        fun_info = expr_object.function_info
+        if fun_info.function_kind == semantics_types.FunctionKinds.interpreted_function:
+            evaluator = _pointwise_short_circuit_evaluators.get(fun_info.function_name, None)
+            if evaluator is not None:
+                return evaluator(expr_object.children, columns, num_points, value_cache,
+                                 undefined)
+        elif fun_info.function_kind == semantics_types.FunctionKinds.macro_function:
+            inlined = _inline_macro_arguments(fun_info, expr_object)
+            if inlined is not None:
+                return _evaluate_pointwise(inlined, columns, num_points, value_cache, undefined)
+        children = [ _evaluate_pointwise(child, columns, num_points, value_cache, undefined)
+                     for child in expr_object.children ]
+        if fun_info.function_kind == semantics_types.FunctionKinds.macro_function:
+            return _evaluate_pointwise(fun_info.interpretation_expression,
+                                       children, num_points, None, undefined)
+        if (fun_info.function_kind != semantics_types.FunctionKinds.interpreted_function or
+                not _has_default_evaluate(fun_info) or len(children) == 0):
+            raise _UnsupportedExpression()
+        if fun_info.is_partial and undefined is not None:
+            return _apply_partial_pointwise(fun_info.eval_children, children, undefined)
+        return list(map(fun_info.eval_children, *children))
+    else:
+        raise basetypes.UnhandledCaseError('Odd expression kind: %s' % kind)
+
+def evaluate_expression_pointwise(expr_object, columns, num_points, value_cache=None):
+    """The pure python counterpart of evaluate_expression_batch, for values
+    that cannot be put in numpy columns: columns (as returned by
+    make_value_lists) and the result are lists of raw values, and each
+    operator is applied, through its eval_children, to the value lists of
+    its children. Returns None for expressions with let bindings or
+    uninterpreted functions."""
+    if columns is None:
+        return None
+    try:
+        return _evaluate_pointwise(expr_object, columns, num_points, value_cache, None)
+    except _UnsupportedExpression:
+        return None
+
+def evaluate_expression_pointwise_with_definedness(expr_object, columns, num_points,
+                                                   value_cache=None):
+    """The pointwise counterpart of evaluate_expression_batch_with_definedness:
+    returns a pair of the list of values and a list of booleans that are
+    set at the points where expr_object is defined, or None if it is defined
+    everywhere."""
+    if columns is None:
+        return None
+    undefined = _UndefinedPoints()
+    try:
+        values = _evaluate_pointwise(expr_object, columns, num_points, value_cache, undefined)
+    except _UnsupportedExpression:
+        return None
+    if len(undefined.positions) == 0:
+        return (values, None)
+    return (values, [ i not in undefined.positions for i in range(num_points) ])
+
+# Bit-sliced evaluation of predicates: a boolean column is packed 64 points to
+# a machine word (bit i of word j is point 64 * j + i), and the boolean
+# connectives are applied a word at a time.  Bits past the last point are
+# garbage until the final result is masked.
+_word_size = 64
+
+def _ite_words(c, t, e):
+    return (c & t) | (~c & e)
+
+_packed_operators = {
+        'and' : lambda *args: functools.reduce(lambda a, b: a & b, args),
+        'or' : lambda *args: functools.reduce(lambda a, b: a | b, args),
+        'not' : lambda a: ~a,
+        '=>' : lambda a, b: ~a | b,
+        'iff' : lambda a, b: ~(a ^ b),
+        'xor' : lambda a, b: a ^ b,
+        'ite' : _ite_words,
+        }
+
+def _num_words(num_points):
+    return (num_points + _word_size - 1) // _word_size
+
+def _pack_column(column, num_points):
+    packed = numpy.packbits(column, bitorder='little')
+    padded = numpy.zeros(_num_words(num_points) * (_word_size // 8), dtype=numpy.uint8)
+    padded[:len(packed)] = packed
+    return padded.view(numpy.dtype('<u8'))
+
+def _tail_mask(num_points):
+    mask = numpy.full(_num_words(num_points), numpy.uint64((1 << _word_size) - 1),
+                      dtype=numpy.dtype('<u8'))
+    if num_points % _word_size != 0:
+        mask[-1] = numpy.uint64((1 << (num_points % _word_size)) - 1)
+    return mask
+
+def _is_boolean(expr_object):
+    return (exprs.get_expression_type(expr_object).type_code ==
+            exprtypes.TypeCodes.boolean_type)
+
+def _evaluate_packed_short_circuit(function_name, children, columns, num_points):
+    """Evaluates the packed ite or connective, leaving out the operands that
+    are not needed on any of the points."""
+    tail_mask = _tail_mask(num_points)
+    first = _evaluate_packed(children[0], columns, num_points)
+    if function_name == 'ite' or function_name == '=>':
+        first_set = first & tail_mask
+        if not first_set.any():
+            if function_name == '=>':
+                return tail_mask
+            return _evaluate_packed(children[2], columns, num_points)
+        if (first_set == tail_mask).all():
+            return _evaluate_packed(children[1], columns, num_points)
+        operands = [ _evaluate_packed(child, columns, num_points) for child in children[1:] ]
+        return _packed_operators[function_name](first, *operands)
+
+    retval = first
+    combine = _packed_operators[function_name]
+    for child in children[1:]:
+        if function_name == 'and' and not (retval & tail_mask).any():
+            break
+        if function_name == 'or' and ((retval & tail_mask) == tail_mask).all():
+            break
+        retval = combine(retval, _evaluate_packed(child, columns, num_points))
+    return retval
+
+def _evaluate_packed(expr_object, columns, num_points):
+    kind = expr_object.expr_kind
+    if kind == _constant_expression and _is_boolean(expr_object):
+        if expr_object.value_object.value_object:
+            return _tail_mask(num_points)
+        return numpy.zeros(_num_words(num_points), dtype=numpy.dtype('<u8'))
+    elif kind == _function_expression:
+        fun_info = expr_object.function_info
+        operator = _packed_operators.get(fun_info.function_name, None)
+        if (operator is not None and
+                fun_info.function_kind == semantics_types.FunctionKinds.interpreted_function and
+                all([ _is_boolean(child) for child in expr_object.children ])):
+            if fun_info.function_name in _short_circuit_evaluators:
+                try:
+                    return _evaluate_packed_short_circuit(fun_info.function_name,
+                                                          expr_object.children,
+                                                          columns, num_points)
+                except basetypes.PartialFunctionError:
+                    # Possibly undefined only on points where it does not
+                    # matter: evaluate column-wise, which masks those points
+                    pass
+            else:
+                children = [ _evaluate_packed(child, columns, num_points)
+                             for child in expr_object.children ]
+                return operator(*children)
+    # Atoms (comparisons, boolean parameters, ...) are evaluated column-wise
+    # and then packed
+    return _pack_column(_evaluate(expr_object, columns, num_points, None, None), num_points)
+
+def evaluate_predicate_batch(expr_object, columns, num_points):
+    """Evaluates the boolean expression expr_object on all the points
+    described by columns, and returns its truth values packed into a numpy
+    array of little-endian 64-bit words: bit i of word j is set iff the
+    predicate holds at point (64 * j + i).  Returns None if the predicate
+    cannot be evaluated in batch mode.  Raises basetypes.PartialFunctionError
+    if a partial function is undefined on any of the points."""
+    if columns is None or not _is_boolean(expr_object):
+        return None
+    try:
+        return _evaluate_packed(expr_object, columns, num_points) & _tail_mask(num_points)
+    except _UnsupportedExpression:
+        return None
+
+def predicate_words_to_positions(words, num_points):
+    """Returns the (sorted) indices of the points at which the packed
+    predicate words are set."""
+    bits = numpy.unpackbits(words.view(numpy.uint8), bitorder='little', count=num_points)
+    return numpy.flatnonzero(bits).tolist()
+
+def test_batch_evaluation():
+    import random
+    from core import synthesis_context
+    from semantics import semantics_core
+    from semantics import semantics_bv
+    from exprs import evaluation
+    from utils import bitvectors
+
+    syn_ctx = synthesis_context.SynthesisContext(semantics_core.CoreInstantiator(),
+                                                  semantics_bv.BVInstantiator())
+    bv_type = exprtypes.BitVectorType(_bv_size)
+    var_a = exprs.VariableExpression(syn_ctx.make_variable(bv_type, 'varA', 0))
+    var_b = exprs.VariableExpression(syn_ctx.make_variable(bv_type, 'varB', 1))
+    interesting = [ 0, 1, 63, 64, 65, (1 << 63), (1 << 64) - 1, (1 << 63) - 1 ]
+    points = []
+    for i in range(64):
+        a = random.choice(interesting) if i % 2 == 0 else random.getrandbits(_bv_size)
+        b = random.choice(interesting) if i % 3 == 0 else random.getrandbits(_bv_size)
+        points.append((exprs.Value(bitvectors.BitVector(a, _bv_size), bv_type),
+                       exprs.Value(bitvectors.BitVector(b, _bv_size), bv_type)))
+    columns = make_columns(points)
+    eval_context = evaluation.EvaluationContext()
+
+    for name in [ 'bvand', 'bvor', 'bvxor', 'bvadd', 'bvsub', 'bvmul', 'bvshl',
+                  'bvlshr', 'bvashr', 'bvule', 'bvsle', 'bvsge' ]:
+        expr = syn_ctx.make_function_expr(name, var_a, var_b)
+        expected = []
+        for point in points:
+            eval_context.set_valuation_map(point)
+            expected.append(_raw_value(evaluation.evaluate_expression_raw(expr, eval_context)))
+        actual = evaluate_expression_batch(expr, columns, len(points)).tolist()
+        assert expected == actual, name
+
+    for name in [ 'bvudiv', 'bvurem', 'bvsdiv', 'bvsrem' ]:
+        expr = syn_ctx.make_function_expr(name, var_a, var_b)
+        divisible = [ p for p in points if p[1].value_object.value != 0 ]
+        expected = []
+        for point in divisible:
+            eval_context.set_valuation_map(point)
+            expected.append(_raw_value(evaluation.evaluate_expression_raw(expr, eval_context)))
+        actual = evaluate_expression_batch(expr, make_columns(divisible), len(divisible)).tolist()
+        assert expected == actual, name
+
+    ule = syn_ctx.make_function_expr('bvule', var_a, var_b)
+    sle = syn_ctx.make_function_expr('bvsle', var_a, var_b)
+    eq = syn_ctx.make_function_expr('=', var_a, var_b)
+    predicates = [ ule, syn_ctx.make_function_expr('not', ule),
+                   syn_ctx.make_function_expr('and', ule, sle),
+                   syn_ctx.make_function_expr('or', eq, syn_ctx.make_function_expr('not', sle)),
+                   syn_ctx.make_function_expr('=>', sle, ule),
+                   syn_ctx.make_function_expr('ite', eq, sle, ule) ]
+    for num_points in [ 1, 63, 64 ]:
+        sub_points = points[:num_points]
+        sub_columns = make_columns(sub_points)
+        for pred in predicates:
+            expected = []
+            for i, point in enumerate(sub_points):
+                eval_context.set_valuation_map(point)
+                if evaluation.evaluate_expression_raw(pred, eval_context):
+                    expected.append(i)
+            words = evaluate_predicate_batch(pred, sub_columns, num_points)
+            assert expected == predicate_words_to_positions(words, num_points), str(pred)
+
+    # Short circuiting: the divisions are only evaluated where varB is not 0
+    zero = exprs.ConstantExpression(exprs.Value(bitvectors.BitVector(0, _bv_size), bv_type))
+    b_is_zero = syn_ctx.make_function_expr('=', var_b, zero)
+    b_is_nonzero = syn_ctx.make_function_expr('not', b_is_zero)
+    quotient = syn_ctx.make_function_expr('bvudiv', var_a, var_b)
+    param_x = exprs.VariableExpression(syn_ctx.make_variable(bv_type, 'x', 0))
+    param_y = exprs.VariableExpression(syn_ctx.make_variable(bv_type, 'y', 1))
+    param_z = exprs.VariableExpression(syn_ctx.make_variable(bv_type, 'z', 2))
+    if0 = semantics_types.MacroFunction('if0', 3, (bv_type, bv_type, bv_type), bv_type,
+            syn_ctx.make_function_expr('ite',
+                syn_ctx.make_function_expr('=', param_x, zero), param_y, param_z),
+            [ param_x, param_y, param_z ])
+    assert if0.is_linear and if0.short_circuits
+    terms = [ syn_ctx.make_function_expr('ite', b_is_zero, var_a, quotient),
+              exprs.FunctionExpression(if0, (var_b, var_a, quotient)) ]
+    predicates = [ syn_ctx.make_function_expr('and', b_is_nonzero,
+                       syn_ctx.make_function_expr('bvule', quotient, var_a)),
+                   syn_ctx.make_function_expr('or', b_is_zero,
+                       syn_ctx.make_function_expr('bvsge', quotient, var_a)),
+                   syn_ctx.make_function_expr('=>', b_is_nonzero,
+                       syn_ctx.make_function_expr('=', quotient, var_a)) ]
+    assert any([ p[1].value_object.value == 0 for p in points ])
+    value_lists = make_value_lists(points)
+    for expr in terms + predicates:
+        expected = []
+        for point in points:
+            eval_context.set_valuation_map(point)
+            expected.append(_raw_value(evaluation.evaluate_expression_raw(expr, eval_context)))
+        assert expected == evaluate_expression_batch(expr, columns, len(points)).tolist()
+        pointwise = evaluate_expression_pointwise(expr, value_lists, len(points))
+        assert expected == [ _raw_value(v) for v in pointwise ]
+        if expr in predicates:
+            words = evaluate_predicate_batch(expr, columns, len(points))
+            assert ([ i for i, v in enumerate(expected) if v ] ==
+                    predicate_words_to_positions(words, len(points)))
+
+    # Definedness masks: the divisions are undefined where (the guard does
+    # not hold and) varB is 0
+    unguarded = [ quotient,
+                  syn_ctx.make_function_expr('bvadd', quotient, var_a),
+                  syn_ctx.make_function_expr('ite', syn_ctx.make_function_expr('bvule', var_a, var_b),
+                                             quotient, var_b),
+                  syn_ctx.make_function_expr('or', syn_ctx.make_function_expr('bvule', var_a, zero),
+                      syn_ctx.make_function_expr('=', quotient, var_a)),
+                  exprs.FunctionExpression(if0, (var_a, quotient, var_b)) ]
+    for expr in terms + predicates + unguarded:
+        expected = []
+        for point in points:
+            eval_context.set_valuation_map(point)
+            try:
+                expected.append(_raw_value(evaluation.evaluate_expression_raw(expr, eval_context)))
+            except basetypes.PartialFunctionError:
+                expected.append(None)
+        (values, defined) = evaluate_expression_batch_with_definedness(expr, columns,
+                                                                       len(points))
+        (pointwise, pointwise_defined) = evaluate_expression_pointwise_with_definedness(
+                expr, value_lists, len(points))
+        if None not in expected:
+            assert defined is None and pointwise_defined is None
+            defined = pointwise_defined = [ True ] * len(points)
+        assert [ v is not None for v in expected ] == list(defined)
+        assert [ v is not None for v in expected ] == pointwise_defined
+        assert all([ e == v for (e, v, d) in zip(expected, values.tolist(), defined) if d ])
+        assert all([ e == _raw_value(v) for (e, v, d) in zip(expected, pointwise, defined) if d ])
+
+    test_int_batch_evaluation()
+    print('All batch evaluation tests passed!')
+
+def test_int_batch_evaluation():
+    import random
+    from core import synthesis_context
+    from semantics import semantics_core
+    from semantics import semantics_lia
+    from exprs import evaluation
+
+    syn_ctx = synthesis_context.SynthesisContext(semantics_core.CoreInstantiator(),
+                                                  semantics_lia.LIAInstantiator())
+    int_type = exprtypes.IntType()
+    variables = [ exprs.VariableExpression(syn_ctx.make_variable(int_type, name, i))
+                  for i, name in enumerate([ 'x', 'y', 'z' ]) ]
+    big = 1 << 62
+    leaves = variables + [ exprs.ConstantExpression(exprs.Value(v, int_type))
+                           for v in [ 0, 1, -3, big, -big, 1 << 70 ] ]
+    def random_term(depth):
+        if depth == 0:
+            return random.choice(leaves)
+        kind = random.randint(0, 4)
+        if kind == 0:
+            return syn_ctx.make_function_expr('ite', random_pred(depth - 1),
+                                              random_term(depth - 1), random_term(depth - 1))
+        elif kind == 1:
+            return syn_ctx.make_function_expr('-', random_term(depth - 1))
+        return syn_ctx.make_function_expr(random.choice([ '+', '-', '*', 'div', 'mod' ]),
+                                          random_term(depth - 1), random_term(depth - 1))
+    def random_pred(depth):
+        return syn_ctx.make_function_expr(random.choice([ '<', '<=', '>', '>=', '=' ]),
+                                          random_term(depth), random_term(depth))
+
+    # Points that fit in int64 (with values close to the bounds, so that the
+    # operations overflow), and points that do not
+    interesting = [ 0, 1, -1, 2, -2, big, -big, (1 << 63) - 1, -(1 << 63) ]
+    int64_points = [ tuple([ exprs.Value(random.choice(interesting), int_type)
+                             for v in variables ]) for i in range(32) ]
+    big_points = int64_points + [ tuple([ exprs.Value(1 << 64, int_type) for v in variables ]) ]
+    eval_context = evaluation.EvaluationContext()
+    for points in [ int64_points, big_points ]:
+        columns = make_columns(points)
+        for i in range(300):
+            expr = random_term(random.randint(1, 3)) if i % 2 == 0 else random_pred(2)
+            expected = []
+            for point in points:
+                eval_context.set_valuation_map(point)
+                try:
+                    expected.append(evaluation.evaluate_expression_raw(expr, eval_context))
+                except basetypes.PartialFunctionError:
+                    expected.append(None)
+            (values, defined) = evaluate_expression_batch_with_definedness(expr, columns,
+                                                                           len(points))
+            if defined is None:
+                defined = [ True ] * len(points)
+            assert [ v is not None for v in expected ] == list(defined)
+            assert all([ e == v for (e, v, d) in zip(expected, values.tolist(), defined) if d ])
+            # Integer columns hold python ints only if they do not fit in int64
+            assert values.dtype != numpy.object_ or not all([
+                -(1 << 63) <= v < (1 << 63) for v in values.tolist() ])
+
+if __name__ == '__main__':
+    test_batch_evaluation()
+
+#
+# batch_evaluation.py ends here
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+# bytecode.py ---
+#
+# Filename: bytecode.py
+#
+#
+# Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by The University of Pennsylvania
+# 4. Neither the name of the University of Pennsylvania nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+
+# Code:
+
+"""Lowers expressions into flat postfix code, run by a single loop over a
+preallocated stack.  A Code object holds a string of opcodes, one operand
+per opcode and a constant pool.  Applications of interpreted functions
+refer to their kernels (the eval_children functions of the semantics
+modules) by an index into a process wide kernel table, so code is compact
+and contains no expression objects.  The ite and boolean connectives are
+lowered to conditional jumps, so that they short circuit as in the
+interpreter, and the bodies of macros that use each of their parameters at
+most once are lowered inline, with the code for the arguments in place of
+the parameters (i.e., the arguments are passed by name).  Let bound
+variables live in evaluation.compiled_code_let_frame (shared with the
+closures of exprs.compilation): a let swaps the values it binds with the
+ones in their slots, keeping the latter on the stack until its body has
+been evaluated.
+
+Code is run with the same conventions as the closures of exprs.compilation:
+on an env (the tuple of raw values of the variables or formal parameters)
+and a map from unknown_function_ids to compiled interpretations, which may
+return poison.  Code lowered with poison values (see lower_expression())
+applies the poison kernels of partial functions, and checks for poison
+only right after the opcodes that can produce it; as an undefined value
+propagates to the result wherever it is evaluated, run_code() returns
+poison as soon as it sees one, without raising.
+Functions that are evaluated in a custom way are not lowered:
+lower_expression() returns None for them."""
+
+from exprs import evaluation
+from exprs import exprs
+from semantics import semantics_core
+from semantics import semantics_types
+from utils import basetypes
+from utils import bitvectors
+
+# if __name__ == '__main__':
+#     utils.print_module_misuse_and_exit()
+
+_variable_expression = exprs.ExpressionKinds.variable_expression
+_constant_expression = exprs.ExpressionKinds.constant_expression
+_function_expression = exprs.ExpressionKinds.function_expression
+_formal_parameter_expression = exprs.ExpressionKinds.formal_parameter_expression
+
+_interpreted_function = semantics_types.FunctionKinds.interpreted_function
+_synth_function = semantics_types.FunctionKinds.synth_function
+_macro_function = semantics_types.FunctionKinds.macro_function
+
+# opcodes: the operand is an env offset, an index into the constant pool,
+# or a kernel index
+_LOAD = 0
+_CONST = 1
+_APPLY1 = 2
+_APPLY2 = 3
+_APPLY3 = 4
+# operand: index of a (kernel index, arity) pair in the constant pool
+_APPLYN = 5
+# operand: index of a (unknown function id, arity) pair in the constant pool
+_CALL = 6
+# operand: index of a (Code, arity) pair in the constant pool
+_CALL_MACRO = 7
+# operand: the index of the opcode to jump to; the conditional jumps pop the
+# value they test
+_JUMP = 8
+_JUMP_IF_FALSE = 9
+_JUMP_IF_TRUE = 10
+# operand: a let frame slot
+_LOAD_LET = 11
+# operand: index of the tuple of slots bound by a let in the constant pool
+_BIND = 12
+_UNBIND = 13
+# Returns poison if the value on top of the stack is poison
+_EXIT_IF_UNDEFINED = 14
+# _APPLY2 followed by _EXIT_IF_UNDEFINED, for the (binary) partial functions
+_APPLY2_CHECKED = 15
+
+_apply_opcodes = { 1 : _APPLY1, 2 : _APPLY2, 3 : _APPLY3 }
+
+# kernels (eval_children, or eval_children_raw) of the interpreted functions
+# seen so far, by kernel index
+_kernels = []
+_kernel_indices = {}
+
+class _UnsupportedExpression(Exception):
+    pass
+
+class Code(object):
+    __slots__ = ['opcodes', 'operands', 'constants', 'stack_size', 'poison_values']
+
+    def __init__(self, opcodes, operands, constants, stack_size, poison_values):
+        self.opcodes = opcodes
+        self.operands = operands
+        self.constants = constants
+        self.stack_size = stack_size
+        self.poison_values = poison_values
+
+    def __len__(self):
+        return len(self.opcodes)
+
+def _kernel_index(kernel):
+    index = _kernel_indices.get(kernel, None)
+    if index is None:
+        index = len(_kernels)
+        _kernels.append(kernel)
+        _kernel_indices[kernel] = index
+    return index
+
+class _Lowering(object):
+    def __init__(self, raw_bitvectors, poison_values):
+        self.raw_bitvectors = raw_bitvectors
+        self.poison_values = poison_values
+        self.opcodes = []
+        self.operands = []
+        self.constants = []
+        self.depth = 0
+        self.max_depth = 0
+
+    def emit(self, opcode, operand, stack_effect):
+        self.opcodes.append(opcode)
+        self.operands.append(operand)
+        self.depth += stack_effect
+        self.max_depth = max(self.max_depth, self.depth)
+
+    def add_constant(self, value):
+        self.constants.append(value)
+        return len(self.constants) - 1
+
+    def emit_jump(self, opcode):
+        """Emits a jump with a target to be filled in by patch_jumps()."""
+        self.emit(opcode, None, 0 if opcode == _JUMP else -1)
+        return len(self.opcodes) - 1
+
+    def patch_jumps(self, jumps):
+        """Makes the given jumps target the next opcode emitted."""
+        for jump in jumps:
+            self.operands[jump] = len(self.opcodes)
+
+    def lower(self, expr_object, arguments=None):
+        """arguments are the (expression, arguments) pairs for the parameters
+        of the macro whose body is being lowered inline, if any."""
+        kind = expr_object.expr_kind
+        if kind == _variable_expression:
+            offset = expr_object.variable_info.variable_eval_offset
+            if offset == exprs.VariableInfo._undefined_offset:
+                self.lower_let_variable(expr_object.variable_info)
+            else:
+                self.emit(_LOAD, offset, 1)
+        elif kind == _formal_parameter_expression:
+            if arguments is not None:
+                self.lower(*arguments[expr_object.parameter_position])
+            else:
+                self.emit(_LOAD, expr_object.parameter_position, 1)
+        elif kind == _constant_expression:
+            value = expr_object.value_object.value_object
+            if self.raw_bitvectors:
+                value = bitvectors.raw_value(value)
+            self.emit(_CONST, self.add_constant(value), 1)
+        elif kind == _function_expression:
+            self.lower_application(expr_object, arguments)
+        else:
+            raise basetypes.UnhandledCaseError('Odd expression kind: %s' % kind)
+
+    def lower_let_variable(self, variable_info):
+        if variable_info.let_slot is None:
+            # Not bound by any let
+            raise _UnsupportedExpression()
+        evaluation.reserve_let_slots(evaluation.compiled_code_let_frame)
+        self.emit(_LOAD_LET, variable_info.let_slot, 1)
+
+    def lower_let(self, binding_slots, children, arguments):
+        for child in children[:-1]:
+            self.lower(child, arguments)
+        evaluation.reserve_let_slots(evaluation.compiled_code_let_frame)
+        slots_index = self.add_constant(binding_slots)
+        self.emit(_BIND, slots_index, 0)
+        self.lower(children[-1], arguments)
+        self.emit(_UNBIND, slots_index, -len(binding_slots))
+
+    def lower_ite(self, children, arguments):
+        (condition, then_branch, else_branch) = children
+        self.lower(condition, arguments)
+        to_else = self.emit_jump(_JUMP_IF_FALSE)
+        self.lower(then_branch, arguments)
+        to_end = self.emit_jump(_JUMP)
+        # the value of the then branch is not on the stack in the else branch
+        self.depth -= 1
+        self.patch_jumps([ to_else ])
+        self.lower(else_branch, arguments)
+        self.patch_jumps([ to_end ])
+
+    def lower_connective(self, children, arguments, jump_opcode, short_circuit_value):
+        """Lowers an and (or an or): the value of the first child that is
+        false (true) decides the result, otherwise it is the value of the
+        last child."""
+        short_circuits = []
+        for child in children[:-1]:
+            self.lower(child, arguments)
+            short_circuits.append(self.emit_jump(jump_opcode))
+        self.lower(children[-1], arguments)
+        to_end = self.emit_jump(_JUMP)
+        self.depth -= 1
+        self.patch_jumps(short_circuits)
+        self.emit(_CONST, self.add_constant(short_circuit_value), 1)
+        self.patch_jumps([ to_end ])
+
+    def lower_implies(self, children, arguments):
+        (antecedent, consequent) = children
+        self.lower(antecedent, arguments)
+        to_true = self.emit_jump(_JUMP_IF_FALSE)
+        self.lower(consequent, arguments)
+        to_end = self.emit_jump(_JUMP)
+        self.depth -= 1
+        self.patch_jumps([ to_true ])
+        self.emit(_CONST, self.add_constant(True), 1)
+        self.patch_jumps([ to_end ])
+
+    def lower_short_circuit(self, fun_info, children, arguments):
+        """Lowers the ite and the boolean connectives to jumps, returns False
+        for any other function."""
+        if isinstance(fun_info, semantics_core.IteFunction):
+            self.lower_ite(children, arguments)
+        elif isinstance(fun_info, semantics_core.AndFunction):
+            self.lower_connective(children, arguments, _JUMP_IF_FALSE, False)
+        elif isinstance(fun_info, semantics_core.OrFunction):
+            self.lower_connective(children, arguments, _JUMP_IF_TRUE, True)
+        elif isinstance(fun_info, semantics_core.ImpliesFunction):
+            self.lower_implies(children, arguments)
+        else:
+            return False
+        return True
+
+    def lower_application(self, expr_object, arguments):
+        fun_info = expr_object.function_info
+        fun_kind = fun_info.function_kind
+        arity = len(expr_object.children)
+        if fun_kind == _interpreted_function and isinstance(fun_info, semantics_core.LetFunction):
+            self.lower_let(fun_info.binding_slots, expr_object.children, arguments)
+            return
+        if (fun_kind == _interpreted_function and
+                self.lower_short_circuit(fun_info, expr_object.children, arguments)):
+            return
+        if fun_kind == _macro_function and fun_info.is_inlinable:
+            self.lower(fun_info.interpretation_expression,
+                       [ (child, arguments) for child in expr_object.children ])
+            return
+
+        for child in expr_object.children:
+            self.lower(child, arguments)
+
+        if fun_kind == _synth_function:
+            self.emit(_CALL, self.add_constant((fun_info.unknown_function_id, arity)), 1 - arity)
+        elif fun_kind == _macro_function:
+            body = lower_expression(fun_info.interpretation_expression, self.raw_bitvectors,
+                                    self.poison_values)
+            if body is None:
+                raise _UnsupportedExpression()
+            self.emit(_CALL_MACRO, self.add_constant((body, arity)), 1 - arity)
+        elif (fun_kind == _interpreted_function and
+              type(fun_info).evaluate is semantics_types.InterpretedFunctionBase.evaluate):
+            checked = self.poison_values and fun_info.is_partial
+            if checked:
+                kernel = fun_info.get_poison_kernel(self.raw_bitvectors)
+            elif self.raw_bitvectors:
+                kernel = fun_info.get_raw_kernel()
+            else:
+                kernel = fun_info.eval_children
+            if kernel is None:
+                raise _UnsupportedExpression()
+            kernel_index = _kernel_index(kernel)
+            if checked and arity == 2:
+                self.emit(_APPLY2_CHECKED, kernel_index, -1)
+                return
+            if arity in _apply_opcodes:
+                self.emit(_apply_opcodes[arity], kernel_index, 1 - arity)
+            else:
+                self.emit(_APPLYN, self.add_constant((kernel_index, arity)), 1 - arity)
+            if checked:
+                self.emit(_EXIT_IF_UNDEFINED, None, 0)
+        else:
+            raise _UnsupportedExpression()
+
+def lower_expression(expr_object, raw_bitvectors=False, poison_values=False):
+    """Returns the Code for expr_object, or None if it cannot be lowered.
+    raw_bitvectors selects the plain int representation of bitvectors, and
+    poison_values makes the code return evaluation.undefined_value where
+    expr_object is undefined, instead of raising (see exprs.compilation)."""
+    lowering = _Lowering(raw_bitvectors, poison_values)
+    try:
+        lowering.lower(expr_object)
+    except _UnsupportedExpression:
+        return None
+    return Code(bytes(lowering.opcodes), tuple(lowering.operands),
+                tuple(lowering.constants), lowering.max_depth, poison_values)
+
+def run_code(code, env, interpretations):
+    kernels = _kernels
+    let_frame = evaluation.compiled_code_let_frame
+    unbound_let_variable = evaluation.unbound_let_variable
+    undefined_value = evaluation.undefined_value
+    opcodes = code.opcodes
+    operands = code.operands
+    constants = code.constants
+    poison_values = code.poison_values
+    stack = [None] * code.stack_size
+    top = 0
+    pc = 0
+    num_opcodes = len(opcodes)
+    try:
+        while pc < num_opcodes:
+            opcode = opcodes[pc]
+            operand = operands[pc]
+            pc += 1
+            if opcode == _LOAD:
+                stack[top] = env[operand]
+                top += 1
+            elif opcode == _CONST:
+                stack[top] = constants[operand]
+                top += 1
+            elif opcode == _APPLY2:
+                top -= 1
+                stack[top - 1] = kernels[operand](stack[top - 1], stack[top])
+            elif opcode == _APPLY2_CHECKED:
+                top -= 1
+                value = kernels[operand](stack[top - 1], stack[top])
+                if value is undefined_value:
+                    break
+                stack[top - 1] = value
+            elif opcode == _APPLY1:
+                stack[top - 1] = kernels[operand](stack[top - 1])
+            elif opcode == _APPLY3:
+                top -= 2
+                stack[top - 1] = kernels[operand](stack[top - 1], stack[top], stack[top + 1])
+            elif opcode == _JUMP_IF_FALSE:
+                top -= 1
+                if not stack[top]:
+                    pc = operand
+            elif opcode == _JUMP_IF_TRUE:
+                top -= 1
+                if stack[top]:
+                    pc = operand
+            elif opcode == _JUMP:
+                pc = operand
+            elif opcode == _EXIT_IF_UNDEFINED:
+                if stack[top - 1] is undefined_value:
+                    break
+            elif opcode == _LOAD_LET:
+                value = let_frame[operand]
+                if value is unbound_let_variable:
+                    if poison_values:
+                        break
+                    raise basetypes.UnboundLetVariableError()
+                stack[top] = value
+                top += 1
+            elif opcode == _BIND:
+                slots = constants[operand]
+                base = top - len(slots)
+                for i, slot in enumerate(slots):
+                    stack[base + i], let_frame[slot] = let_frame[slot], stack[base + i]
+            elif opcode == _UNBIND:
+                slots = constants[operand]
+                base = top - 1 - len(slots)
+                for i, slot in enumerate(slots):
+                    let_frame[slot] = stack[base + i]
+                stack[base] = stack[top - 1]
+                top = base + 1
+            else:
+                (target, arity) = constants[operand]
+                args = tuple(stack[top - arity:top])
+                top -= arity
+                if opcode == _APPLYN:
+                    stack[top] = kernels[target](*args)
+                else:
+                    if opcode == _CALL:
+                        value = interpretations[target](args, interpretations)
+                    else:
+                        value = run_code(target, args, interpretations)
+                    if value is undefined_value:
+                        # A poison value returned by the interpretation or
+                        # the macro
+                        if poison_values:
+                            break
+                        raise basetypes.PartialFunctionError()
+                    stack[top] = value
+                top += 1
+        else:
+            return stack[0]
+    except:
+        # The values that the lets being run had saved on the stack are lost,
+        # so none of the let bound variables is bound any more
+        evaluation.clear_let_frame(let_frame)
+        raise
+    # Left the loop on poison
+    evaluation.clear_let_frame(let_frame)
+    return undefined_value
+
+def make_runner(code):
+    """Returns a function of (env, interpretations) that runs code."""
+    return lambda env, interpretations: run_code(code, env, interpretations)
+
+def test_bytecode():
+    from enumerators import enumerators
+    from exprs import evaluation
+    from exprs import exprtypes
+    generator = enumerators._generate_test_generators()
+    generator.set_size(6)
+    int_type = exprtypes.IntType()
+    points = [ tuple([ exprs.Value(v, int_type) for v in p ])
+               for p in [(1, 2, 3), (2, 5, 6), (6, 1, 3), (10, 4, 6), (7, 1, 5)] ]
+    eval_context = evaluation.EvaluationContext()
+    num_exprs = 0
+    for expr in generator.generate():
+        code = lower_expression(expr)
+        assert code is not None
+        assert len(code) >= exprs.get_expression_size(expr)
+        for point in points:
+            eval_context.set_valuation_map(point)
+            expected = evaluation.evaluate_expression_raw(expr, eval_context)
+            env = tuple([ value.value_object for value in point ])
+            assert run_code(code, env, None) == expected
+        num_exprs += 1
+    assert num_exprs > 0
+    print('Lowered and checked %d expressions.' % num_exprs)
+
+if __name__ == '__main__':
+    test_bytecode()
+
+#
+# bytecode.py ends here
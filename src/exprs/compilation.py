@@ -0,0 +1,873 @@
+#!/usr/bin/env python3
+# compilation.py ---
+#
+# Filename: compilation.py
+#
+#
+# Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by The University of Pennsylvania
+# 4. Neither the name of the University of Pennsylvania nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+
+# Code:
+
+"""Compiles expressions into (nested) python closures, so that evaluating an
+expression on a point is a chain of plain function calls, instead of a walk
+of the expression tree dispatching on expression and function kinds with an
+explicit evaluation stack (as in exprs.evaluation).
+
+A compiled expression is a function of (env, interpretations): env is the
+tuple of raw values (value_objects) of the variables, or of the formal
+parameters for the body of a function, and interpretations maps the
+unknown_function_ids of the functions being synthesized to the compiled
+bodies of their interpretations.  Evaluation short circuits exactly as in
+the interpreter: only the branch of an ite that is taken is evaluated, and
+and/or/=> stop as soon as their value is known.  Arguments to macros whose
+body uses each parameter at most once are passed by name (the body is
+compiled inline, over the compiled arguments), so that the branches of
+if0-style macros are not evaluated either.  Compiled code is therefore
+undefined on the same points as the interpreter (see below).
+Let bound variables are read from their slots in
+evaluation.compiled_code_let_frame, which a let sets (and restores) around
+the evaluation of its body.  Expressions with functions that are evaluated
+in a custom way are not compiled: compile_expression() returns None for
+them, and callers are expected to fall back to the interpreter.
+
+The engine used is picked by the EUSOLVER_EVALUATION_ENGINE environment
+variable, or by set_engine(): 'closure' (the default) compiles to nested
+closures as above, 'bytecode' lowers to the flat postfix code of
+exprs.bytecode, run by its stack machine.
+
+Bitvectors are represented in compiled code as picked by the
+EUSOLVER_BITVECTOR_VALUES environment variable, or by
+set_bitvector_values(): 'raw' (the default) uses plain ints, masked to the
+width, which comes from the static types of the operators (their
+eval_children_raw kernels), so that no BitVector object is allocated while
+evaluating; 'objects' uses utils.bitvectors.BitVector objects, as the
+interpreter does.  Either way, raw_point() converts points to the chosen
+representation, and make_point_evaluator() converts results back to
+BitVector objects.
+
+Where an expression is undefined (a partial function, such as div or
+bvudiv, is applied outside its domain, or a let bound variable is used
+outside its let), compiled code behaves as picked by the
+EUSOLVER_UNDEFINED_VALUES environment variable, or by set_undefined_values():
+'poison' (the default) makes it return evaluation.undefined_value, which
+propagates to the result wherever the exception would have, without
+raising and catching a python exception on every such point (partial
+functions are applied through their poison kernels, see
+InterpretedFunctionBase.get_poison_kernel()); 'exceptions'
+makes it raise basetypes.PartialFunctionError (or UnboundLetVariableError),
+as the interpreter does.  The closures check for poison only where it can
+occur: above applications of partial functions, of functions being
+synthesized, and of let bound variables."""
+
+import os
+
+from exprs import bytecode
+from exprs import evaluation
+from exprs import exprs
+from exprs import exprtypes
+from semantics import semantics_core
+from semantics import semantics_types
+from utils import basetypes
+from utils import bitvectors
+
+# if __name__ == '__main__':
+#     utils.print_module_misuse_and_exit()
+
+_variable_expression = exprs.ExpressionKinds.variable_expression
+_constant_expression = exprs.ExpressionKinds.constant_expression
+_function_expression = exprs.ExpressionKinds.function_expression
+_formal_parameter_expression = exprs.ExpressionKinds.formal_parameter_expression
+
+_interpreted_function = semantics_types.FunctionKinds.interpreted_function
+_synth_function = semantics_types.FunctionKinds.synth_function
+_macro_function = semantics_types.FunctionKinds.macro_function
+
+_max_cache_size = 1 << 16
+_compiled_cache = {}
+
+class _UnsupportedExpression(Exception):
+    pass
+
+def _compile_variable(offset):
+    return lambda env, interpretations: env[offset]
+
+def _compile_let_variable(variable_info):
+    let_frame = evaluation.compiled_code_let_frame
+    slot = variable_info.let_slot
+    if slot is None:
+        # Not bound by any let
+        if _poison_values:
+            undefined_value = evaluation.undefined_value
+            return lambda env, interpretations: undefined_value
+        def unbound(env, interpretations):
+            raise basetypes.UnboundLetVariableError()
+        return unbound
+
+    evaluation.reserve_let_slots(let_frame)
+    unbound_let_variable = evaluation.unbound_let_variable
+    if _poison_values:
+        undefined_value = evaluation.undefined_value
+        def lookup_or_poison(env, interpretations):
+            value = let_frame[slot]
+            if value is unbound_let_variable:
+                return undefined_value
+            return value
+        return lookup_or_poison
+
+    def lookup(env, interpretations):
+        value = let_frame[slot]
+        if value is unbound_let_variable:
+            raise basetypes.UnboundLetVariableError()
+        return value
+    return lookup
+
+def _compile_let(binding_slots, children, check_bindings):
+    """check_bindings is set if the value of a binding may be poison, which
+    makes the whole let poison."""
+    let_frame = evaluation.compiled_code_let_frame
+    evaluation.reserve_let_slots(let_frame)
+    undefined_value = evaluation.undefined_value
+    bindings = children[:-1]
+    in_expr = children[-1]
+    if len(binding_slots) == 1:
+        (slot,) = binding_slots
+        (binding,) = bindings
+        def let_one(env, interpretations):
+            value = binding(env, interpretations)
+            if check_bindings and value is undefined_value:
+                return undefined_value
+            saved = let_frame[slot]
+            let_frame[slot] = value
+            try:
+                return in_expr(env, interpretations)
+            finally:
+                let_frame[slot] = saved
+        return let_one
+
+    def let(env, interpretations):
+        values = [ b(env, interpretations) for b in bindings ]
+        if check_bindings and any([ v is undefined_value for v in values ]):
+            return undefined_value
+        saved = [ let_frame[slot] for slot in binding_slots ]
+        for slot, value in zip(binding_slots, values):
+            let_frame[slot] = value
+        try:
+            return in_expr(env, interpretations)
+        finally:
+            for slot, value in zip(binding_slots, saved):
+                let_frame[slot] = value
+    return let
+
+def _compile_constant(value):
+    if _raw_bitvectors:
+        value = bitvectors.raw_value(value)
+    return lambda env, interpretations: value
+
+def _get_kernel(fun_info):
+    if not _raw_bitvectors:
+        return fun_info.eval_children
+    kernel = fun_info.get_raw_kernel()
+    if kernel is None:
+        raise _UnsupportedExpression()
+    return kernel
+
+def _compile_args(children):
+    if len(children) == 1:
+        (c0,) = children
+        return lambda env, interpretations: (c0(env, interpretations),)
+    elif len(children) == 2:
+        (c0, c1) = children
+        return lambda env, interpretations: (c0(env, interpretations),
+                                             c1(env, interpretations))
+    return lambda env, interpretations: tuple([ c(env, interpretations) for c in children ])
+
+def _compile_checked_args(children):
+    """Like _compile_args(), but the arguments are None if any of them is
+    poison."""
+    undefined_value = evaluation.undefined_value
+    def args(env, interpretations):
+        values = tuple([ c(env, interpretations) for c in children ])
+        for value in values:
+            if value is undefined_value:
+                return None
+        return values
+    return args
+
+def _compile_interpreted_application(eval_children, children):
+    if len(children) == 0:
+        return lambda env, interpretations: eval_children()
+    elif len(children) == 1:
+        (c0,) = children
+        return lambda env, interpretations: eval_children(c0(env, interpretations))
+    elif len(children) == 2:
+        (c0, c1) = children
+        return lambda env, interpretations: eval_children(c0(env, interpretations),
+                                                          c1(env, interpretations))
+    elif len(children) == 3:
+        (c0, c1, c2) = children
+        return lambda env, interpretations: eval_children(c0(env, interpretations),
+                                                          c1(env, interpretations),
+                                                          c2(env, interpretations))
+    return lambda env, interpretations: eval_children(*[ c(env, interpretations)
+                                                         for c in children ])
+
+def _compile_checked_application(eval_children, children):
+    """The application of a partial function, or of any function to
+    arguments that may be poison, when undefined values are poison: the
+    kernel (the poison kernel of a partial function, see
+    InterpretedFunctionBase.get_poison_kernel()) is not applied to
+    poison."""
+    undefined_value = evaluation.undefined_value
+    if len(children) == 2:
+        (c0, c1) = children
+        def apply_two(env, interpretations):
+            a = c0(env, interpretations)
+            if a is undefined_value:
+                return undefined_value
+            b = c1(env, interpretations)
+            if b is undefined_value:
+                return undefined_value
+            return eval_children(a, b)
+        return apply_two
+
+    args = _compile_checked_args(children)
+    def apply(env, interpretations):
+        values = args(env, interpretations)
+        if values is None:
+            return undefined_value
+        return eval_children(*values)
+    return apply
+
+def _compile_ite(children, totals):
+    (c, t, e) = children
+    if totals[0]:
+        return lambda env, interpretations: \
+                t(env, interpretations) if c(env, interpretations) else e(env, interpretations)
+    undefined_value = evaluation.undefined_value
+    def ite(env, interpretations):
+        condition = c(env, interpretations)
+        if condition is undefined_value:
+            return undefined_value
+        return t(env, interpretations) if condition else e(env, interpretations)
+    return ite
+
+def _compile_checked_connective(children, short_circuit_value):
+    """An and (or an or, for a True short_circuit_value) some of whose
+    operands may be poison: a poison operand that is evaluated makes the
+    connective poison."""
+    undefined_value = evaluation.undefined_value
+    operands = children[:-1]
+    last = children[-1]
+    def connective(env, interpretations):
+        for operand in operands:
+            value = operand(env, interpretations)
+            if value is undefined_value:
+                return undefined_value
+            if bool(value) == short_circuit_value:
+                return short_circuit_value
+        return last(env, interpretations)
+    return connective
+
+def _compile_and(children, totals):
+    if not all(totals[:-1]):
+        return _compile_checked_connective(children, False)
+    if len(children) == 2:
+        (c0, c1) = children
+        return lambda env, interpretations: \
+                c0(env, interpretations) and c1(env, interpretations)
+    return lambda env, interpretations: all(c(env, interpretations) for c in children)
+
+def _compile_or(children, totals):
+    if not all(totals[:-1]):
+        return _compile_checked_connective(children, True)
+    if len(children) == 2:
+        (c0, c1) = children
+        return lambda env, interpretations: \
+                c0(env, interpretations) or c1(env, interpretations)
+    return lambda env, interpretations: any(c(env, interpretations) for c in children)
+
+def _compile_implies(children, totals):
+    (c0, c1) = children
+    if not totals[0]:
+        undefined_value = evaluation.undefined_value
+        def implies(env, interpretations):
+            antecedent = c0(env, interpretations)
+            if antecedent is undefined_value:
+                return undefined_value
+            return (not antecedent) or c1(env, interpretations)
+        return implies
+    return lambda env, interpretations: \
+            (not c0(env, interpretations)) or c1(env, interpretations)
+
+_short_circuit_compilers = [
+        (semantics_core.IteFunction, _compile_ite),
+        (semantics_core.AndFunction, _compile_and),
+        (semantics_core.OrFunction, _compile_or),
+        (semantics_core.ImpliesFunction, _compile_implies)
+        ]
+
+def _compile_application(expr_object, arguments):
+    fun_info = expr_object.function_info
+    fun_kind = fun_info.function_kind
+    compiled_children = [ _compile(child, arguments) for child in expr_object.children ]
+    children = [ c for (c, _) in compiled_children ]
+    totals = [ total for (_, total) in compiled_children ]
+    total = all(totals)
+
+    if fun_kind == _interpreted_function:
+        if isinstance(fun_info, semantics_core.LetFunction):
+            return (_compile_let(fun_info.binding_slots, children, not all(totals[:-1])),
+                    total)
+        for (function_class, compiler) in _short_circuit_compilers:
+            if isinstance(fun_info, function_class):
+                return (compiler(children, totals), total)
+
+    if fun_kind == _synth_function:
+        # The interpretation may be partial
+        unknown_function_id = fun_info.unknown_function_id
+        if total:
+            args = _compile_args(children)
+            return (lambda env, interpretations:
+                    interpretations[unknown_function_id](args(env, interpretations),
+                                                         interpretations),
+                    not _poison_values)
+        checked_args = _compile_checked_args(children)
+        undefined_value = evaluation.undefined_value
+        def call(env, interpretations):
+            values = checked_args(env, interpretations)
+            if values is None:
+                return undefined_value
+            return interpretations[unknown_function_id](values, interpretations)
+        return (call, False)
+    elif fun_kind == _macro_function and fun_info.is_inlinable:
+        # Pass the arguments by name
+        return _compile(fun_info.interpretation_expression, compiled_children)
+    elif fun_kind == _macro_function:
+        body = _compile_cached(fun_info.interpretation_expression)
+        if total:
+            args = _compile_args(children)
+            return (lambda env, interpretations: body(args(env, interpretations),
+                                                      interpretations),
+                    not _poison_values)
+        checked_args = _compile_checked_args(children)
+        undefined_value = evaluation.undefined_value
+        def expand(env, interpretations):
+            values = checked_args(env, interpretations)
+            if values is None:
+                return undefined_value
+            return body(values, interpretations)
+        return (expand, False)
+    elif (fun_kind == _interpreted_function and
+          type(fun_info).evaluate is semantics_types.InterpretedFunctionBase.evaluate):
+        kernel = _get_kernel(fun_info)
+        if _poison_values and (fun_info.is_partial or not total):
+            kernel = fun_info.get_poison_kernel(_raw_bitvectors)
+            if kernel is None:
+                raise _UnsupportedExpression()
+            return (_compile_checked_application(kernel, children), False)
+        return (_compile_interpreted_application(kernel, children), total)
+    else:
+        raise _UnsupportedExpression()
+
+def _compile(expr_object, arguments=None):
+    """Returns the compiled expression, and whether its value is total, i.e.,
+    never poison (always the case when undefined values are exceptions).
+    arguments are the compiled arguments (with their totality) of the macro
+    whose body is being compiled inline, if any."""
+    kind = expr_object.expr_kind
+    if kind == _variable_expression:
+        offset = expr_object.variable_info.variable_eval_offset
+        if offset == exprs.VariableInfo._undefined_offset:
+            return (_compile_let_variable(expr_object.variable_info), not _poison_values)
+        return (_compile_variable(offset), True)
+    elif kind == _formal_parameter_expression:
+        if arguments is not None:
+            return arguments[expr_object.parameter_position]
+        return (_compile_variable(expr_object.parameter_position), True)
+    elif kind == _constant_expression:
+        return (_compile_constant(expr_object.value_object.value_object), True)
+    elif kind == _function_expression:
+        return _compile_application(expr_object, arguments)
+    else:
+        raise basetypes.UnhandledCaseError('Odd expression kind: %s' % kind)
+
+def _compile_cached(expr_object):
+    retval = compile_expression(expr_object)
+    if retval is None:
+        raise _UnsupportedExpression()
+    return retval
+
+def _compile_to_closure(expr_object):
+    try:
+        return _compile(expr_object)[0]
+    except _UnsupportedExpression:
+        return None
+
+def _compile_to_bytecode(expr_object):
+    code = bytecode.lower_expression(expr_object, _raw_bitvectors, _poison_values)
+    if code is None:
+        return None
+    return bytecode.make_runner(code)
+
+_engines = {
+        'closure' : _compile_to_closure,
+        'bytecode' : _compile_to_bytecode
+        }
+
+def set_engine(engine_name):
+    global _compile_with_engine
+    engine = _engines.get(engine_name, None)
+    if engine is None:
+        raise basetypes.ArgumentError('Unknown evaluation engine: %s (expected one of %s)' %
+                                      (engine_name, ', '.join(sorted(_engines.keys()))))
+    _compile_with_engine = engine
+    _compiled_cache.clear()
+
+_compile_with_engine = None
+set_engine(os.environ.get('EUSOLVER_EVALUATION_ENGINE', 'closure'))
+
+_bitvector_values = [ 'objects', 'raw' ]
+
+def set_bitvector_values(representation):
+    global _raw_bitvectors
+    if representation not in _bitvector_values:
+        raise basetypes.ArgumentError('Unknown bitvector representation: %s (expected one of %s)' %
+                                      (representation, ', '.join(_bitvector_values)))
+    _raw_bitvectors = (representation == 'raw')
+    _compiled_cache.clear()
+
+_raw_bitvectors = True
+set_bitvector_values(os.environ.get('EUSOLVER_BITVECTOR_VALUES', 'raw'))
+
+_undefined_values = [ 'exceptions', 'poison' ]
+
+def set_undefined_values(representation):
+    global _poison_values
+    if representation not in _undefined_values:
+        raise basetypes.ArgumentError('Unknown representation of undefined values: %s '
+                                      '(expected one of %s)' %
+                                      (representation, ', '.join(_undefined_values)))
+    _poison_values = (representation == 'poison')
+    _compiled_cache.clear()
+
+_poison_values = True
+set_undefined_values(os.environ.get('EUSOLVER_UNDEFINED_VALUES', 'poison'))
+
+def compile_expression(expr_object):
+    """Returns the compiled form of expr_object, or None if it cannot be
+    compiled.  Results are memoized per (structurally equal) expression."""
+    try:
+        return _compiled_cache[expr_object]
+    except KeyError:
+        pass
+
+    retval = _compile_with_engine(expr_object)
+    if len(_compiled_cache) >= _max_cache_size:
+        _compiled_cache.clear()
+    _compiled_cache[expr_object] = retval
+    return retval
+
+def _memoize_interpretation(compiled, memo):
+    table = {}
+    def memoized(args, interpretations):
+        key = tuple(args)
+        if key in table:
+            memo.hits += 1
+            return table[key]
+        value = compiled(args, interpretations)
+        memo.misses += 1
+        table[key] = value
+        return value
+    return memoized
+
+def compile_interpretations(synth_funs, interpretations, memo=None):
+    """Compiles the interpretations of the given functions, returns None if
+    any of them cannot be compiled.  If memo (an evaluation.ApplicationMemo)
+    is given, the compiled interpretations memoize their values by the
+    values of the arguments, in tables that live as long as they do, and
+    count their hits and misses in memo."""
+    retval = {}
+    for synth_fun, interpretation in zip(synth_funs, interpretations):
+        compiled = compile_expression(interpretation)
+        if compiled is None:
+            return None
+        if memo is not None:
+            compiled = _memoize_interpretation(compiled, memo)
+        retval[synth_fun.unknown_function_id] = compiled
+    return retval
+
+def raw_point(point):
+    """The env for a point given as a tuple of exprs.Values."""
+    if _raw_bitvectors:
+        return tuple([ bitvectors.raw_value(value.value_object) for value in point ])
+    return tuple([ value.value_object for value in point ])
+
+def make_point_evaluator(expr_object, eval_context):
+    """Returns a function evaluating expr_object on a point (a tuple of
+    exprs.Values), through compiled code if possible, and through the
+    interpreter, using eval_context, otherwise.  Either way, it raises
+    basetypes.PartialFunctionError where expr_object is undefined."""
+    compiled = compile_expression(expr_object)
+    if compiled is not None:
+        value_type = exprs.get_expression_type(expr_object)
+        undefined_value = evaluation.undefined_value
+        if (_raw_bitvectors and
+                value_type.type_code == exprtypes.TypeCodes.bit_vector_type):
+            size = value_type.size
+            def evaluate_bitvector(point):
+                value = compiled(raw_point(point), None)
+                if value is undefined_value:
+                    raise basetypes.PartialFunctionError()
+                return bitvectors.BitVector(value, size)
+            return evaluate_bitvector
+        def evaluate(point):
+            value = compiled(raw_point(point), None)
+            if value is undefined_value:
+                raise basetypes.PartialFunctionError()
+            return value
+        return evaluate
+
+    def interpret(point):
+        eval_context.set_valuation_map(point)
+        return evaluation.evaluate_expression_raw(expr_object, eval_context)
+    return interpret
+
+def test_compilation():
+    from enumerators import enumerators
+    from exprs import exprtypes
+    generator = enumerators._generate_test_generators()
+    generator.set_size(6)
+    int_type = exprtypes.IntType()
+    points = [ tuple([ exprs.Value(v, int_type) for v in p ])
+               for p in [(1, 2, 3), (2, 5, 6), (6, 1, 3), (10, 4, 6), (7, 1, 5)] ]
+    eval_context = evaluation.EvaluationContext()
+    for engine in sorted(_engines.keys()):
+        set_engine(engine)
+        num_exprs = 0
+        for expr in generator.generate():
+            compiled = compile_expression(expr)
+            assert compiled is not None
+            assert compile_expression(expr) is compiled
+            for point in points:
+                eval_context.set_valuation_map(point)
+                expected = evaluation.evaluate_expression_raw(expr, eval_context)
+                assert compiled(raw_point(point), None) == expected
+            num_exprs += 1
+        assert num_exprs > 0
+        print('Compiled (%s) and checked %d expressions.' % (engine, num_exprs))
+    set_engine('closure')
+
+def test_short_circuit():
+    from core import synthesis_context
+    from exprs import exprtypes
+    from semantics import semantics_bv
+    from utils import bitvectors
+    syn_ctx = synthesis_context.SynthesisContext(semantics_core.CoreInstantiator(),
+                                                  semantics_bv.BVInstantiator())
+    bv_type = exprtypes.BitVectorType(64)
+    make_bv = lambda v: exprs.Value(bitvectors.BitVector(v, 64), bv_type)
+    var_a = exprs.VariableExpression(syn_ctx.make_variable(bv_type, 'varA', 0))
+    var_b = exprs.VariableExpression(syn_ctx.make_variable(bv_type, 'varB', 1))
+    zero = exprs.ConstantExpression(make_bv(0))
+    b_is_zero = syn_ctx.make_function_expr('=', var_b, zero)
+    quotient = syn_ctx.make_function_expr('bvudiv', var_a, var_b)
+    params = [ exprs.VariableExpression(syn_ctx.make_variable(bv_type, name, i))
+               for i, name in enumerate([ 'x', 'y', 'z' ]) ]
+    if0 = semantics_types.MacroFunction('if0', 3, (bv_type, bv_type, bv_type), bv_type,
+            syn_ctx.make_function_expr('ite',
+                syn_ctx.make_function_expr('=', params[0], zero), params[1], params[2]),
+            params)
+    exprs_to_check = [
+            syn_ctx.make_function_expr('ite', b_is_zero, var_a, quotient),
+            exprs.FunctionExpression(if0, (var_b, var_a,
+                exprs.FunctionExpression(if0, (var_a, var_b, quotient)))),
+            syn_ctx.make_function_expr('and',
+                syn_ctx.make_function_expr('not', b_is_zero),
+                syn_ctx.make_function_expr('bvule', quotient, var_a)),
+            syn_ctx.make_function_expr('or', b_is_zero,
+                syn_ctx.make_function_expr('bvule', var_a, quotient)),
+            syn_ctx.make_function_expr('=>',
+                syn_ctx.make_function_expr('not', b_is_zero),
+                syn_ctx.make_function_expr('=', quotient, var_a)) ]
+    points = [ (make_bv(a), make_bv(b)) for (a, b) in [ (7, 0), (0, 0), (7, 2), (0, 3) ] ]
+    eval_context = evaluation.EvaluationContext()
+    # The interpreter evaluates applications of if0 through their inlined
+    # bodies, which are never printed
+    application = exprs_to_check[1]
+    assert if0.is_inlinable
+    assert if0.inline(application) is if0.inline(application)
+    assert exprs.expression_to_string(application).startswith('(if0 ')
+    for engine in sorted(_engines.keys()):
+        set_engine(engine)
+        for expr in exprs_to_check:
+            compiled = compile_expression(expr)
+            assert compiled is not None
+            for point in points:
+                eval_context.set_valuation_map(point)
+                expected = evaluation.evaluate_expression_raw(expr, eval_context)
+                actual = compiled(raw_point(point), None)
+                assert bitvectors.raw_value(actual) == bitvectors.raw_value(expected)
+    set_engine('closure')
+
+    # A macro that is evaluated lazily (its parameter is used twice) leaves
+    # the valuation map of the caller in place when its body is undefined
+    from semantics import semantics_lia
+    syn_ctx = synthesis_context.SynthesisContext(semantics_core.CoreInstantiator(),
+                                                  semantics_lia.LIAInstantiator())
+    int_type = exprtypes.IntType()
+    make_int = lambda v: exprs.ConstantExpression(exprs.Value(v, int_type))
+    var_x = exprs.VariableExpression(syn_ctx.make_variable(int_type, 'x', 0))
+    param = exprs.VariableExpression(syn_ctx.make_variable(int_type, 'a', 0))
+    macro = semantics_types.MacroFunction('m', 1, (int_type,), int_type,
+            syn_ctx.make_function_expr('ite',
+                syn_ctx.make_function_expr('>=', param, make_int(0)),
+                syn_ctx.make_function_expr('div', make_int(1), param), param),
+            [ param ])
+    assert macro.short_circuits and not macro.is_inlinable
+    application = exprs.FunctionExpression(macro,
+            (syn_ctx.make_function_expr('+', var_x, make_int(2)),))
+    for (x, expected) in [ (-2, None), (-3, -1), (-1, 1) ]:
+        point = (exprs.Value(x, int_type),)
+        eval_context.set_valuation_map(point)
+        try:
+            actual = evaluation.evaluate_expression_raw(application, eval_context)
+        except basetypes.PartialFunctionError:
+            actual = None
+        assert actual == expected
+        assert eval_context.valuation_map is point
+    print('Checked short circuit evaluation of %d expressions.' % (len(exprs_to_check) + 1))
+
+def test_let_bindings():
+    from core import synthesis_context
+    from exprs import exprtypes
+    from semantics import semantics_lia
+    syn_ctx = synthesis_context.SynthesisContext(semantics_core.CoreInstantiator(),
+                                                  semantics_lia.LIAInstantiator())
+    int_type = exprtypes.IntType()
+    var_x = exprs.VariableExpression(syn_ctx.make_variable(int_type, 'x', 0))
+    var_y = syn_ctx.make_variable_expr(int_type, 'y')
+    zero = exprs.ConstantExpression(exprs.Value(0, int_type))
+    one = exprs.ConstantExpression(exprs.Value(1, int_type))
+    def make_let(bound_expr, in_expr):
+        let_function = semantics_core.LetFunction([ 'y' ], [ var_y ], [ int_type ], int_type)
+        return exprs.FunctionExpression(let_function, (bound_expr, in_expr))
+    add = lambda a, b: syn_ctx.make_function_expr('+', a, b)
+    # (let ((y (+ x 1))) (+ (let ((y (+ y y))) y) y)), the inner y shadows
+    # the outer one
+    shadowing = make_let(add(var_x, one), add(make_let(add(var_y, var_y), var_y), var_y))
+    # y is bound only while the let is evaluated
+    partial = make_let(syn_ctx.make_function_expr('div', one, var_x), var_y)
+    unbound = add(var_y, one)
+    points = [ (exprs.Value(v, int_type),) for v in [ 0, 1, 5 ] ]
+    eval_context = evaluation.EvaluationContext()
+    for representation in _undefined_values:
+        set_undefined_values(representation)
+        for engine in sorted(_engines.keys()):
+            set_engine(engine)
+            for expr in [ shadowing, partial, unbound ]:
+                compiled = compile_expression(expr)
+                assert compiled is not None
+                for point in points:
+                    eval_context.set_valuation_map(point)
+                    try:
+                        expected = evaluation.evaluate_expression_raw(expr, eval_context)
+                    except (basetypes.PartialFunctionError,
+                            basetypes.UnboundLetVariableError) as e:
+                        expected = evaluation.undefined_value if _poison_values else type(e)
+                    try:
+                        actual = compiled(raw_point(point), None)
+                    except (basetypes.PartialFunctionError,
+                            basetypes.UnboundLetVariableError) as e:
+                        actual = type(e)
+                    assert actual == expected
+    assert compile_expression(shadowing)((5,), None) == 18
+    set_engine('closure')
+    print('Checked let bindings.')
+
+def test_bitvector_values():
+    import random
+    from core import synthesis_context
+    from exprs import exprtypes
+    from semantics import semantics_bv
+    syn_ctx = synthesis_context.SynthesisContext(semantics_core.CoreInstantiator(),
+                                                  semantics_bv.BVInstantiator())
+    operators = [ 'bvnot', 'bvneg', 'bvand', 'bvor', 'bvxor', 'bvadd', 'bvsub', 'bvmul',
+                  'bvudiv', 'bvurem', 'bvsdiv', 'bvsrem', 'bvshl', 'bvlshr', 'bvashr' ]
+    eval_context = evaluation.EvaluationContext()
+    for size in [ 8, 64 ]:
+        bv_type = exprtypes.BitVectorType(size)
+        (mask, sign_mask) = bitvectors.get_width_masks(size)
+        variables = [ exprs.VariableExpression(syn_ctx.make_variable(bv_type, 'v%d_%d' % (size, i), i))
+                      for i in range(2) ]
+        leaves = variables + [ exprs.ConstantExpression(exprs.Value(bitvectors.BitVector(v, size), bv_type))
+                               for v in [ 0, 1, sign_mask, mask ] ]
+        def random_expr(depth):
+            if depth == 0:
+                return random.choice(leaves)
+            operator = random.choice(operators)
+            if operator in [ 'bvnot', 'bvneg' ]:
+                return syn_ctx.make_function_expr(operator, random_expr(depth - 1))
+            return syn_ctx.make_function_expr(operator, random_expr(depth - 1), random_expr(depth - 1))
+        interesting = [ 0, 1, 2, size - 1, size, sign_mask, sign_mask - 1, mask ]
+        points = [ tuple([ exprs.Value(bitvectors.BitVector(random.choice(interesting) if random.random() < 0.5
+                                                            else random.getrandbits(size), size), bv_type)
+                           for i in range(2) ])
+                   for j in range(32) ]
+        exprs_to_check = [ random_expr(random.randint(1, 3)) for i in range(200) ]
+        exprs_to_check += [ syn_ctx.make_function_expr(p, random_expr(1), random_expr(1))
+                            for p in [ 'bvule', 'bvsle', 'bvsge' ] for i in range(20) ]
+        for representation in _bitvector_values:
+            set_bitvector_values(representation)
+            for engine in sorted(_engines.keys()):
+                set_engine(engine)
+                for expr in exprs_to_check:
+                    evaluate = make_point_evaluator(expr, eval_context)
+                    for point in points:
+                        eval_context.set_valuation_map(point)
+                        try:
+                            expected = evaluation.evaluate_expression_raw(expr, eval_context)
+                        except basetypes.PartialFunctionError:
+                            expected = basetypes.PartialFunctionError
+                        try:
+                            actual = evaluate(point)
+                        except basetypes.PartialFunctionError:
+                            actual = basetypes.PartialFunctionError
+                        assert actual == expected, exprs.expression_to_string(expr)
+    set_bitvector_values('raw')
+    set_engine('closure')
+    print('Checked raw and object bitvector evaluation.')
+
+def test_undefined_values():
+    import random
+    from core import synthesis_context
+    from exprs import exprtypes
+    from semantics import semantics_lia
+    syn_ctx = synthesis_context.SynthesisContext(semantics_core.CoreInstantiator(),
+                                                  semantics_lia.LIAInstantiator())
+    int_type = exprtypes.IntType()
+    variables = [ exprs.VariableExpression(syn_ctx.make_variable(int_type, name, i))
+                  for i, name in enumerate([ 'x', 'y' ]) ]
+    leaves = variables + [ exprs.ConstantExpression(exprs.Value(v, int_type)) for v in [ 0, 1, -2 ] ]
+    # A function being synthesized, interpreted as (div y x)
+    synth_fun = syn_ctx.make_synth_function('f', [ int_type, int_type ], int_type)
+    params = [ exprs.FormalParameterExpression(synth_fun, int_type, i) for i in range(2) ]
+    interpretation = syn_ctx.make_function_expr('div', params[1], params[0])
+    # A macro that uses its parameter twice, so that it is not inlined
+    param = exprs.VariableExpression(syn_ctx.make_variable(int_type, 'p', 0))
+    twice = semantics_types.MacroFunction('twice', 1, (int_type,), int_type,
+            syn_ctx.make_function_expr('+', param, param), [ param ])
+    assert not twice.is_inlinable
+    def random_term(depth):
+        if depth == 0:
+            return random.choice(leaves)
+        kind = random.randint(0, 5)
+        if kind == 0:
+            return syn_ctx.make_function_expr('ite', random_pred(depth - 1),
+                                              random_term(depth - 1), random_term(depth - 1))
+        elif kind == 1:
+            return exprs.FunctionExpression(twice, (random_term(depth - 1),))
+        elif kind == 2:
+            return syn_ctx.make_function_expr(synth_fun, random_term(depth - 1),
+                                              random_term(depth - 1))
+        return syn_ctx.make_function_expr(random.choice([ 'div', 'mod', '+', '-' ]),
+                                          random_term(depth - 1), random_term(depth - 1))
+    def random_pred(depth):
+        kind = random.randint(0, 3)
+        if kind == 0 and depth > 0:
+            return syn_ctx.make_function_expr(random.choice([ 'and', 'or', '=>' ]),
+                                              random_pred(depth - 1), random_pred(depth - 1))
+        return syn_ctx.make_function_expr(random.choice([ '=', '<=' ]),
+                                          random_term(depth), random_term(depth))
+    exprs_to_check = ([ random_term(random.randint(1, 3)) for i in range(200) ] +
+                      [ random_pred(random.randint(1, 3)) for i in range(200) ])
+    points = [ (exprs.Value(x, int_type), exprs.Value(y, int_type))
+               for (x, y) in [ (0, 0), (0, 3), (2, 0), (-3, 7), (4, 4) ] ]
+    eval_context = evaluation.EvaluationContext()
+    eval_context.set_interpretation(synth_fun, interpretation)
+    # The same, with the applications of the function being synthesized
+    # memoized
+    memo_eval_context = evaluation.EvaluationContext()
+    memo_eval_context.set_interpretation(synth_fun, interpretation)
+    memo_eval_context.application_memo = evaluation.ApplicationMemo()
+    num_undefined = 0
+    # Counts the PartialFunctionErrors raised
+    num_raised = [ 0 ]
+    class CountedPartialFunctionError(basetypes.PartialFunctionError):
+        def __init__(self):
+            num_raised[0] += 1
+    original_error = basetypes.PartialFunctionError
+    basetypes.PartialFunctionError = CountedPartialFunctionError
+    for engine in sorted(_engines.keys()):
+        set_engine(engine)
+        set_undefined_values('poison')
+        interpretations = compile_interpretations([ synth_fun ], [ interpretation ])
+        memo = evaluation.ApplicationMemo()
+        memoized_interpretations = compile_interpretations([ synth_fun ], [ interpretation ], memo)
+        for expr in exprs_to_check:
+            compiled = compile_expression(expr)
+            assert compiled is not None
+            for point in points:
+                eval_context.set_valuation_map(point)
+                memo_eval_context.set_valuation_map(point)
+                try:
+                    expected = evaluation.evaluate_expression_raw(expr, eval_context)
+                except basetypes.PartialFunctionError:
+                    expected = evaluation.undefined_value
+                    num_undefined += 1
+                try:
+                    memoized = evaluation.evaluate_expression_raw(expr, memo_eval_context)
+                except basetypes.PartialFunctionError:
+                    memoized = evaluation.undefined_value
+                assert memoized is expected or memoized == expected
+                # Compiled code makes poison without raising any exception
+                num_raised_before = num_raised[0]
+                actual = compiled(raw_point(point), interpretations)
+                assert actual is expected or actual == expected, exprs.expression_to_string(expr)
+                actual = compiled(raw_point(point), memoized_interpretations)
+                assert actual is expected or actual == expected, exprs.expression_to_string(expr)
+                assert num_raised[0] == num_raised_before, exprs.expression_to_string(expr)
+        assert memo.hits > 0
+    basetypes.PartialFunctionError = original_error
+    assert num_undefined > 0 and num_raised[0] > 0
+    assert memo_eval_context.application_memo.hits > 0
+    set_undefined_values('poison')
+    set_engine('closure')
+    print('Checked poison values on %d undefined points.' % num_undefined)
+
+if __name__ == '__main__':
+    test_compilation()
+    test_short_circuit()
+    test_let_bindings()
+    test_bitvector_values()
+    test_undefined_values()
+
+#
+# compilation.py ends here
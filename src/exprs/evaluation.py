@@ -49,6 +49,78 @@ _constant_expression = exprs.ExpressionKinds.constant_expression
 _function_expression = exprs.ExpressionKinds.function_expression
 _formal_parameter_expression = exprs.ExpressionKinds.formal_parameter_expression
 
+# Variables bound by lets are given (process wide) slot numbers when the let
+# is constructed. The value currently bound to a variable is kept at its slot
+# in a let frame: each EvaluationContext has its own, and compiled code
+# (exprs.compilation, exprs.bytecode) shares compiled_code_let_frame. A let
+# saves the values it shadows and restores them when it is done, so a frame
+# is allocated once and reused for every evaluation.
+unbound_let_variable = object()
+_num_let_slots = 0
+
+def get_let_slot(variable_info):
+    """Returns the let frame slot of a let bound variable, allocating one if
+    it does not have one yet."""
+    global _num_let_slots
+    if variable_info.let_slot is None:
+        variable_info.let_slot = _num_let_slots
+        _num_let_slots += 1
+    return variable_info.let_slot
+
+def reserve_let_slots(let_frame):
+    """Makes the let frame large enough for all the slots allocated so far."""
+    if len(let_frame) < _num_let_slots:
+        let_frame.extend([ unbound_let_variable ] * (_num_let_slots - len(let_frame)))
+
+def clear_let_frame(let_frame):
+    for i in range(len(let_frame)):
+        let_frame[i] = unbound_let_variable
+
+def lookup_let_variable(let_frame, variable_info):
+    """Returns the value bound to the let bound variable, raises
+    UnboundLetVariableError if there is none."""
+    slot = variable_info.let_slot
+    if slot is None or slot >= len(let_frame):
+        raise basetypes.UnboundLetVariableError()
+    value = let_frame[slot]
+    if value is unbound_let_variable:
+        raise basetypes.UnboundLetVariableError()
+    return value
+
+compiled_code_let_frame = []
+
+class _UndefinedValue(object):
+    """The value of an expression at a point where it is undefined (a
+    partial function applied outside its domain, or an unbound let variable)
+    when undefined values are poison rather than exceptions (see
+    exprs.compilation). Poison propagates exactly as the exception would
+    have: through every strict operator, and through the ite and the
+    boolean connectives only if the operand that is undefined is evaluated.
+    Using it as a truth value raises the exception instead."""
+    __slots__ = []
+
+    def __bool__(self):
+        raise basetypes.PartialFunctionError()
+
+    def __repr__(self):
+        return 'undefined'
+
+undefined_value = _UndefinedValue()
+
+class ApplicationMemo(object):
+    """A memo table of the values of the applications of the functions being
+    synthesized, keyed by the function and the values of the arguments.  It
+    is only valid for one interpretation of the functions, so users clear()
+    it whenever the interpretations change; hits and misses are counted over
+    its whole lifetime."""
+    def __init__(self):
+        self.table = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.table = {}
+
 def evaluate_term_raw(expr_object, eval_context):
     return evaluate_expression_raw(expr_object, eval_context)
 
@@ -62,11 +134,8 @@ def evaluate_expression_on_stack(expr_object, eval_context):
     if (kind == _variable_expression):
         o = expr_object.variable_info.variable_eval_offset
         if o == exprs.VariableInfo._undefined_offset:
-            value = eval_context.lookup_let_variable(expr_object)
-            if value is not None:
-                eval_context.push(value)
-            else:
-                raise basetypes.UnboundLetVariableError()
+            eval_context.push(lookup_let_variable(eval_context.let_frame,
+                                                  expr_object.variable_info))
         else:
             eval_context.push(eval_context.valuation_map[o].value_object)
     elif (kind == _formal_parameter_expression):
@@ -103,8 +172,10 @@ def evaluate_expression_raw(expr_object, eval_context):
         '''
         ret = retval
     except:
-        # reset the stack
+        # reset the stack, the values saved by the lets being evaluated are
+        # lost with it
         eval_context.eval_stack_top = 0
+        eval_context.clear_let_frame()
         raise
     return ret
 
@@ -120,24 +191,13 @@ class EvaluationContext(object):
         self.eval_stack_top = 0
         self.valuation_map = None
         self.interpretation_map = {}
-        self.let_variable_stack = []
-
-    def push_let_variables(self, bindings):
-        self.let_variable_stack.append(bindings)
-
-    def pop_let_variables(self):
-        self.let_variable_stack.pop()
-
-    def peek_let_variables(self):
-        if len(self.let_variable_stack) == 0:
-            return {}
-        return self.let_variable_stack[-1]
+        self.let_frame = []
+        # If set, the applications of the functions being synthesized are
+        # memoized in this ApplicationMemo
+        self.application_memo = None
 
-    def lookup_let_variable(self, let_variable):
-        for bindings in reversed(self.let_variable_stack):
-            if let_variable in bindings:
-                return bindings[let_variable]
-        return None
+    def clear_let_frame(self):
+        clear_let_frame(self.let_frame)
 
     def peek(self, peek_depth = 0):
         return self.eval_stack[self.eval_stack_top - 1 - peek_depth]
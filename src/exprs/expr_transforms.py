@@ -39,6 +39,7 @@
 # Code:
 
 from utils import basetypes
+from exprs import evaluation
 from exprs import exprs
 from exprs import exprtypes
 from semantics import semantics_types
@@ -457,6 +458,153 @@ def _intro_new_universal_vars(clauses, syn_ctx, uf_info):
         retval.append(syn_ctx.make_ac_function_expr('or', *eq_constraints))
     return (retval, intro_vars)
 
+def _depends_on_synth_functions(expr_object, memo):
+    """Whether the value of expr_object (at a point) may depend on the
+    interpretations of the functions being synthesized.  Let bound variables
+    and formal parameters may be bound to such values.  memo maps the id()s
+    of the expressions seen so far to (expression, result) pairs."""
+    entry = memo.get(id(expr_object), None)
+    if entry is not None and entry[0] is expr_object:
+        return entry[1]
+    kind = expr_object.expr_kind
+    if kind == exprs.ExpressionKinds.variable_expression:
+        retval = (expr_object.variable_info.variable_eval_offset ==
+                  exprs.VariableInfo._undefined_offset)
+    elif kind == exprs.ExpressionKinds.formal_parameter_expression:
+        retval = True
+    elif kind == exprs.ExpressionKinds.function_expression:
+        retval = (expr_object.function_info.function_kind ==
+                  semantics_types.FunctionKinds.synth_function)
+        for child in expr_object.children:
+            # Not short circuited: the children are all memoized
+            retval = _depends_on_synth_functions(child, memo) or retval
+    else:
+        retval = False
+    memo[id(expr_object)] = (expr_object, retval)
+    return retval
+
+def _make_constant(value, value_type):
+    return exprs.ConstantExpression(exprs.Value(value, value_type))
+
+def _fold_connective(fun_info, children, short_circuit_value):
+    """Folds an and (or an or, for a True short_circuit_value) with some
+    constant children.  The constants that do not decide the value are
+    dropped, and the children after one that does are never evaluated.  A
+    child that is not constant keeps the constants after it, as its value
+    may be undefined."""
+    retval = []
+    for child in children:
+        if child.expr_kind != exprs.ExpressionKinds.constant_expression:
+            retval.append(child)
+        elif bool(child.value_object.value_object) == short_circuit_value:
+            if len(retval) == 0:
+                return child
+            retval.append(child)
+            break
+    if len(retval) == 0:
+        return _make_constant(not short_circuit_value, exprtypes.BoolType())
+    if len(retval) == 1:
+        return retval[0]
+    return exprs.FunctionExpression(fun_info, tuple(retval))
+
+def fold_synth_free_subterms(expr_object, point, eval_context, memo):
+    """Returns the residual of expr_object at the point: every subterm whose
+    value does not depend on the functions being synthesized is replaced by
+    its value at the point, and the ite and the boolean connectives with
+    constant operands are simplified away.  The residual has the same value
+    as expr_object at the point, under any interpretation of the functions
+    being synthesized, and is undefined exactly where expr_object is: a
+    subterm that is undefined at the point is left alone.  The subterms are
+    evaluated with eval_context, whose valuation map is set to the point
+    for each of them.  memo is passed on to _depends_on_synth_functions(),
+    and can be shared by the calls for all points."""
+    if not _depends_on_synth_functions(expr_object, memo):
+        kind = expr_object.expr_kind
+        if kind == exprs.ExpressionKinds.constant_expression:
+            return expr_object
+        elif kind == exprs.ExpressionKinds.variable_expression:
+            offset = expr_object.variable_info.variable_eval_offset
+            return exprs.ConstantExpression(point[offset])
+        eval_context.valuation_map = point
+        try:
+            value = evaluation.evaluate_expression_raw(expr_object, eval_context)
+        except (basetypes.PartialFunctionError, basetypes.UnboundLetVariableError):
+            return expr_object
+        return _make_constant(value, exprs.get_expression_type(expr_object))
+    if expr_object.expr_kind != exprs.ExpressionKinds.function_expression:
+        return expr_object
+
+    fun_info = expr_object.function_info
+    if (fun_info.function_kind == semantics_types.FunctionKinds.macro_function and
+            fun_info.is_inlinable):
+        return fold_synth_free_subterms(fun_info.inline(expr_object), point, eval_context, memo)
+    children = [ fold_synth_free_subterms(child, point, eval_context, memo)
+                 for child in expr_object.children ]
+    if fun_info.function_kind == semantics_types.FunctionKinds.interpreted_function:
+        function_name = fun_info.function_name
+        first = children[0] if len(children) > 0 else None
+        first_is_constant = (first is not None and
+                             first.expr_kind == exprs.ExpressionKinds.constant_expression)
+        if function_name == 'ite' and first_is_constant:
+            return children[1] if first.value_object.value_object else children[2]
+        elif function_name == '=>' and first_is_constant:
+            if first.value_object.value_object:
+                return children[1]
+            return _make_constant(True, exprtypes.BoolType())
+        elif function_name == 'and':
+            return _fold_connective(fun_info, children, False)
+        elif function_name == 'or':
+            return _fold_connective(fun_info, children, True)
+    return exprs.FunctionExpression(fun_info, tuple(children))
+
+def _is_total(expr_object):
+    """Whether expr_object is defined everywhere: it applies no partial,
+    macro or unknown functions, and uses no let bound variables."""
+    kind = expr_object.expr_kind
+    if kind == exprs.ExpressionKinds.variable_expression:
+        return (expr_object.variable_info.variable_eval_offset !=
+                exprs.VariableInfo._undefined_offset)
+    if kind != exprs.ExpressionKinds.function_expression:
+        return True
+    fun_info = expr_object.function_info
+    return (fun_info.function_kind == semantics_types.FunctionKinds.interpreted_function and
+            not fun_info.is_partial and
+            all([ _is_total(child) for child in expr_object.children ]))
+
+def _substitute_formal_parameters(expr_object, arguments):
+    kind = expr_object.expr_kind
+    if kind == exprs.ExpressionKinds.formal_parameter_expression:
+        return arguments[expr_object.parameter_position]
+    if kind != exprs.ExpressionKinds.function_expression:
+        return expr_object
+    return exprs.FunctionExpression(expr_object.function_info,
+            tuple([ _substitute_formal_parameters(child, arguments)
+                    for child in expr_object.children ]))
+
+def inline_interpretations(expr_object, interpretations):
+    """Returns expr_object with every application of a function being
+    synthesized replaced by its interpretation (from interpretations, a
+    map from unknown_function_ids to expressions over the formal
+    parameters), with the arguments substituted for the formal parameters.
+    The applications evaluate all their arguments and the interpretation
+    may not, so this is done only if the arguments are defined everywhere:
+    returns None otherwise."""
+    if expr_object.expr_kind != exprs.ExpressionKinds.function_expression:
+        return expr_object
+    children = []
+    for child in expr_object.children:
+        inlined = inline_interpretations(child, interpretations)
+        if inlined is None:
+            return None
+        children.append(inlined)
+    fun_info = expr_object.function_info
+    if fun_info.function_kind == semantics_types.FunctionKinds.synth_function:
+        if not all([ _is_total(child) for child in children ]):
+            return None
+        return _substitute_formal_parameters(interpretations[fun_info.unknown_function_id],
+                                             children)
+    return exprs.FunctionExpression(fun_info, tuple(children))
+
 def canonicalize_multipoint_specification(expr, syn_ctx):
     orig_variable_set = gather_variables(expr)
     orig_variable_list = [x.variable_info for x in orig_variable_set]
@@ -601,8 +749,72 @@ def test_cnf_conversion():
     # print(check_single_invocation_property(separable, syn_ctx))
     canonicalize_specification(separable, syn_ctx)
 
+def test_fold_synth_free_subterms():
+    from core import synthesis_context
+    from semantics import semantics_core
+    from semantics import semantics_lia
+
+    syn_ctx = synthesis_context.SynthesisContext(semantics_core.CoreInstantiator(),
+                                                 semantics_lia.LIAInstantiator())
+    int_type = exprtypes.IntType()
+    x = exprs.VariableExpression(syn_ctx.make_variable(int_type, 'x', 0))
+    y = exprs.VariableExpression(syn_ctx.make_variable(int_type, 'y', 1))
+    max2 = syn_ctx.make_synth_function('max2', [ int_type, int_type ], int_type)
+    app = syn_ctx.make_function_expr(max2, x, y)
+    zero = exprs.ConstantExpression(exprs.Value(0, int_type))
+    make = syn_ctx.make_function_expr
+    # (and (=> (<= x y) (= (max2 x y) y)) (=> (<= y x) (= (max2 x y) x))
+    #      (or (>= (div x y) 1) (>= (max2 x y) x) (= x x)))
+    spec = syn_ctx.make_ac_function_expr('and',
+            make('=>', make('<=', x, y), make('=', app, y)),
+            make('=>', make('<=', y, x), make('=', app, x)),
+            syn_ctx.make_ac_function_expr('or',
+                make('>=', make('div', x, y), exprs.ConstantExpression(exprs.Value(1, int_type))),
+                make('>=', app, x), make('=', x, x)),
+            make('ite', make('=', x, zero), make('>=', app, zero), make('=', x, x)))
+    # (ite (= (max2 x y) 0) (= (m (+ x 2)) 5) (= (max2 x y) x)), where the
+    # macro m(a) = (ite (>= a 0) (div 1 a) a) is evaluated lazily and is
+    # undefined at x = -2
+    param = exprs.VariableExpression(syn_ctx.make_variable(int_type, 'a', 0))
+    macro = semantics_types.MacroFunction('m', 1, (int_type,), int_type,
+            make('ite', make('>=', param, zero),
+                 make('div', exprs.ConstantExpression(exprs.Value(1, int_type)), param), param),
+            [ param ])
+    macro_spec = make('ite', make('=', app, zero),
+            make('=', exprs.FunctionExpression(macro,
+                (make('+', x, exprs.ConstantExpression(exprs.Value(2, int_type))),)),
+                exprs.ConstantExpression(exprs.Value(5, int_type))),
+            make('=', app, x))
+    params = [ exprs.FormalParameterExpression(max2, int_type, i) for i in range(2) ]
+    interpretations = [ params[0], params[1], make('+', params[0], params[1]),
+                        make('div', params[0], params[1]),
+                        make('ite', make('<=', params[0], params[1]), params[1], params[0]) ]
+    eval_context = evaluation.EvaluationContext()
+    memo = {}
+    for (a, b), formula in itertools.product(itertools.product([ -2, -1, 0, 2 ], repeat=2),
+                                          [ spec, macro_spec ]):
+        point = (exprs.Value(a, int_type), exprs.Value(b, int_type))
+        # The point is passed explicitly, whatever the valuation map is
+        eval_context.valuation_map = None
+        residual = fold_synth_free_subterms(formula, point, eval_context, memo)
+        assert exprs.get_expression_size(residual) <= exprs.get_expression_size(formula)
+        for interpretation in interpretations:
+            eval_context.set_interpretation(max2, interpretation)
+            inlined = inline_interpretations(formula, { max2.unknown_function_id : interpretation })
+            results = []
+            for expr in [ formula, residual, inlined ]:
+                eval_context.set_valuation_map(point)
+                try:
+                    results.append(evaluation.evaluate_expression_raw(expr, eval_context))
+                except basetypes.PartialFunctionError:
+                    results.append(basetypes.PartialFunctionError)
+            assert results[0] == results[1], _expr_to_str(residual)
+            assert results[0] == results[2], _expr_to_str(inlined)
+    print('Checked the residuals and the inlined interpretations of the specification.')
+
 if __name__ == '__main__':
     test_cnf_conversion()
+    test_fold_synth_free_subterms()
 
 #
 # expr_transforms.py ends here
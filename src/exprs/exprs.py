@@ -137,7 +137,7 @@ def value_to_string(the_value):
 
 class VariableInfo(object):
     __slots__ = ['variable_type', 'variable_eval_offset',
-                 'variable_name', 'synthesis_ctx']
+                 'variable_name', 'synthesis_ctx', 'let_slot']
     _undefined_offset = 1000000000
 
     def __init__(self, variable_type, variable_name,
@@ -147,6 +147,9 @@ class VariableInfo(object):
         self.variable_type = variable_type
         self.variable_eval_offset = variable_eval_offset
         self.synthesis_ctx = None
+        # The slot in the let frames of evaluation contexts, for variables
+        # bound by a let (see exprs.evaluation.get_let_slot())
+        self.let_slot = None
 
     def __str__(self):
         return ('VariableInfo(%s, %s, %s)' % (str(self.variable_type),
@@ -1,5 +1,7 @@
 # Author: Garvit Juniwal (garvitjuniwal@eecs.berkeley.edu)
 
+import sys
+
 from parsers.sexp import sexp as sexpParser
 from exprs import exprs
 from core import grammars
@@ -32,6 +34,10 @@ def sexpFromFile(benchmarkFileName):
     benchmarkFile.close()
     return bmExpr
 
+def sexpFromString(benchmarkString):
+    bm = stripComments(benchmarkString.splitlines(True))
+    return sexpParser.parseString(bm, parseAll=True).asList()[0]
+
 def parse_bitvec(bv_exp):
     if len(bv_exp) != 2:
         return None
@@ -68,7 +74,8 @@ def sexp_to_value(sexp):
     elif value_type.type_code == exprtypes.TypeCodes.bit_vector_type:
         value = BitVector(int(str(value_exp)), value_type.size)
     elif value_type.type_code == exprtypes.TypeCodes.string_type:
-        value = value_exp
+        # interned, see semantics.semantics_slia
+        value = sys.intern(value_exp)
     else:
         raise Exception('Unknown type: %s' % value_type)
     return exprs.Value(value, value_type)
@@ -39,6 +39,8 @@
 # Code:
 
 from utils import basetypes
+from utils import bitvectors
+from exprs import evaluation
 from exprs import exprtypes
 from utils import utils
 import z3
@@ -99,6 +101,8 @@ class BVNot(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a : ~a
         self.eval_children = lambda a : ~a
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        self.eval_children_raw = lambda a : a ^ mask
 
 class BVAnd(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -107,6 +111,7 @@ class BVAnd(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a,b: a & b
         self.eval_children = lambda a,b: a & b
+        self.eval_children_raw = lambda a,b: a & b
         self.commutative = True
         self.associative = True
 
@@ -117,6 +122,7 @@ class BVOr(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a,b: a | b
         self.eval_children = lambda a,b: a | b
+        self.eval_children_raw = lambda a,b: a | b
         self.commutative = True
         self.associative = True
 
@@ -126,6 +132,8 @@ class BVNeg(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a: -a
         self.eval_children = lambda a: a.negate()
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        self.eval_children_raw = lambda a: (-a) & mask
 
 class BVAdd(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -134,6 +142,8 @@ class BVAdd(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a,b: a + b
         self.eval_children = lambda a,b: a + b
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        self.eval_children_raw = lambda a,b: (a + b) & mask
         self.commutative = True
         self.associative = True
 
@@ -144,6 +154,8 @@ class BVMul(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a,b: a * b
         self.eval_children = lambda a,b: a * b
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        self.eval_children_raw = lambda a,b: (a * b) & mask
         self.commutative = True
         self.associative = True
 
@@ -154,42 +166,82 @@ class BVSub(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a,b: a - b
         self.eval_children = lambda a,b: a - b
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        self.eval_children_raw = lambda a,b: (a - b) & mask
 
 class BVUDiv(InterpretedFunctionBase):
     def __init__(self, bv_size):
         super().__init__('bvudiv', 2, (exprtypes.BitVectorType(bv_size),
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
+        self.is_partial = True
         self.smt_function = z3.UDiv
         def eval_c(a, b):
             if b.value == 0:
                 raise basetypes.PartialFunctionError()
             return a.udiv(b)
         self.eval_children = eval_c
+        def eval_c_raw(a, b):
+            if b == 0:
+                raise basetypes.PartialFunctionError()
+            return a // b
+        self.eval_children_raw = eval_c_raw
+        undefined_value = evaluation.undefined_value
+        self.eval_children_poison = lambda a, b: undefined_value if b.value == 0 else a.udiv(b)
+        self.eval_children_raw_poison = lambda a, b: undefined_value if b == 0 else a // b
 
 class BVSDiv(InterpretedFunctionBase):
     def __init__(self, bv_size):
         super().__init__('bvsdiv', 2, (exprtypes.BitVectorType(bv_size),
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
+        self.is_partial = True
         self.smt_function = lambda a,b : a / b
         def eval_c(a, b):
             if b.value == 0:
                 raise basetypes.PartialFunctionError()
             return a.sdiv(b)
         self.eval_children = eval_c
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        def sdiv_raw(a, b):
+            a_negative = (a & sign_mask) != 0
+            b_negative = (b & sign_mask) != 0
+            val = ((mask + 1 - a) if a_negative else a) // ((mask + 1 - b) if b_negative else b)
+            return ((-val) & mask) if a_negative != b_negative else val
+        def eval_c_raw(a, b):
+            if b == 0:
+                raise basetypes.PartialFunctionError()
+            return sdiv_raw(a, b)
+        self.eval_children_raw = eval_c_raw
+        undefined_value = evaluation.undefined_value
+        self.eval_children_poison = lambda a, b: undefined_value if b.value == 0 else a.sdiv(b)
+        self.eval_children_raw_poison = lambda a, b: undefined_value if b == 0 else sdiv_raw(a, b)
 
 class BVSRem(InterpretedFunctionBase):
     def __init__(self, bv_size):
         super().__init__('bvsrem', 2, (exprtypes.BitVectorType(bv_size),
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
+        self.is_partial = True
         self.smt_function = z3.SRem
         def eval_c(a, b):
             if b.value == 0:
                 raise basetypes.PartialFunctionError()
             return a.srem(b)
         self.eval_children = eval_c
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        def srem_raw(a, b):
+            a_negative = (a & sign_mask) != 0
+            val = ((mask + 1 - a) if a_negative else a) % ((mask + 1 - b) if (b & sign_mask) else b)
+            return ((-val) & mask) if a_negative else val
+        def eval_c_raw(a, b):
+            if b == 0:
+                raise basetypes.PartialFunctionError()
+            return srem_raw(a, b)
+        self.eval_children_raw = eval_c_raw
+        undefined_value = evaluation.undefined_value
+        self.eval_children_poison = lambda a, b: undefined_value if b.value == 0 else a.srem(b)
+        self.eval_children_raw_poison = lambda a, b: undefined_value if b == 0 else srem_raw(a, b)
 
 
 
@@ -198,12 +250,21 @@ class BVURem(InterpretedFunctionBase):
         super().__init__('bvurem', 2, (exprtypes.BitVectorType(bv_size),
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
+        self.is_partial = True
         self.smt_function = z3.URem
         def eval_c(a, b):
             if b.value == 0:
                 raise basetypes.PartialFunctionError()
             return a.urem(b)
         self.eval_children = eval_c
+        def eval_c_raw(a, b):
+            if b == 0:
+                raise basetypes.PartialFunctionError()
+            return a % b
+        self.eval_children_raw = eval_c_raw
+        undefined_value = evaluation.undefined_value
+        self.eval_children_poison = lambda a, b: undefined_value if b.value == 0 else a.urem(b)
+        self.eval_children_raw_poison = lambda a, b: undefined_value if b == 0 else a % b
 
 class BVShl(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -212,6 +273,8 @@ class BVShl(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a, b : a << b
         self.eval_children = lambda a, b : a << b
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        self.eval_children_raw = lambda a, b : 0 if b >= bv_size else (a << b) & mask
 
 class BVLShR(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -220,6 +283,7 @@ class BVLShR(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = z3.LShR
         self.eval_children = lambda a, b : a.lshr(b)
+        self.eval_children_raw = lambda a, b : 0 if b >= bv_size else a >> b
 
 class BVAShR(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -228,6 +292,11 @@ class BVAShR(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a, b: a >> b
         self.eval_children = lambda a, b : a.ashr(b)
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        def eval_c_raw(a, b):
+            signed_a = (a - mask - 1) if (a & sign_mask) else a
+            return (signed_a >> min(b, bv_size - 1)) & mask
+        self.eval_children_raw = eval_c_raw
 
 class BVUlt(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -236,6 +305,7 @@ class BVUlt(InterpretedFunctionBase):
                          exprtypes.BoolType())
         self.smt_function = z3.ULT
         self.eval_children = lambda a, b : a.ult(b)
+        self.eval_children_raw = lambda a, b : a < b
 
 class BVUle(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -244,6 +314,7 @@ class BVUle(InterpretedFunctionBase):
                          exprtypes.BoolType())
         self.smt_function = z3.ULE
         self.eval_children = lambda a, b : a.ule(b)
+        self.eval_children_raw = lambda a, b : a <= b
 
 class BVUge(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -252,6 +323,7 @@ class BVUge(InterpretedFunctionBase):
                          exprtypes.BoolType())
         self.smt_function = z3.UGE
         self.eval_children = lambda a, b : a.uge(b)
+        self.eval_children_raw = lambda a, b : a >= b
 
 class BVUgt(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -260,6 +332,7 @@ class BVUgt(InterpretedFunctionBase):
                          exprtypes.BoolType())
         self.smt_function = z3.UGT
         self.eval_children = lambda a, b : a.ugt(b)
+        self.eval_children_raw = lambda a, b : a > b
 
 class BVSle(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -268,6 +341,8 @@ class BVSle(InterpretedFunctionBase):
                          exprtypes.BoolType())
         self.smt_function = lambda a, b : a <= b
         self.eval_children = lambda a, b : a.sle(b)
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        self.eval_children_raw = lambda a, b : (a ^ sign_mask) <= (b ^ sign_mask)
 
 class BVSlt(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -276,6 +351,8 @@ class BVSlt(InterpretedFunctionBase):
                          exprtypes.BoolType())
         self.smt_function = lambda a, b : a < b
         self.eval_children = lambda a, b : a.slt(b)
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        self.eval_children_raw = lambda a, b : (a ^ sign_mask) < (b ^ sign_mask)
 
 class BVSge(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -284,6 +361,8 @@ class BVSge(InterpretedFunctionBase):
                          exprtypes.BoolType())
         self.smt_function = lambda a, b : a >= b
         self.eval_children = lambda a, b : a.sge(b)
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        self.eval_children_raw = lambda a, b : (a ^ sign_mask) >= (b ^ sign_mask)
 
 class BVSgt(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -292,6 +371,8 @@ class BVSgt(InterpretedFunctionBase):
                          exprtypes.BoolType())
         self.smt_function = lambda a, b : a > b
         self.eval_children = lambda a, b : a.sgt(b)
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        self.eval_children_raw = lambda a, b : (a ^ sign_mask) > (b ^ sign_mask)
 
 class BVXor(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -300,6 +381,7 @@ class BVXor(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a, b : a ^ b
         self.eval_children = lambda a, b : a ^ b
+        self.eval_children_raw = lambda a, b : a ^ b
         self.commutative = True
         self.associative = True
 
@@ -310,6 +392,8 @@ class BVXNor(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a, b : ~(a ^ b)
         self.eval_children = lambda a, b : ~(a ^ b)
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        self.eval_children_raw = lambda a, b : a ^ b ^ mask
         self.commutative = True
         self.associative = True
 
@@ -320,6 +404,8 @@ class BVNand(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a, b : ~(a & b)
         self.eval_children = lambda a, b : ~(a & b)
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        self.eval_children_raw = lambda a, b : (a & b) ^ mask
         self.commutative = True
         self.associative = True
 
@@ -330,6 +416,8 @@ class BVNor(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a, b : ~(a | b)
         self.eval_children = lambda a, b : ~(a | b)
+        (mask, sign_mask) = bitvectors.get_width_masks(bv_size)
+        self.eval_children_raw = lambda a, b : (a | b) ^ mask
         self.commutative = True
         self.associative = True
 
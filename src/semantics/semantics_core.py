@@ -58,6 +58,8 @@ class LetFunction(InterpretedFunctionBase):
         self.binding_names = binding_names
         self.binding_vars = binding_vars
         self.binding_types = binding_types
+        self.binding_slots = tuple([ evaluation.get_let_slot(bv.variable_info)
+                                     for bv in binding_vars ])
 
     def to_string(self, expr_object):
         ret = "(let ("
@@ -70,18 +72,26 @@ class LetFunction(InterpretedFunctionBase):
         return ret
 
     def evaluate(self, expr_object, eval_context_object):
-        bindings = {}
-        for bv, child in zip(self.binding_vars, expr_object.children[:-1]):
+        children = expr_object.children
+        num_bindings = len(self.binding_slots)
+        for child in children[:-1]:
             evaluation.evaluate_expression_on_stack(child, eval_context_object)
-            bindings[bv] = eval_context_object.peek()
-            eval_context_object.pop()
 
-        eval_context_object.push_let_variables(bindings)
-        in_expr = expr_object.children[-1]
-        evaluation.evaluate_expression_on_stack(in_expr, eval_context_object)
-        eval_context_object.pop_let_variables()
-        # res = eval_context_object.peek()
-        # eval_context_object.pop()
+        # Swap the bound values on the stack with the values in the let frame
+        # slots, which are thus saved on the stack while in_expr is evaluated
+        let_frame = eval_context_object.let_frame
+        evaluation.reserve_let_slots(let_frame)
+        stack = eval_context_object.eval_stack
+        base = eval_context_object.eval_stack_top - num_bindings
+        for i, slot in enumerate(self.binding_slots):
+            stack[base + i], let_frame[slot] = let_frame[slot], stack[base + i]
+
+        evaluation.evaluate_expression_on_stack(children[-1], eval_context_object)
+        res = eval_context_object.peek()
+        for i, slot in enumerate(self.binding_slots):
+            let_frame[slot] = stack[base + i]
+        eval_context_object.pop(num_bindings + 1)
+        eval_context_object.push(res)
 
     def to_smt(self, expr_object, smt_context_object, var_subst_map):
         smt_binding_var = [ semantics_types.expression_to_smt(bv, smt_context_object, var_subst_map)
@@ -103,6 +113,8 @@ class EqFunction(InterpretedFunctionBase):
         super().__init__('=', 2, (domain_type, domain_type), exprtypes.BoolType())
         self.smt_function = lambda a, b: a == b
         self.eval_children = lambda a, b: a == b
+        # Comparing raw values is the same as comparing the values
+        self.eval_children_raw = self.eval_children
         self.commutative = True
 
 class NeFunction(InterpretedFunctionBase):
@@ -110,6 +122,7 @@ class NeFunction(InterpretedFunctionBase):
         super().__init__('ne', 2, (domain_type, domain_type), exprtypes.BoolType())
         self.smt_function = lambda a, b: a != b
         self.eval_children = lambda a, b: a != b
+        self.eval_children_raw = self.eval_children
         self.commutative = True
 
     def to_string(self, expr_object):
@@ -124,6 +137,18 @@ class AndFunction(InterpretedFunctionBase):
         self.commutative = True
         self.associative = True
 
+    def evaluate(self, expr_object, eval_context_object):
+        # Short circuits: the conjuncts after the first false one are not
+        # evaluated
+        for child in expr_object.children:
+            evaluation.evaluate_expression_on_stack(child, eval_context_object)
+            value = eval_context_object.peek()
+            eval_context_object.pop()
+            if not value:
+                eval_context_object.push(False)
+                return
+        eval_context_object.push(True)
+
 class OrFunction(InterpretedFunctionBase):
     """A function object for disjunctions. Allows arbitrary number of arguments."""
     def __init__(self):
@@ -133,6 +158,18 @@ class OrFunction(InterpretedFunctionBase):
         self.commutative = True
         self.associative = True
 
+    def evaluate(self, expr_object, eval_context_object):
+        # Short circuits: the disjuncts after the first true one are not
+        # evaluated
+        for child in expr_object.children:
+            evaluation.evaluate_expression_on_stack(child, eval_context_object)
+            value = eval_context_object.peek()
+            eval_context_object.pop()
+            if value:
+                eval_context_object.push(True)
+                return
+        eval_context_object.push(False)
+
 class NotFunction(InterpretedFunctionBase):
     """A function object for negation."""
     def __init__(self):
@@ -147,6 +184,17 @@ class ImpliesFunction(InterpretedFunctionBase):
         self.smt_function = z3.Implies
         self.eval_children = lambda a, b: (not a) or b
 
+    def evaluate(self, expr_object, eval_context_object):
+        (antecedent, consequent) = expr_object.children
+        evaluation.evaluate_expression_on_stack(antecedent, eval_context_object)
+        value = eval_context_object.peek()
+        eval_context_object.pop()
+        if value:
+            # the value of the consequent is the result
+            evaluation.evaluate_expression_on_stack(consequent, eval_context_object)
+        else:
+            eval_context_object.push(True)
+
 class IffFunction(InterpretedFunctionBase):
     def __init__(self):
         super().__init__('iff', 2, (exprtypes.BoolType(), exprtypes.BoolType()),
@@ -173,6 +221,17 @@ class IteFunction(InterpretedFunctionBase):
         self.smt_function = z3.If
         self.eval_children = lambda a, b, c: b if a else c
 
+    def evaluate(self, expr_object, eval_context_object):
+        # Only the branch that is taken is evaluated
+        (condition, then_branch, else_branch) = expr_object.children
+        evaluation.evaluate_expression_on_stack(condition, eval_context_object)
+        value = eval_context_object.peek()
+        eval_context_object.pop()
+        if value:
+            evaluation.evaluate_expression_on_stack(then_branch, eval_context_object)
+        else:
+            evaluation.evaluate_expression_on_stack(else_branch, eval_context_object)
+
 class CoreInstantiator(semantics_types.InstantiatorBase):
     def __init__(self):
         super().__init__('core')
@@ -37,6 +37,7 @@
 # Code:
 
 from utils import basetypes
+from exprs import evaluation
 from exprs import exprtypes
 import functools
 from utils import utils
@@ -64,12 +65,19 @@ class SubFunction(InterpretedFunctionBase):
 class ModFunction(InterpretedFunctionBase):
     def __init__(self):
         super().__init__('mod', 2, (exprtypes.IntType(), exprtypes.IntType()), exprtypes.IntType())
+        self.is_partial = True
         def eval_c(a, b):
             if b != 0:
                 return a % b if b > 0 else (-a) % (-b)
             else:
                 raise basetypes.PartialFunctionError
         self.eval_children = eval_c
+        undefined_value = evaluation.undefined_value
+        def eval_c_poison(a, b):
+            if b != 0:
+                return a % b if b > 0 else (-a) % (-b)
+            return undefined_value
+        self.eval_children_poison = eval_c_poison
         self.smt_function = lambda a, b : a % b
 
 class MinusFunction(InterpretedFunctionBase):
@@ -89,12 +97,19 @@ class MulFunction(InterpretedFunctionBase):
 class DivFunction(InterpretedFunctionBase):
     def __init__(self):
         super().__init__('div', 2, (exprtypes.IntType(), exprtypes.IntType()), exprtypes.IntType())
+        self.is_partial = True
         def eval_c(a, b):
             if b != 0:
                 return a // b
             else:
                 raise basetypes.PartialFunctionError
         self.eval_children = eval_c
+        undefined_value = evaluation.undefined_value
+        def eval_c_poison(a, b):
+            if b != 0:
+                return a // b
+            return undefined_value
+        self.eval_children_poison = eval_c_poison
         self.smt_function = lambda a, b : a / b
 
 class LEFunction(InterpretedFunctionBase):
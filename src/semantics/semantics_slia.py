@@ -36,23 +36,72 @@
 
 # Code:
 
+import os
+import sys
+
 from semantics import semantics_types
 from semantics import semantics_lia
 from semantics.semantics_types import InterpretedFunctionBase
 from exprs import exprtypes
+from utils import basetypes
 from utils import utils
 import z3
 
 if __name__ == '__main__':
     utils.print_module_misuse_and_exit()
 
+# The string operators are evaluated as picked by the EUSOLVER_STRING_VALUES
+# environment variable, or by set_string_values() (for the operators
+# instantiated after the call): 'plain' (the default) calls the python string
+# methods directly every time; 'interned' interns the strings they return and
+# memoizes their results by the values of their arguments, so that the terms
+# that apply an operator to the same values share a single computation and a
+# single string. A memo lookup hashes the arguments (and compares them with
+# ==, which interning only shortcuts), which costs more than the operators on
+# short strings, so memoizing only pays off on long ones.
+_string_values = [ 'plain', 'interned' ]
+_interned_strings = False
+
+# Memo tables are cleared when they grow this large
+_max_memo_size = 1 << 16
+
+def set_string_values(representation):
+    global _interned_strings
+    if representation not in _string_values:
+        raise basetypes.ArgumentError('Unknown representation of string values: %s '
+                                      '(expected one of %s)' %
+                                      (representation, ', '.join(_string_values)))
+    _interned_strings = (representation == 'interned')
+
+set_string_values(os.environ.get('EUSOLVER_STRING_VALUES', 'plain'))
+
+def _string_kernel(operator, returns_string):
+    """Returns the kernel (eval_children) of a string operator, memoized and
+    with its string results interned if strings are interned."""
+    if not _interned_strings:
+        return operator
+    table = {}
+    missing = table
+    intern = sys.intern
+    def kernel(*args):
+        value = table.get(args, missing)
+        if value is missing:
+            value = operator(*args)
+            if returns_string:
+                value = intern(value)
+            if len(table) >= _max_memo_size:
+                table.clear()
+            table[args] = value
+        return value
+    return kernel
+
 class StrConcat(InterpretedFunctionBase):
     def __init__(self):
         super().__init__('str.++', 2,
                 (exprtypes.StringType(), exprtypes.StringType()),
                 exprtypes.StringType())
         # self.smt_function = z3.Concat
-        self.eval_children = str.__add__
+        self.eval_children = _string_kernel(str.__add__, True)
 
 class StrReplace(InterpretedFunctionBase):
     def __init__(self):
@@ -60,7 +109,7 @@ class StrReplace(InterpretedFunctionBase):
                 (exprtypes.StringType(), exprtypes.StringType(), exprtypes.StringType()),
                 exprtypes.StringType())
         self.smt_function = z3.Replace
-        self.eval_children = lambda a,b,c: str.replace(a, b, c, 1)
+        self.eval_children = _string_kernel(lambda a,b,c: str.replace(a, b, c, 1), True)
 
 class StrAt(InterpretedFunctionBase):
     def __init__(self):
@@ -68,7 +117,7 @@ class StrAt(InterpretedFunctionBase):
                 (exprtypes.StringType(), exprtypes.IntType()),
                 exprtypes.StringType())
         # self.smt_function = lambda a,b: a[b]
-        self.eval_children = lambda a,b: a[b] if 0 <= b < len(a) else ''
+        self.eval_children = _string_kernel(lambda a,b: a[b] if 0 <= b < len(a) else '', True)
 
 class IntToStr(InterpretedFunctionBase):
     def __init__(self):
@@ -76,7 +125,7 @@ class IntToStr(InterpretedFunctionBase):
                 (exprtypes.IntType(),),
                 exprtypes.StringType())
         # self.smt_function = z3.Itos
-        self.eval_children = lambda a : str(a) if a >= 0 else ''
+        self.eval_children = _string_kernel(lambda a : str(a) if a >= 0 else '', True)
 
 class Substr(InterpretedFunctionBase):
     def __init__(self):
@@ -84,7 +133,8 @@ class Substr(InterpretedFunctionBase):
                 (exprtypes.StringType(), exprtypes.IntType(), exprtypes.IntType()),
                 exprtypes.StringType())
         # self.smt_function = z3.Extract
-        self.eval_children = lambda a,b,c: a[b:(c+b)] if 0 <= b and len(a) >= (c+b) >= b else ''
+        self.eval_children = _string_kernel(
+                lambda a,b,c: a[b:(c+b)] if 0 <= b and len(a) >= (c+b) >= b else '', True)
 
 class StrLen(InterpretedFunctionBase):
     def __init__(self):
@@ -108,7 +158,7 @@ class StrToInt(InterpretedFunctionBase):
                     return -1
             except ValueError:
                 return -1
-        self.eval_children = eval_c
+        self.eval_children = _string_kernel(eval_c, False)
 
 class StrIndexOf(InterpretedFunctionBase):
     def __init__(self):
@@ -116,7 +166,7 @@ class StrIndexOf(InterpretedFunctionBase):
                 (exprtypes.StringType(), exprtypes.StringType(), exprtypes.IntType()),
                 exprtypes.IntType())
         # self.smt_function = z3.IndexOf
-        self.eval_children = str.find
+        self.eval_children = _string_kernel(str.find, False)
 
 class StrPrefixOf(InterpretedFunctionBase):
     def __init__(self):
@@ -124,7 +174,7 @@ class StrPrefixOf(InterpretedFunctionBase):
                 (exprtypes.StringType(), exprtypes.StringType()),
                 exprtypes.BoolType())
         # self.smt_function = z3.PrefixOf
-        self.eval_children = str.startswith
+        self.eval_children = _string_kernel(str.startswith, False)
 
 class StrSuffixOf(InterpretedFunctionBase):
     def __init__(self):
@@ -132,7 +182,7 @@ class StrSuffixOf(InterpretedFunctionBase):
                 (exprtypes.StringType(), exprtypes.StringType()),
                 exprtypes.BoolType())
         # self.smt_function = z3.SuffixOf
-        self.eval_children = str.endswith
+        self.eval_children = _string_kernel(str.endswith, False)
 
 class StrContains(InterpretedFunctionBase):
     def __init__(self):
@@ -140,7 +190,7 @@ class StrContains(InterpretedFunctionBase):
                 (exprtypes.StringType(), exprtypes.StringType()),
                 exprtypes.BoolType())
         # self.smt_function = z3.Contains
-        self.eval_children = lambda a,b: str.find(a,b) != -1
+        self.eval_children = _string_kernel(lambda a,b: str.find(a,b) != -1, False)
 
 class SLIAInstantiator(semantics_types.InstantiatorBase):
     def __init__(self):
@@ -160,6 +160,15 @@ class FunctionBase(object):
                 for child in expr_object.children]
 
 
+class _ParameterValue(object):
+    """The value of a formal parameter in a (reusable) call frame. Stands in
+    for an exprs.Value in the valuation map."""
+    __slots__ = ['value_object']
+
+    def __init__(self):
+        self.value_object = None
+
+
 class UnknownFunctionBase(FunctionBase):
     _unknown_function_id = 1000000000
     def __init__(self, function_kind, function_name, function_arity, domain_types, range_type):
@@ -168,6 +177,10 @@ class UnknownFunctionBase(FunctionBase):
         assert (len(domain_types) == function_arity)
         self.unknown_function_id = UnknownFunctionBase._unknown_function_id
         UnknownFunctionBase._unknown_function_id += 1
+        # Reusable valuation maps for the formal parameters, one per level of
+        # nesting of active calls
+        self._frames = []
+        self._frame_depth = 0
 
     def evaluate(self, expr_object, eval_context_object):
         """The eval_context_object is assumed to have a map called interpretations.
@@ -179,15 +192,38 @@ class UnknownFunctionBase(FunctionBase):
 
         num_children = len(expr_object.children)
         self._evaluate_children(expr_object, eval_context_object)
-        parameter_map = [exprs.Value(eval_context_object.peek(i), self.domain_types[i])
-                         for i in reversed(range(len(self.domain_types)))]
+        memo = eval_context_object.application_memo
+        if memo is not None:
+            stack_top = eval_context_object.eval_stack_top
+            key = (self.unknown_function_id,
+                   tuple(eval_context_object.eval_stack[stack_top - num_children:stack_top]))
+            if key in memo.table:
+                memo.hits += 1
+                eval_context_object.pop(num_children)
+                eval_context_object.push(memo.table[key])
+                return
+        depth = self._frame_depth
+        if depth == len(self._frames):
+            self._frames.append([ _ParameterValue() for i in range(num_children) ])
+        frame = self._frames[depth]
+        stack = eval_context_object.eval_stack
+        base = eval_context_object.eval_stack_top - num_children
+        for i in range(num_children):
+            frame[i].value_object = stack[base + i]
         eval_context_object.pop(num_children)
 
         orig_valuation_map = eval_context_object.valuation_map
-        eval_context_object.set_valuation_map(parameter_map)
-        interpretation = eval_context_object.interpretation_map[self.unknown_function_id]
-        evaluate_expression_on_stack(interpretation, eval_context_object)
-        eval_context_object.set_valuation_map(orig_valuation_map)
+        eval_context_object.valuation_map = frame
+        self._frame_depth = depth + 1
+        try:
+            interpretation = eval_context_object.interpretation_map[self.unknown_function_id]
+            evaluate_expression_on_stack(interpretation, eval_context_object)
+        finally:
+            self._frame_depth = depth
+            eval_context_object.valuation_map = orig_valuation_map
+        if memo is not None:
+            memo.misses += 1
+            memo.table[key] = eval_context_object.peek()
 
     def to_smt(self, expr_object, smt_context_object, var_subst_map):
         child_terms = self._children_to_smt(expr_object, smt_context_object, var_subst_map)
@@ -227,11 +263,47 @@ class InterpretedFunctionBase(FunctionBase):
     def __init__(self, function_name, function_arity, domain_types, range_type):
         super().__init__(FunctionKinds.interpreted_function, function_name, function_arity,
                          domain_types, range_type)
+        # Set by functions (div, mod, ...) whose kernels raise
+        # basetypes.PartialFunctionError outside of their domain. They also
+        # provide kernels that return evaluation.undefined_value there
+        # instead, as eval_children_poison (and eval_children_raw_poison
+        # for functions on bitvectors)
+        self.is_partial = False
 
     def to_smt(self, expr_object, smt_context_object, var_subst_map):
         child_terms = self._children_to_smt(expr_object, smt_context_object, var_subst_map)
         return self.smt_function(*child_terms)
 
+    def get_raw_kernel(self):
+        """Returns the function that computes the value of an application from
+        the values of the children when bitvectors are plain (masked) ints,
+        see utils.bitvectors.raw_value(). Functions on bitvectors provide it
+        as eval_children_raw; None if this function has bitvector arguments or
+        values, and does not provide one."""
+        kernel = getattr(self, 'eval_children_raw', None)
+        if kernel is not None:
+            return kernel
+        for value_type in list(self.domain_types) + [ self.range_type ]:
+            if (value_type is not None and
+                    value_type.type_code == exprtypes.TypeCodes.bit_vector_type):
+                return None
+        return self.eval_children
+
+    def get_poison_kernel(self, raw_bitvectors):
+        """Returns the kernel (the raw one if raw_bitvectors, see
+        get_raw_kernel()) that returns evaluation.undefined_value, instead
+        of raising, where the function is undefined. None if there is no
+        such kernel."""
+        if not self.is_partial:
+            return self.get_raw_kernel() if raw_bitvectors else self.eval_children
+        if raw_bitvectors:
+            kernel = getattr(self, 'eval_children_raw_poison', None)
+            if kernel is not None:
+                return kernel
+            if self.get_raw_kernel() is not self.eval_children:
+                return None
+        return getattr(self, 'eval_children_poison', None)
+
     def evaluate(self, expr_object, eval_context_object):
         self._evaluate_children(expr_object, eval_context_object)
         num_children = len(expr_object.children)
@@ -240,6 +312,43 @@ class InterpretedFunctionBase(FunctionBase):
         eval_context_object.push(res)
 
 
+# Functions that do not (always) evaluate all their arguments
+_short_circuit_function_names = frozenset([ 'ite', 'and', 'or', '=>' ])
+
+_unevaluated = object()
+
+# Bound on the number of applications a macro keeps an inlined body for
+_max_inlined_applications = 1 << 14
+
+class _LazyArgument(object):
+    """An argument to a macro, evaluated on demand. Stands in for an
+    exprs.Value in the valuation map while the body of the macro is
+    evaluated."""
+    __slots__ = ['expr_object', 'valuation_map', 'eval_context_object', 'value']
+
+    def __init__(self, expr_object, valuation_map, eval_context_object):
+        self.expr_object = expr_object
+        self.valuation_map = valuation_map
+        self.eval_context_object = eval_context_object
+        self.value = _unevaluated
+
+    @property
+    def value_object(self):
+        from exprs.evaluation import evaluate_expression_on_stack
+
+        if self.value is _unevaluated:
+            eval_context_object = self.eval_context_object
+            callee_valuation_map = eval_context_object.valuation_map
+            eval_context_object.valuation_map = self.valuation_map
+            try:
+                evaluate_expression_on_stack(self.expr_object, eval_context_object)
+            finally:
+                eval_context_object.valuation_map = callee_valuation_map
+            self.value = eval_context_object.peek()
+            eval_context_object.pop()
+        return self.value
+
+
 class MacroFunction(UnknownFunctionBase):
     def __init__(self, function_name, function_arity, domain_types, range_type, interpretation_expression, arg_vars):
         super().__init__(FunctionKinds.macro_function, function_name, function_arity, domain_types, range_type)
@@ -251,11 +360,79 @@ class MacroFunction(UnknownFunctionBase):
         self.interpretation_expression = \
                 exprs.substitute_all(interpretation_expression,
                         list(zip(arg_vars, self.formal_parameters)))
+        self._analyze_interpretation()
+        self._inlined_applications = {}
+
+    def _analyze_interpretation(self):
+        """Works out whether the arguments of the macro can be passed by name:
+        is_linear is set if every formal parameter occurs at most once in the
+        body, so that substituting the (unevaluated) arguments for them does
+        not duplicate any work. short_circuits is set if the body contains an
+        ite or a boolean connective, i.e., if some of the arguments may not
+        need to be evaluated at all (like the branches of the ICFP if0)."""
+        parameter_uses = [0] * self.function_arity
+        function_names = set()
+        to_visit = [ self.interpretation_expression ]
+        while len(to_visit) > 0:
+            expr = to_visit.pop()
+            if expr.expr_kind == exprs.ExpressionKinds.formal_parameter_expression:
+                parameter_uses[expr.parameter_position] += 1
+            elif expr.expr_kind == exprs.ExpressionKinds.function_expression:
+                function_names.add(expr.function_info.function_name)
+                to_visit.extend(expr.children)
+        self.is_linear = all([ uses <= 1 for uses in parameter_uses ])
+        self.short_circuits = ('let' not in function_names and
+                               len(function_names & _short_circuit_function_names) > 0)
+        # Let bound variables in the body could capture variables of the
+        # arguments, so such bodies are never inlined
+        self.is_inlinable = self.is_linear and 'let' not in function_names
+
+    def inline(self, expr_object):
+        """Returns the body of the macro with the arguments of the application
+        expr_object substituted for the formal parameters. The result is only
+        used for evaluation (expr_object itself, with the name of the macro,
+        is what gets printed), and is memoized per application."""
+        key = id(expr_object)
+        entry = self._inlined_applications.get(key, None)
+        if entry is not None and entry[0] is expr_object:
+            return entry[1]
+        inlined = exprs.substitute_all(self.interpretation_expression,
+                                       list(zip(self.formal_parameters, expr_object.children)))
+        if len(self._inlined_applications) >= _max_inlined_applications:
+            self._inlined_applications.clear()
+        # expr_object is kept alive with its entry, so that its id is not
+        # reused while the entry exists
+        self._inlined_applications[key] = (expr_object, inlined)
+        return inlined
 
     def evaluate(self, expr_object, eval_context_object):
+        from exprs.evaluation import evaluate_expression_on_stack
+
+        if self.is_inlinable:
+            # No frame for the body: the arguments are evaluated (if at all)
+            # where the body uses them, with the valuation map of the caller
+            evaluate_expression_on_stack(self.inline(expr_object), eval_context_object)
+            return
+        if self.short_circuits:
+            return self._evaluate_lazily(expr_object, eval_context_object)
         eval_context_object.interpretation_map[self.unknown_function_id] = self.interpretation_expression
         return super().evaluate(expr_object, eval_context_object)
 
+    def _evaluate_lazily(self, expr_object, eval_context_object):
+        """Evaluates the body with the arguments passed by need: each one is
+        evaluated (in the context of the caller) the first time the body
+        refers to it, if at all."""
+        from exprs.evaluation import evaluate_expression_on_stack
+
+        caller_valuation_map = eval_context_object.valuation_map
+        eval_context_object.valuation_map = [
+                _LazyArgument(child, caller_valuation_map, eval_context_object)
+                for child in expr_object.children ]
+        try:
+            evaluate_expression_on_stack(self.interpretation_expression, eval_context_object)
+        finally:
+            eval_context_object.valuation_map = caller_valuation_map
+
     def to_smt(self, expr_object, smt_context_object, var_subst_map):
         smt_context_object.interpretation_map[self.unknown_function_id] = self.interpretation_expression
         return super().to_smt(expr_object, smt_context_object, var_subst_map)
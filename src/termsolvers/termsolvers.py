@@ -39,7 +39,7 @@
 # Code:
 
 
-from eusolver import BitSet
+from utils import bitsets
 from enumerators import enumerators
 from exprs import exprs
 from utils import basetypes
@@ -67,6 +67,8 @@ class StoppingCondition(Enum):
 class TermSolverInterface(object):
     def __init__(self):
         self.points = []
+        self.points_suffix = None
+        self.term_signature_words = None
         self.current_largest_term_size = 0
         self.signature_to_term = {}
 
@@ -82,7 +84,7 @@ class TermSolverInterface(object):
     def add_points(self, new_points):
         points = self.points
         points.extend(new_points)
-        self.signature_factory = BitSet.make_factory(len(points))
+        self.signature_factory = bitsets.BitSet.make_factory(len(points))
         self.one_full_signature = False
         self._do_complete_sig_to_term()
 
@@ -98,8 +100,10 @@ class TermSolverInterface(object):
         # for sig, term in old_sig_to_term.items():
         #     print("OLD SIG TO TERM:", str(sig), _expr_to_str(term))
 
+        # Stored signatures are still valid on the old points: only the new
+        # ones need to be evaluated
         for sig, term in old_sig_to_term.items():
-            new_sig = self._compute_term_signature(term)
+            new_sig = self._compute_term_signature(term, sig)
             if not new_sig.is_empty():
                 new_sig_to_term[new_sig] = term
             self.full_signature |= new_sig
@@ -112,22 +116,45 @@ class TermSolverInterface(object):
         self.signature_to_term = new_sig_to_term
 
 
+    def _points_from(self, start_index):
+        # The same suffix list is handed out until more points are added, so
+        # that term_signature can reuse whatever it caches per point list
+        points = self.points
+        if start_index == 0:
+            return points
+        suffix = self.points_suffix
+        if suffix is None or suffix[0] != start_index or suffix[1] != len(points):
+            suffix = (start_index, len(points), points[start_index:])
+            self.points_suffix = suffix
+        return suffix[2]
+
     def _default_compute_term_signature(self, term, old_signature=None):
         points = self.points
-        # num_points = len(points)
-        retval = self.signature_factory()
-
-        if old_signature is not None:
-            retval.copy_in(old_signature)
-            start_index = old_signature.size_of_universe()
-        else:
-            start_index = 0
-
-        # num_new_points = retval.size_of_universe()
-        new_points = points[start_index:]
-        for i, v in enumerate(self.term_signature(term, new_points), start_index):
-            if v:
-                retval.add(i)
+        num_points = len(points)
+
+        try:
+            if old_signature is not None and old_signature.size_of_universe() <= num_points:
+                # Extend the signature on the old points with the new points
+                start_index = old_signature.size_of_universe()
+                old_values = old_signature.to_bools()
+            elif self.term_signature_words is not None:
+                # Predicates can be evaluated bit-sliced, straight into the bitset
+                words = self.term_signature_words(term, points)
+                if words is not None:
+                    return bitsets.BitSet.from_words(num_points, words)
+                start_index = 0
+                old_values = b''
+            else:
+                start_index = 0
+                old_values = b''
+
+            # Build the whole signature in one go instead of setting bit by bit
+            new_values = bytes(self.term_signature(term, self._points_from(start_index)))
+        except (basetypes.PartialFunctionError, basetypes.UnboundLetVariableError):
+            # The signature function rejected the term altogether
+            return self.signature_factory()
+
+        retval = bitsets.BitSet.from_bools(num_points, old_values + new_values)
         # print(_expr_to_str(term), ': ', str(retval))
         return retval
 
@@ -138,14 +165,15 @@ class TermSolverInterface(object):
         raise basetypes.AbstractMethodError('TermSolverInterface.generate_more_terms()')
 
 class EnumerativeTermSolverBase(TermSolverInterface):
-    def __init__(self, term_signature):
+    def __init__(self, term_signature, term_signature_words=None):
         super().__init__()
         self.term_signature = term_signature
+        self.term_signature_words = term_signature_words
 
         self.bunch_generator = None
         self.max_term_size = 128
         self.stopping_condition = StoppingCondition.term_sufficiency
-        self.full_signature = BitSet.make_factory(0)()
+        self.full_signature = bitsets.BitSet.make_factory(0)()
         self.one_full_signature = False
 
     def set_max_term_size(self, size):
@@ -227,19 +255,13 @@ class EnumerativeTermSolverBase(TermSolverInterface):
 
 
 class PointlessTermSolver(EnumerativeTermSolverBase):
-    def __init__(self, term_signature, term_generator):
-        super().__init__(term_signature)
+    def __init__(self, term_signature, term_generator, term_signature_words=None):
+        super().__init__(term_signature, term_signature_words)
         self.term_generator = term_generator
-        # self.eval_cache = {}
         self.monotonic_expr_id = 0
 
-    def _compute_term_signature(self, term):
-        # eval_cache = self.eval_cache
-        # old_signature = eval_cache.get(term.expr_id)
-        # retval = self._default_compute_term_signature(term, old_signature)
-        # eval_cache[term.expr_id] = retval
-        retval = self._default_compute_term_signature(term)
-        return retval
+    def _compute_term_signature(self, term, old_signature=None):
+        return self._default_compute_term_signature(term, old_signature)
 
     def generate_more_terms(self):
         def add_expr_id(term):
@@ -253,13 +275,13 @@ class PointlessTermSolver(EnumerativeTermSolverBase):
         return self._default_solve(restart_everytime=False)
 
 class PointDistinctTermSolver(EnumerativeTermSolverBase):
-    def __init__(self, term_signature, term_generator):
-        super().__init__(term_signature)
+    def __init__(self, term_signature, term_generator, term_signature_words=None):
+        super().__init__(term_signature, term_signature_words)
         assert type(term_generator.factory) is enumerators.PointDistinctGeneratorFactory
         self.term_generator = term_generator
 
-    def _compute_term_signature(self, term):
-        return self._default_compute_term_signature(term)
+    def _compute_term_signature(self, term, old_signature=None):
+        return self._default_compute_term_signature(term, old_signature)
 
     def generate_more_terms(self):
         return self._default_generate_more_terms(transform_term=None)
@@ -39,6 +39,7 @@
 # Code:
 
 from termsolvers.termsolvers import TermSolverInterface
+from utils import bitsets
 from exprs import exprs
 from exprs import exprtypes
 from semantics import semantics_types
@@ -85,8 +86,8 @@ class SpecAwareLIATermSolver(TermSolverInterface):
     def generate_more_terms(self):
         pass
 
-    def _compute_term_signature(self, term):
-        return self._default_compute_term_signature(term)
+    def _compute_term_signature(self, term, old_signature=None):
+        return self._default_compute_term_signature(term, old_signature)
 
     def _trivial_solve(self):
         ret = exprs.ConstantExpression(exprs.Value(0, exprtypes.IntType()))
@@ -200,7 +201,6 @@ class SpecAwareLIATermSolver(TermSolverInterface):
             terms = new_terms
             # print([ _expr_to_str(t) for t in terms ])
 
-            sig = self.signature_factory()
             if len(self.synth_funs) > 1:
                 domain_types = tuple([exprtypes.IntType()] * len(self.synth_funs))
                 single_term = exprs.FunctionExpression(semantics_core.CommaFunction(domain_types),
@@ -208,9 +208,8 @@ class SpecAwareLIATermSolver(TermSolverInterface):
             else:
                 single_term = terms[0]
 
-            for i, t in enumerate(self.term_signature(single_term, self.points)):
-                if t:
-                    sig.add(i)
+            sig = bitsets.BitSet.from_bools(len(self.points),
+                    self.term_signature(single_term, self.points))
             self.signature_to_term[sig] = single_term
         # print("-----------------")
 
@@ -44,7 +44,8 @@ import random
 from semantics import semantics_types
 from exprs import exprtypes
 from exprs import evaluation
-import eusolver
+from exprs import batch_evaluation
+from utils import bitsets
 from utils import basetypes
 
 _expr_to_str = exprs.expression_to_string
@@ -82,6 +83,7 @@ class EnumerativeDTUnifierBase(UnifierInterface):
         self.points = []
         self.pred_solver = None
         self.syn_ctx = syn_ctx
+        self.dt_learning_session = bitsets.DecisionTreeLearningSession()
 
     def add_points(self, new_points):
         self.points.extend(new_points)
@@ -113,8 +115,7 @@ class EnumerativeDTUnifierBase(UnifierInterface):
         # print('pred_list: %s' % [_expr_to_str(x) for x in pred_list], flush=True)
         # print('term_list: %s' % [_expr_to_str(x) for x in term_list], flush=True)
         # print('points   :\n%s' % _point_list_to_str(self.points), flush=True)
-        dt = eusolver.eus_learn_decision_tree_for_ml_data(pred_sig_list,
-                                                          term_sig_list)
+        dt = self.dt_learning_session.learn(pred_sig_list, term_sig_list)
         # print('Done!', flush=True)
         # print(dt, flush=True)
         # print('Obtained decision tree:\n%s' % str(dt))
@@ -165,39 +166,49 @@ class EnumerativeDTUnifierBase(UnifierInterface):
         indicator_expr = exprs.FunctionExpression(func, tuple(args))
         eval_ctx = evaluation.EvaluationContext()
 
+        # Can't mess up on predicates: both indicators let the evaluation
+        # errors through, and the term solver then drops the predicate
+        # altogether instead of using it on any point
         def compute_indicator(term, points):
             eval_ctx.set_interpretation(func, term)
 
             retval = []
             for point in points:
                 eval_ctx.set_valuation_map(point)
-                try:
-                    retval.append(evaluation.evaluate_expression_raw(indicator_expr, eval_ctx))
-                except (basetypes.UnboundLetVariableError, basetypes.PartialFunctionError):
-                    # Can't mess up on predicates
-                    return [False] * len(points)
+                retval.append(evaluation.evaluate_expression_raw(indicator_expr, eval_ctx))
             return retval
 
-        return func, compute_indicator
+        # Batch columns for the (growing) list of points the predicate solver
+        # passes in, rebuilt only when new points have been added to it
+        column_cache = [ None, 0, None ]
+        def compute_indicator_words(term, points):
+            if column_cache[0] is not points or column_cache[1] != len(points):
+                column_cache[:] = [ points, len(points),
+                                    batch_evaluation.make_columns(points) ]
+            return batch_evaluation.evaluate_predicate_batch(term, column_cache[2], len(points))
+
+        return func, compute_indicator, compute_indicator_words
 
 
 class PointlessEnumDTUnifier(EnumerativeDTUnifierBase):
     def __init__(self, pred_generator, term_solver, synth_fun, syn_ctx):
         super().__init__(pred_generator, term_solver, syn_ctx)
-        indicator_fun, compute_indicator = \
+        indicator_fun, compute_indicator, compute_indicator_words = \
                 self._dummy_spec(synth_fun)
         self.pred_solver = termsolvers.PointlessTermSolver(
                 compute_indicator,
-                pred_generator)
+                pred_generator,
+                compute_indicator_words)
 
 class PointDistinctDTUnifier(EnumerativeDTUnifierBase):
     def __init__(self, pred_generator, term_solver, synth_fun, syn_ctx):
         super().__init__(pred_generator, term_solver, syn_ctx)
-        indicator_fun, compute_indicator = \
+        indicator_fun, compute_indicator, compute_indicator_words = \
                 self._dummy_spec(synth_fun)
         self.pred_solver = termsolvers.PointDistinctTermSolver(
                 compute_indicator,
-                pred_generator)
+                pred_generator,
+                compute_indicator_words)
 
 
 class NullUnifier(UnifierInterface):
@@ -38,9 +38,10 @@
 
 # Code:
 
-from eusolver import BitSet
+from utils import bitsets
 from semantics import semantics_core
 from unifiers.unifiers import UnifierInterface
+from exprs import batch_evaluation
 from exprs import evaluation
 from exprs import exprs
 from exprs import exprtypes
@@ -135,7 +136,11 @@ class SpecAwareLIAUnifier(UnifierInterface):
             form_params = self.spec.formal_params[sf]
             term_sub = exprs.substitute_all(term, list(zip(form_params, act_params)))
 
+        columns = batch_evaluation.make_columns(relevent_points)
         def eval_on_relevent_points(pred):
+            ret = batch_evaluation.evaluate_expression_batch(pred, columns, len(relevent_points))
+            if ret is not None:
+                return ret.tolist()
             ret = []
             for p in relevent_points:
                 eval_ctx.set_valuation_map(p)
@@ -250,7 +255,7 @@ class SpecAwareLIAUnifier(UnifierInterface):
             pred = self._compute_pre_condition(full_sig, curr_sig, term)
             pred_terms.append((pred, term))
 
-            pred_sig = BitSet(len(self.points))
+            pred_sig = bitsets.BitSet(len(self.points))
             for i in curr_sig:
                 eval_ctx.set_valuation_map(self.points[i])
                 if evaluation.evaluate_expression_raw(pred, eval_ctx):
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+# bitsets.py ---
+#
+# Filename: bitsets.py
+#
+#
+# Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by The University of Pennsylvania
+# 4. Neither the name of the University of Pennsylvania nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+
+# Code:
+
+"""The BitSet implementation used for signatures.  Either the native
+eusolver.BitSet, or IntBitSet, a pure python drop-in replacement that keeps
+the set in a python int and so avoids a ctypes call (and a finalizer) per
+operation.  The backend is picked by the EUSOLVER_BITSET_BACKEND environment
+variable ('native' or 'python'), or by calling set_backend() before any
+signatures are made.  Clients must refer to bitsets.BitSet at the point of
+use (and not import the name), so that set_backend() takes effect."""
+
+import os
+import struct
+
+import eusolver
+from utils import basetypes
+
+_word_size = 64
+_bools_to_digits = b'0' + b'1' * 255
+_digits_to_bools = bytes.maketrans(b'01', b'\x00\x01')
+
+def _num_words(num_bits):
+    return (num_bits + _word_size - 1) // _word_size
+
+class IntBitSet(object):
+    __slots__ = ['bits', 'num_bits', 'cached_hash_code']
+
+    def __init__(self, num_bits, bits=0):
+        self.num_bits = num_bits
+        self.bits = bits
+        self.cached_hash_code = None
+
+    @classmethod
+    def make_factory(cls, size_of_universe):
+        def _factory_function():
+            return cls(size_of_universe)
+        return _factory_function
+
+    def _check_mutability(self):
+        if (self.cached_hash_code != None):
+            raise eusolver.BitSetException('Attempted to modify a "frozen" BitSet object!')
+
+    def _check_bounds(self, elem):
+        if elem < 0 or elem >= self.num_bits:
+            raise eusolver.BitSetException('Index %d was out of bounds when used to index %s'
+                                           % (elem, str(self)))
+
+    def _check_universe(self, other):
+        if self.num_bits != other.num_bits:
+            raise eusolver.BitSetException('Operations on BitSets over universes of ' +
+                                           'different sizes (%d and %d)' %
+                                           (self.num_bits, other.num_bits))
+        return other.bits
+
+    def _full_mask(self):
+        return (1 << self.num_bits) - 1
+
+    def __iter__(self):
+        bits = self.bits
+        while bits:
+            lowest = bits & -bits
+            yield lowest.bit_length() - 1
+            bits ^= lowest
+
+    def __contains__(self, elem):
+        self._check_bounds(elem)
+        return (self.bits >> elem) & 1 == 1
+
+    def __str__(self):
+        return 'BitSet(%d): {%s}' % (self.num_bits, ', '.join([ str(e) for e in self ]))
+
+    def __getitem__(self, index):
+        return (index in self)
+
+    def __setitem__(self, key, value):
+        self._check_mutability()
+        self._check_bounds(key)
+        if (value):
+            self.bits |= (1 << key)
+        else:
+            self.bits &= ~(1 << key)
+
+    def __and__(self, other):
+        return IntBitSet(self.num_bits, self.bits & self._check_universe(other))
+
+    def __iand__(self, other):
+        self.bits &= self._check_universe(other)
+        return self
+
+    def __or__(self, other):
+        return IntBitSet(self.num_bits, self.bits | self._check_universe(other))
+
+    def __ior__(self, other):
+        self.bits |= self._check_universe(other)
+        return self
+
+    def __xor__(self, other):
+        return IntBitSet(self.num_bits, self.bits ^ self._check_universe(other))
+
+    def __ixor__(self, other):
+        self.bits ^= self._check_universe(other)
+        return self
+
+    def __sub__(self, other):
+        return IntBitSet(self.num_bits, self.bits & ~self._check_universe(other))
+
+    def __isub__(self, other):
+        self.bits &= ~self._check_universe(other)
+        return self
+
+    def __le__(self, other):
+        return self.issubset(other)
+
+    def __lt__(self, other):
+        return self.is_proper_subset(other)
+
+    def __ge__(self, other):
+        return self.issuperset(other)
+
+    def __gt__(self, other):
+        return self.is_proper_superset(other)
+
+    def __eq__(self, other):
+        if not isinstance(other, IntBitSet):
+            return NotImplemented
+        return self.bits == other.bits and self.num_bits == other.num_bits
+
+    def __ne__(self, other):
+        return (not (self == other))
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+    def __hash__(self):
+        if (self.cached_hash_code == None):
+            self.cached_hash_code = hash(self.bits)
+        return self.cached_hash_code
+
+    def union(self, other):
+        return (self | other)
+
+    def in_place_union(self, other):
+        self._check_mutability()
+        self.bits |= self._check_universe(other)
+
+    def intersection(self, other):
+        return (self & other)
+
+    def in_place_intersection(self, other):
+        self._check_mutability()
+        self.bits &= self._check_universe(other)
+
+    def inter(self, other):
+        return (self & other)
+
+    def in_place_inter(self, other):
+        self.in_place_intersection(other)
+
+    def size_of_universe(self):
+        return self.num_bits
+
+    def add(self, elem):
+        self._check_mutability()
+        self._check_bounds(elem)
+        self.bits |= (1 << elem)
+
+    def clear_all(self):
+        self._check_mutability()
+        self.bits = 0
+
+    def set_all(self):
+        self._check_mutability()
+        self.bits = self._full_mask()
+
+    def is_full(self):
+        return self.bits == self._full_mask()
+
+    def is_empty(self):
+        return self.bits == 0
+
+    def isdisjoint(self, other):
+        return (self.bits & self._check_universe(other)) == 0
+
+    def issubset(self, other):
+        return (self.bits & ~self._check_universe(other)) == 0
+
+    def is_proper_subset(self, other):
+        return self.issubset(other) and self.bits != other.bits
+
+    def issuperset(self, other):
+        return other.issubset(self)
+
+    def is_proper_superset(self, other):
+        return other.is_proper_subset(self)
+
+    def difference(self, other):
+        return (self - other)
+
+    def in_place_difference(self, other):
+        self._check_mutability()
+        self.bits &= ~self._check_universe(other)
+
+    def in_place_negate(self):
+        self._check_mutability()
+        self.bits ^= self._full_mask()
+
+    def symmetric_difference(self, other):
+        return (self ^ other)
+
+    def in_place_symmetric_difference(self, other):
+        self._check_mutability()
+        self.bits ^= self._check_universe(other)
+
+    def copy(self):
+        return IntBitSet(self.num_bits, self.bits)
+
+    def clone(self):
+        return self.copy()
+
+    def copy_in(self, other):
+        self._check_mutability()
+        if other.num_bits > self.num_bits:
+            raise eusolver.BitSetException('Size of universe of bitset to be copied in ' +
+                                           'exceeds the size of the universe of the ' +
+                                           'bitset to be copied into!')
+        self.bits = other.bits
+
+    # Bulk construction and export, as in eusolver.BitSet
+    @classmethod
+    def from_words(cls, size_of_universe, words):
+        if isinstance(words, (list, tuple)):
+            raw = struct.pack('<%dQ' % len(words), *words)
+        else:
+            raw = memoryview(words).cast('B')
+        bits = int.from_bytes(raw, 'little')
+        if bits >> size_of_universe:
+            raise eusolver.BitSetException('Words to be assigned have bits set beyond ' +
+                                           'the size of the universe (%d)' % size_of_universe)
+        return cls(size_of_universe, bits)
+
+    @classmethod
+    def from_bools(cls, size_of_universe, values):
+        values = bytes(values)
+        if len(values) > size_of_universe:
+            raise eusolver.BitSetException('Number of values to be assigned exceeds ' +
+                                           'the size of the universe (%d)' % size_of_universe)
+        if len(values) == 0:
+            return cls(size_of_universe)
+        return cls(size_of_universe, int(values[::-1].translate(_bools_to_digits), 2))
+
+    def to_words(self):
+        mask = (1 << _word_size) - 1
+        return [ (self.bits >> (_word_size * i)) & mask
+                 for i in range(_num_words(self.num_bits)) ]
+
+    def to_bools(self):
+        if self.num_bits == 0:
+            return b''
+        digits = format(self.bits, '0%db' % self.num_bits)[::-1]
+        return digits.encode('ascii').translate(_digits_to_bools)
+
+    def to_native(self):
+        raw = self.bits.to_bytes(_num_words(self.num_bits) * (_word_size // 8), 'little')
+        return eusolver.BitSet.from_words(self.num_bits, raw)
+
+
+_backends = {
+        'native' : eusolver.BitSet,
+        'python' : IntBitSet
+        }
+
+def set_backend(backend_name):
+    global BitSet
+    backend = _backends.get(backend_name, None)
+    if backend is None:
+        raise basetypes.ArgumentError('Unknown BitSet backend: %s (expected one of %s)' %
+                                      (backend_name, ', '.join(sorted(_backends.keys()))))
+    BitSet = backend
+
+BitSet = None
+set_backend(os.environ.get('EUSOLVER_BITSET_BACKEND', 'native'))
+
+def _to_native(bitset):
+    if isinstance(bitset, IntBitSet):
+        return bitset.to_native()
+    return bitset
+
+def learn_decision_tree_for_ml_data(pred_signature_list, term_signature_list):
+    """Wrapper around eusolver.eus_learn_decision_tree_for_ml_data that
+    accepts signatures of either backend: python ones are converted to native
+    BitSets just for the call."""
+    return eusolver.eus_learn_decision_tree_for_ml_data(
+            [ _to_native(sig) for sig in pred_signature_list ],
+            [ _to_native(sig) for sig in term_signature_list ])
+
+def _same_signatures(old_signature_list, new_signature_list):
+    return all(old is new or old == new
+               for (old, new) in zip(old_signature_list, new_signature_list))
+
+class DecisionTreeLearningSession(object):
+    """Learns decision trees over predicate and term signature lists that
+    grow from one call to the next, as they do across the rounds of a
+    unifier: only the signatures (and points) added since the previous call
+    are marshalled to the native eusolver.DecisionTreeLearner, which in turn
+    re-scores only what changed.  The result is always the tree that
+    learn_decision_tree_for_ml_data() would learn on the same lists; when
+    the lists are not extensions of the previous ones, the session starts
+    over, and with it, a fresh entropy cache."""
+
+    def __init__(self, entropy_cache_capacity=None):
+        self.entropy_cache_capacity = entropy_cache_capacity
+        self.learner = None
+        self.num_points = 0
+        self.pred_signature_list = []
+        self.term_signature_list = []
+
+    def _restart(self, num_points, pred_signature_list, term_signature_list):
+        self.learner = eusolver.DecisionTreeLearner(num_points, self.entropy_cache_capacity)
+        self.learner.add_attributes([ _to_native(sig) for sig in pred_signature_list ])
+        self.learner.add_labels([ _to_native(sig) for sig in term_signature_list ])
+
+    def _extend(self, num_points, pred_signature_list, term_signature_list):
+        """Returns False if the lists do not extend the previous ones."""
+        old_num_points = self.num_points
+        old_preds = self.pred_signature_list
+        old_terms = self.term_signature_list
+        if (num_points < old_num_points or
+            len(pred_signature_list) < len(old_preds) or
+            len(term_signature_list) < len(old_terms)):
+            return False
+
+        if num_points == old_num_points:
+            if not (_same_signatures(old_preds, pred_signature_list) and
+                    _same_signatures(old_terms, term_signature_list)):
+                return False
+        else:
+            # the signatures have been recomputed over the new points, they
+            # must agree with the previous ones on the old points
+            pred_bools = [ sig.to_bools() for sig in pred_signature_list[:len(old_preds)] ]
+            term_bools = [ sig.to_bools() for sig in term_signature_list[:len(old_terms)] ]
+            for (old_signatures, new_bools) in ((old_preds, pred_bools),
+                                                (old_terms, term_bools)):
+                for (old_sig, bools) in zip(old_signatures, new_bools):
+                    if bools[:old_num_points] != old_sig.to_bools():
+                        return False
+            point_preds = []
+            point_terms = []
+            for point_id in range(old_num_points, num_points):
+                point_preds.append(eusolver.BitSet.from_bools(
+                    len(pred_bools), bytes(b[point_id] for b in pred_bools)))
+                point_terms.append(eusolver.BitSet.from_bools(
+                    len(term_bools), bytes(b[point_id] for b in term_bools)))
+            self.learner.add_points(point_preds, point_terms)
+
+        self.learner.add_attributes([ _to_native(sig)
+                                      for sig in pred_signature_list[len(old_preds):] ])
+        self.learner.add_labels([ _to_native(sig)
+                                  for sig in term_signature_list[len(old_terms):] ])
+        return True
+
+    def get_entropy_cache_stats(self):
+        if self.learner is None:
+            return None
+        return self.learner.get_entropy_cache_stats()
+
+    def learn(self, pred_signature_list, term_signature_list):
+        if len(pred_signature_list) == 0 or len(term_signature_list) == 0:
+            # let the native learner report the error
+            return learn_decision_tree_for_ml_data(pred_signature_list, term_signature_list)
+
+        num_points = pred_signature_list[0].size_of_universe()
+        if (self.learner is None or
+            not self._extend(num_points, pred_signature_list, term_signature_list)):
+            self._restart(num_points, pred_signature_list, term_signature_list)
+
+        self.num_points = num_points
+        self.pred_signature_list = list(pred_signature_list)
+        self.term_signature_list = list(term_signature_list)
+        return self.learner.learn()
+
+def test_int_bitsets():
+    import random
+    for num_bits in [ 0, 1, 63, 64, 65, 200, 1024 ]:
+        for _ in range(20):
+            values_a = [ random.random() < 0.5 for i in range(num_bits) ]
+            values_b = [ random.random() < 0.5 for i in range(num_bits) ]
+            native_a = eusolver.BitSet.from_bools(num_bits, values_a)
+            native_b = eusolver.BitSet.from_bools(num_bits, values_b)
+            int_a = IntBitSet.from_bools(num_bits, values_a)
+            int_b = IntBitSet.from_bools(num_bits, values_b)
+
+            assert int_a.to_bools() == native_a.to_bools()
+            assert int_a.to_words() == native_a.to_words()
+            assert IntBitSet.from_words(num_bits, native_a.to_words()) == int_a
+            assert int_a.to_native() == native_a
+            assert list(int_a) == list(native_a)
+            assert len(int_a) == len(native_a)
+            assert str(int_a) == str(native_a)
+            for (x, y) in [ (int_a | int_b, native_a | native_b),
+                            (int_a & int_b, native_a & native_b),
+                            (int_a ^ int_b, native_a ^ native_b),
+                            (int_a - int_b, native_a - native_b) ]:
+                assert x.to_bools() == y.to_bools()
+            assert int_a.issubset(int_b) == native_a.issubset(native_b)
+            assert int_a.isdisjoint(int_b) == native_a.isdisjoint(native_b)
+            assert int_a.is_full() == native_a.is_full()
+            assert int_a.is_empty() == native_a.is_empty()
+
+    a = IntBitSet(100)
+    a.add(3)
+    hash(a)
+    try:
+        a.add(4)
+        assert False
+    except eusolver.BitSetException:
+        pass
+    print('All IntBitSet tests passed!')
+
+def test_decision_tree_learning_session():
+    import random
+    rng = random.Random(7)
+    def random_signature(backend, num_points):
+        return backend.from_bools(num_points, [ rng.random() < 0.4 for _ in range(num_points) ])
+    def extend(backend, sig, num_points):
+        values = sig.to_bools() + bytes(rng.random() < 0.4
+                                        for _ in range(num_points - sig.size_of_universe()))
+        return backend.from_bools(num_points, values)
+
+    for (backend, capacity) in ((eusolver.BitSet, None), (IntBitSet, 2)):
+        session = DecisionTreeLearningSession(capacity)
+        num_points = 4
+        preds = [ random_signature(backend, num_points) for _ in range(2) ]
+        terms = [ random_signature(backend, num_points) for _ in range(2) ]
+        for round_number in range(30):
+            choice = rng.randrange(3)
+            if choice == 0:
+                preds.append(random_signature(backend, num_points))
+            elif choice == 1:
+                terms.append(random_signature(backend, num_points))
+            else:
+                num_points += rng.randrange(1, 3)
+                preds = [ extend(backend, sig, num_points) for sig in preds ]
+                terms = [ extend(backend, sig, num_points) for sig in terms ]
+            expected = learn_decision_tree_for_ml_data(preds, terms)
+            actual = session.learn(preds, terms)
+            assert str(expected) == str(actual)
+        if capacity is not None:
+            assert session.get_entropy_cache_stats()['size'] <= capacity
+        # lists that do not extend the previous ones restart the session
+        preds.reverse()
+        assert str(session.learn(preds, terms)) == str(learn_decision_tree_for_ml_data(preds, terms))
+    print('All DecisionTreeLearningSession tests passed!')
+
+if __name__ == '__main__':
+    test_int_bitsets()
+    test_decision_tree_learning_session()
+
+#
+# bitsets.py ends here
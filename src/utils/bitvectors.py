@@ -186,6 +186,27 @@ class BitVector(object):
         return BitVector(~(self.value), self.size)
 
 
+# Bitvector values can also be represented by plain python ints: the
+# unsigned value, always masked to the width, which is only known from the
+# (static) type of the expression that computed the value.
+
+_width_masks = {}
+
+def get_width_masks(size):
+    """Returns the pair (mask, sign_mask) for bitvectors of the given width."""
+    retval = _width_masks.get(size, None)
+    if retval is None:
+        retval = ((1 << size) - 1, 1 << (size - 1))
+        _width_masks[size] = retval
+    return retval
+
+def raw_value(value_object):
+    """Returns the int value of a BitVector, and any other value as is."""
+    if isinstance(value_object, BitVector):
+        return value_object.value
+    return value_object
+
+
 ###################################################################
 #        TESTS AND SUCH
 ###################################################################
@@ -40,14 +40,13 @@
 
 from exprs import exprs
 from verifiers import verifiers
-import eusolver
 from termsolvers import termsolvers_lia
 from exprs import exprtypes
 from utils.lia_utils import LIAExpression, LIAInequality
 from utils import utils
 from utils import z3smt
 import semantics
-from eusolver import BitSet
+from utils import bitsets
 
 def simplify(syn_ctx, expr):
     e0 = expr
@@ -471,8 +470,8 @@ def dt_rewrite_boolean_combs(syn_ctx, sol, synth_fun):
             ]
         return (new_pred_sig_list, new_term_sig_list)
 
-    pred_sig_list = [ BitSet(0) for p in preds ]
-    term_sig_list = [ BitSet(0) for t in terms ]
+    pred_sig_list = [ bitsets.BitSet(0) for p in preds ]
+    term_sig_list = [ bitsets.BitSet(0) for t in terms ]
 
     expr = terms[0]
     fsol = None
@@ -484,7 +483,7 @@ def dt_rewrite_boolean_combs(syn_ctx, sol, synth_fun):
         else:
             point = list(map(lambda v, d: z3smt.z3value_to_value(v, d.variable_info), z3point, dummy_vars))
             (pred_sig_list, term_sig_list) = add_point(point, pred_sig_list, term_sig_list)
-            dt = eusolver.eus_learn_decision_tree_for_ml_data(pred_sig_list, term_sig_list)
+            dt = bitsets.learn_decision_tree_for_ml_data(pred_sig_list, term_sig_list)
             expr = verifiers.naive_dt_to_expr(syn_ctx, dt, preds, terms)
     sol = exprs.substitute_all(fsol, list(zip(dummy_vars, vs)))
     return sol
@@ -43,7 +43,7 @@
 
 import math
 import sys
-from eusolver import BitSet
+from utils import bitsets
 
 def print_module_misuse_and_exit():
     # print('This module is intented for use as a library, and not as a ' +
@@ -149,11 +149,8 @@ class UIDGenerator(object):
 
 def bitset_extend(bitset, value):
     assert type(value) == bool
-    newset = BitSet(bitset.size_of_universe() + 1)
-    newset.copy_in(bitset)
-    if value:
-        newset.add(bitset.size_of_universe())
-    return newset
+    values = bitset.to_bools() + (b'\x01' if value else b'\x00')
+    return bitsets.BitSet.from_bools(len(values), values)
 
 def timeout(func, args=(), kwargs={}, timeout_duration=1, default=None):
     import signal
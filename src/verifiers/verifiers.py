@@ -42,7 +42,7 @@ from exprs import exprtypes
 import z3
 from semantics import semantics_types
 from utils import basetypes
-from exprs import evaluation
+from exprs import compilation
 from utils.bitvectors import BitVector
 
 _expr_to_str = exprs.expression_to_string
@@ -50,6 +50,11 @@ _expr_to_smt = semantics_types.expression_to_smt
 _is_expr = exprs.is_expression
 _get_expr_with_id = exprs.get_expr_with_id
 
+# The clause that has failed most often is only checked on its own before
+# the whole specification if it has failed at least this often: the extra
+# query is wasted on every term that satisfies it
+_min_precheck_failure_rate = 0.5
+
 def model_to_point(model, var_smt_expr_list, var_info_list):
     num_vars = len(var_smt_expr_list)
     point = [None] * num_vars
@@ -214,6 +219,25 @@ class StdVerifier(VerifierBase):
         self.smt_solver.push()
         self.smt_solver.add(self.frozen_smt_cnstr)
 
+        # The negations of the clauses of the spec, one at a time, so that
+        # the clause most likely to fail can be checked on its own first
+        self.clause_statistics = spec.get_clause_statistics()
+        self.neg_clause_smt_cnstrs = [
+                _expr_to_smt(syn_ctx.make_function_expr('not',
+                    exprs.substitute_all(clause, list(zip(fun_apps, fun_app_subst_vars)))),
+                    self.smt_ctx)
+                for clause in self.clause_statistics.clauses ]
+        self.clause_smt_solver = self.smt_ctx.make_solver()
+
+    def _record_clause_failure(self, model, ordering):
+        """Records the checks of the clauses in ordering against the
+        counterexample model, up to the first one it violates."""
+        for index in ordering:
+            violated = z3.is_true(model.evaluate(self.neg_clause_smt_cnstrs[index], True))
+            self.clause_statistics.record(index, not violated)
+            if violated:
+                break
+
     def _verify_expr(self, term):
         smt_ctx = self.smt_ctx
         smt_solver = self.smt_solver
@@ -225,6 +249,31 @@ class StdVerifier(VerifierBase):
             for f, t in zip(self.synth_funs, term.children):
                 smt_ctx.set_interpretation(f, t)
         eq_cnstr = _expr_to_smt(self.outvar_cnstr, smt_ctx)
+
+        # Check the clause that has failed most often on its own first, if it
+        # fails often enough: if the term is wrong that is most likely a
+        # cheaper query.  If it holds, the whole spec is checked as usual,
+        # which amounts to checking the rest of the clauses
+        statistics = self.clause_statistics
+        ordering = statistics.update_ordering()
+        if (len(ordering) > 1 and
+                statistics.failure_rate(ordering[0]) >= _min_precheck_failure_rate):
+            clause_solver = self.clause_smt_solver
+            clause_solver.push()
+            clause_solver.add(eq_cnstr)
+            clause_solver.add(self.neg_clause_smt_cnstrs[ordering[0]])
+            r = clause_solver.check()
+            if (r == z3.sat):
+                statistics.record(ordering[0], False)
+                cex_point = model_to_point(clause_solver.model(),
+                                           self.var_smt_expr_list,
+                                           self.var_info_list)
+                clause_solver.pop()
+                return [cex_point]
+            clause_solver.pop()
+            statistics.record(ordering[0], True)
+            ordering = ordering[1:]
+
         smt_solver.push()
         smt_solver.add(eq_cnstr)
         # print("1:", exprs.expression_to_string(self.canon_spec))
@@ -234,11 +283,15 @@ class StdVerifier(VerifierBase):
         smt_solver.pop()
 
         if (r == z3.sat):
-            cex_point = model_to_point(smt_solver.model(),
+            model = smt_solver.model()
+            self._record_clause_failure(model, ordering)
+            cex_point = model_to_point(model,
                                        self.var_smt_expr_list,
                                        self.var_info_list)
             return [cex_point]
         else:
+            for index in ordering:
+                statistics.record(index, True)
             return term
 
     def _verify_guard_term_list(self, guard_term_list, dt_tuple):
@@ -346,17 +399,21 @@ class PBEVerifier(VerifierBase):
         self.syn_ctx = syn_ctx
         self.eval_ctx = self.spec.eval_ctx 
 
+    def _evaluator(self, expr):
+        return compilation.make_point_evaluator(expr, self.eval_ctx)
+
     def _verify_expr(self, term):
-        eval_ctx = self.eval_ctx
-        for point, value in self.valuations.items():
-            eval_ctx.set_valuation_map(point)
-            result = evaluation.evaluate_expression_raw(term, eval_ctx)
+        evaluate = self._evaluator(term)
+        statistics = self.spec.get_clause_statistics()
+        statistics.update_ordering()
+        for index, point, value in self.spec.get_ordered_examples():
+            result = evaluate(point)
+            statistics.record(index, result == value)
             if result != value:
                 return [point]
         return term
 
     def _verify_guard_term_list(self, guard_term_list, dt_tuple):
-        eval_ctx = self.eval_ctx
         cex_points = []
         selected_leaf_terms = []
 
@@ -364,15 +421,16 @@ class PBEVerifier(VerifierBase):
 
         for (pred, term_list) in guard_term_list:
             good_terms = term_list.copy()
+            evaluate_pred = self._evaluator(pred)
+            term_evaluators = dict([ (id(term), self._evaluator(term)) for term in term_list ])
 
-            for point, value in self.spec.valuations.items():
-                eval_ctx.set_valuation_map(point)
-                if not evaluation.evaluate_expression_raw(pred, eval_ctx):
+            for _, point, value in self.spec.get_ordered_examples():
+                if not evaluate_pred(point):
                     continue
 
                 next_good_terms = []
                 for term in good_terms:
-                    curr_value = evaluation.evaluate_expression_raw(term, eval_ctx)
+                    curr_value = term_evaluators[id(term)](point)
                     if curr_value == value:
                         next_good_terms.append(term)
                 good_terms = next_good_terms
@@ -399,14 +457,16 @@ class PBEVerifier(VerifierBase):
         return self._default_verify(unification)
 
     def verify_term_solve(self, terms):
-        eval_ctx = self.eval_ctx
-        for point, value in self.valuations.items():
-            eval_ctx.set_valuation_map(point)
+        term_evaluators = [ self._evaluator(term) for term in terms ]
+        statistics = self.spec.get_clause_statistics()
+        statistics.update_ordering()
+        for index, point, value in self.spec.get_ordered_examples():
             found_one = False
-            for term in terms:
-                result = evaluation.evaluate_expression_raw(term, eval_ctx)
+            for evaluate in term_evaluators:
+                result = evaluate(point)
                 if result == value:
                     found_one = True
+            statistics.record(index, found_one)
             if not found_one:
                 return [point]
         return None
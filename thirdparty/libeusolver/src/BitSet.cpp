@@ -1087,6 +1087,75 @@ void BitSet::copy_in(const BitSet* other)
     }
 }
 
+u64 BitSet::get_num_words() const
+{
+    return num_words_for_bits(m_size_of_universe);
+}
+
+void BitSet::assign_words(const u64* words, u64 num_words)
+{
+    auto const len = num_words_for_bits(m_size_of_universe);
+    if (num_words > len) {
+        throw BitSetException((std::string)"Number of words to be assigned (" +
+                              std::to_string(num_words) + ") exceeds the number of " +
+                              "words in the BitSet object (" + std::to_string(len) + ")");
+    }
+    auto const rem = m_size_of_universe % bits_per_word();
+    if (num_words == len && rem != 0 && (words[len - 1] >> rem) != 0) {
+        throw BitSetException((std::string)"Words to be assigned have bits set " +
+                              "beyond the size of the universe (" +
+                              std::to_string(m_size_of_universe) + ")");
+    }
+
+    invalidate_hash();
+    auto bitvec_ptr = get_bitvec_ptr();
+    std::memcpy(bitvec_ptr, words, sizeof(WordType) * num_words);
+    std::memset(bitvec_ptr + num_words, 0, sizeof(WordType) * (len - num_words));
+}
+
+void BitSet::export_words(u64* words, u64 num_words) const
+{
+    auto const len = num_words_for_bits(m_size_of_universe);
+    if (num_words < len) {
+        throw BitSetException((std::string)"Buffer of " + std::to_string(num_words) +
+                              " words is too small to export a BitSet of " +
+                              std::to_string(len) + " words");
+    }
+    std::memcpy(words, get_bitvec_ptr(), sizeof(WordType) * len);
+}
+
+void BitSet::assign_bools(const u08* values, u64 num_values)
+{
+    if (num_values > m_size_of_universe) {
+        throw BitSetException((std::string)"Number of values to be assigned (" +
+                              std::to_string(num_values) + ") exceeds the size " +
+                              "of the universe (" + std::to_string(m_size_of_universe) + ")");
+    }
+
+    invalidate_hash();
+    auto const len = num_words_for_bits(m_size_of_universe);
+    auto bitvec_ptr = get_bitvec_ptr();
+    std::memset(bitvec_ptr, 0, sizeof(WordType) * len);
+    for (u64 i = 0; i < num_values; ++i) {
+        if (values[i] != 0) {
+            bitvec_ptr[i / bits_per_word()] |= construct_mask(i);
+        }
+    }
+}
+
+void BitSet::export_bools(u08* values, u64 num_values) const
+{
+    if (num_values < m_size_of_universe) {
+        throw BitSetException((std::string)"Buffer of " + std::to_string(num_values) +
+                              " values is too small to export a BitSet over a universe " +
+                              "of size " + std::to_string(m_size_of_universe));
+    }
+    auto const bitvec_ptr = get_bitvec_ptr();
+    for (u64 i = 0; i < m_size_of_universe; ++i) {
+        values[i] = ((bitvec_ptr[i / bits_per_word()] & construct_mask(i)) != 0) ? 1 : 0;
+    }
+}
+
 } /* end namespace eusolver */
 
 //
@@ -310,6 +310,15 @@ public:
     void copy_in(const BitSet* other);
     void copy_in(const BitSet& other);
 
+    // bulk import/export: words are laid out as in the internal representation,
+    // i.e., bit i of word j is element (j * 64 + i); bools are one byte per
+    // element, with any non zero byte meaning that the element is present
+    u64 get_num_words() const;
+    void assign_words(const u64* words, u64 num_words);
+    void export_words(u64* words, u64 num_words) const;
+    void assign_bools(const u08* values, u64 num_values);
+    void export_bools(u08* values, u64 num_values) const;
+
     u64 hash() const;
 
     std::string to_string() const;
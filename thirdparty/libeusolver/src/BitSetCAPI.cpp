@@ -36,6 +36,7 @@
 // Code:
 
 #include <exception>
+#include <memory>
 #include "BitSet.hpp"
 #include "LibEUSolverInternal.hpp"
 
@@ -342,5 +343,47 @@ void eus_bitset_copy_in(void* bitset1, const void* bitset2)
     return;
 }
 
+void* eus_bitset_construct_from_words(u64 size_of_universe, const u64* words, u64 num_words)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    std::unique_ptr<eusolver::BitSet> retval(new eusolver::BitSet(size_of_universe, false));
+    retval->assign_words(words, num_words);
+    return retval.release();
+    EUS_END_CHECKED_BLOCK_;
+    return nullptr;
+}
+
+void* eus_bitset_construct_from_bools(u64 size_of_universe, const u08* values, u64 num_values)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    std::unique_ptr<eusolver::BitSet> retval(new eusolver::BitSet(size_of_universe, false));
+    retval->assign_bools(values, num_values);
+    return retval.release();
+    EUS_END_CHECKED_BLOCK_;
+    return nullptr;
+}
+
+u64 eus_bitset_get_num_words(const void* bitset)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    return as_bs(bitset)->get_num_words();
+    EUS_END_CHECKED_BLOCK_;
+    return 0;
+}
+
+void eus_bitset_export_words(const void* bitset, u64* words, u64 num_words)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    as_bs(bitset)->export_words(words, num_words);
+    EUS_END_CHECKED_BLOCK_;
+}
+
+void eus_bitset_export_bools(const void* bitset, u08* values, u64 num_values)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    as_bs(bitset)->export_bools(values, num_values);
+    EUS_END_CHECKED_BLOCK_;
+}
+
 //
 // BitSetCAPI.cpp ends here
@@ -38,11 +38,12 @@
 // Code:
 
 #include "LibEUSolverInternal.hpp"
+#include "ThreadPool.hpp"
 
 namespace eusolver {
 namespace detail_ {
 
-std::string g_libeusolver_c_api_error_buffer_;
+thread_local std::string g_libeusolver_c_api_error_buffer_;
 
 } /* end namespace detail_ */
 } /* end namespace eusolver */
@@ -61,6 +62,21 @@ const char* eus_get_last_error_string()
     }
 }
 
+void eus_set_num_threads(u32 num_threads)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    eusolver::set_global_num_threads(num_threads);
+    EUS_END_CHECKED_BLOCK_;
+}
+
+u32 eus_get_num_threads()
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    return eusolver::get_global_thread_pool()->get_num_threads();
+    EUS_END_CHECKED_BLOCK_;
+    return 0;
+}
+
 
 //
 // LibEUSolver.cpp ends here
@@ -101,10 +101,20 @@ const char* eus_bitset_to_string(const void* bitset);
 void* eus_bitset_clone(const void* bitset);
 void eus_bitset_copy_in(void* bitset1, const void* bitset2);
 
+void* eus_bitset_construct_from_words(u64 size_of_universe, const u64* words, u64 num_words);
+void* eus_bitset_construct_from_bools(u64 size_of_universe, const u08* values, u64 num_values);
+u64 eus_bitset_get_num_words(const void* bitset);
+void eus_bitset_export_words(const void* bitset, u64* words, u64 num_words);
+void eus_bitset_export_bools(const void* bitset, u08* values, u64 num_values);
+
 /* error handling */
 bool eus_check_error();
 const char* eus_get_last_error_string();
 
+/* threads used by the decision tree learners, including the calling one */
+void eus_set_num_threads(u32 num_threads);
+u32 eus_get_num_threads();
+
 /* decision tree traversal */
 bool eus_decision_tree_is_split_node(const void* node);
 bool eus_decision_tree_is_leaf_node(const void* node);
@@ -123,6 +133,22 @@ const void* eus_learn_decision_tree_for_ml_data(void** pred_signatures,
                                                 u64 num_preds,
                                                 u64 num_terms);
 
+/* incremental learning, retaining signatures across calls */
+void* eus_dt_learner_construct(u64 num_points);
+void eus_dt_learner_destroy(void* learner);
+u64 eus_dt_learner_get_num_points(const void* learner);
+u64 eus_dt_learner_get_num_attributes(const void* learner);
+u64 eus_dt_learner_get_num_labels(const void* learner);
+void eus_dt_learner_add_attributes(void* learner, void** pred_signatures, u64 num_preds);
+void eus_dt_learner_add_labels(void* learner, void** term_signatures, u64 num_terms);
+void eus_dt_learner_add_points(void* learner, void** point_pred_signatures,
+                               void** point_term_signatures, u64 num_points);
+/* stats: capacity, size, hits, misses, evictions */
+void eus_dt_learner_set_entropy_cache_capacity(void* learner, u64 capacity);
+void eus_dt_learner_clear_entropy_cache(void* learner);
+void eus_dt_learner_get_entropy_cache_stats(const void* learner, u64* stats);
+const void* eus_dt_learner_learn(void* learner);
+
 #ifdef __cplusplus
 }
 #endif
@@ -57,7 +57,9 @@
 namespace eusolver {
 namespace detail_ {
 
-extern std::string g_libeusolver_c_api_error_buffer_;
+// per thread, since calls into the library (which do not hold the
+// python GIL) may be made from several threads at once
+extern thread_local std::string g_libeusolver_c_api_error_buffer_;
 
 } /* end namespace detail_ */
 } /* end namespace eusolver */
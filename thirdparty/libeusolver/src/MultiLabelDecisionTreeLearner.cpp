@@ -51,17 +51,6 @@ namespace multilabel_decision_tree_learner {
 
 namespace detail_ {
 
-class BitSetHasher
-{
-public:
-    inline u64 operator () (const BitSet& bitset) const
-    {
-        return bitset.hash();
-    }
-};
-
-static std::unordered_map<BitSet, double, BitSetHasher> entropy_cache;
-
 // we need at least this much of an information gain ratio
 // to consider things a good split
 static constexpr double sc_info_gain_threshold = 0.0001;
@@ -148,7 +137,7 @@ compute_summations_of_point_covers(const InputVector& point_to_labelling_vector,
 static inline double
 get_entropy_for_set(const InputVector& labelling_to_point_vector,
                     const InputVector& point_to_labelling_vector,
-                    const BitSet& point_set)
+                    const BitSet& point_set, EntropyCache& entropy_cache)
 {
     // audupa: TESTING
     // return an entropy value of zero if there exists a common label
@@ -167,9 +156,9 @@ get_entropy_for_set(const InputVector& labelling_to_point_vector,
     // for this set of points
 
     // audupa: Implement memoization of entropy
-    auto cached_it = detail_::entropy_cache.find(point_set);
-    if (cached_it != detail_::entropy_cache.end()) {
-        return cached_it->second;
+    double cached_entropy;
+    if (entropy_cache.lookup(point_set, cached_entropy)) {
+        return cached_entropy;
     }
 
     BitSet union_of_labels(point_to_labelling_vector[0]->get_size_of_universe());
@@ -214,7 +203,7 @@ get_entropy_for_set(const InputVector& labelling_to_point_vector,
 
     // std::cout << "Entropy of set: " << point_set.to_string()
     //           << " = " << -final_entropy << std::endl;
-    detail_::entropy_cache[point_set] = (-final_entropy);
+    entropy_cache.insert(point_set, (-final_entropy));
     return (-final_entropy);
 }
 
@@ -223,7 +212,8 @@ get_entropy_for_split_on_attribute(const InputVector& attribute_to_point_vector,
                                    const InputVector& labelling_to_point_vector,
                                    const InputVector& point_to_attribute_vector,
                                    const InputVector& point_to_labelling_vector,
-                                   const BitSet& point_filter, u64 attribute_id)
+                                   const BitSet& point_filter, u64 attribute_id,
+                                   EntropyCache& entropy_cache)
 {
     auto const num_points = attribute_to_point_vector[0]->get_size_of_universe();
     BitSet positive_points(num_points);
@@ -248,135 +238,22 @@ get_entropy_for_split_on_attribute(const InputVector& attribute_to_point_vector,
 
     auto const positive_set_entropy = get_entropy_for_set(labelling_to_point_vector,
                                                           point_to_labelling_vector,
-                                                          positive_points);
+                                                          positive_points, entropy_cache);
     auto const negative_set_entropy = get_entropy_for_set(labelling_to_point_vector,
                                                           point_to_labelling_vector,
-                                                          negative_points);
+                                                          negative_points, entropy_cache);
     return ((positive_set_entropy * positive_ratio) +
             (negative_set_entropy * negative_ratio));
 }
 
-static inline const DecisionTreeNodeBase*
-learn_dt_for_ml_data(const InputVector& attribute_to_point_vector,
-                     const InputVector& labelling_to_point_vector,
-                     const InputVector& point_to_attribute_vector,
-                     const InputVector& point_to_labelling_vector,
-                     const BitSet& point_filter)
-{
-    // check if we can exit early, that is if we have a common label
-
-    // std::cout << "MultiLabelDecisionTreeLearner: Checking common label..." << std::endl;
-
-    auto common_labels = get_common_labels(point_to_labelling_vector, point_filter);
-    if (!common_labels.is_empty()) {
-        // std::cout << "MultiLabelDecisionTreeLearner: Found common label "
-        //           << common_label << std::endl;
-        return new DecisionTreeLeafNode(common_labels);
-    }
-
-    // std::cout << "MultiLabelDecisionTreeLearner: No common label!" << std::endl;
-    // std::cout << "MultiLabelDecisionTreeLearner: Learning decision tree for points:"
-    //           << std::endl << point_filter.to_string() << std::endl;
-
-    // early exit not possible, determine the locally optimal split
-    // but before that determine the entropy of the current set
-    auto const current_entropy = get_entropy_for_set(labelling_to_point_vector,
-                                                     point_to_labelling_vector,
-                                                     point_filter);
-
-    double min_split_entropy = std::numeric_limits<double>::max();
-    i64 attribute_with_minimal_split_entropy = -1;
-
-    const u64 num_attributes = point_to_attribute_vector[0]->get_size_of_universe();
-    for (u64 i = 0; i < num_attributes; ++i) {
-        // std::cout << "Evaluating split on attribute " << i << std::endl;
-        auto const cur_split_entropy = get_entropy_for_split_on_attribute(attribute_to_point_vector,
-                                                                          labelling_to_point_vector,
-                                                                          point_to_attribute_vector,
-                                                                          point_to_labelling_vector,
-                                                                          point_filter, i);
-        auto const info_gain = current_entropy - cur_split_entropy;
-        if ((info_gain / current_entropy >= sc_info_gain_threshold) &&
-            (cur_split_entropy < min_split_entropy)) {
-            min_split_entropy = cur_split_entropy;
-            attribute_with_minimal_split_entropy = i;
-        }
-
-        // std::cout << "Split on attribute " << i << " results in " << info_gain
-        //           << " bits of information gain." << std::endl;
-    }
-
-    if (attribute_with_minimal_split_entropy < 0) {
-        // no split possible, decision tree cannot be learned :-(
-        return nullptr;
-    }
-
-    // try to split on best attribute
-    auto const num_points = attribute_to_point_vector[0]->get_size_of_universe();
-    BitSet positive_points(num_points);
-    BitSet negative_points(num_points);
-
-    // std::cout << "MultiLabelDecisionTreeLearner: Splitting on attribute "
-    //           << attribute_with_minimal_split_entropy << std::endl;
-    // std::cout << "Entropy of set before split = " << current_entropy << std::endl;
-    // std::cout << "Entropy after split = " << min_split_entropy << std::endl;
-
-    for (auto point_id : point_filter) {
-        if (attribute_to_point_vector[attribute_with_minimal_split_entropy]->test_bit(point_id)) {
-            positive_points.set_bit(point_id);
-        } else {
-            negative_points.set_bit(point_id);
-        }
-    }
-
-    auto positive_child = learn_dt_for_ml_data(attribute_to_point_vector,
-                                               labelling_to_point_vector,
-                                               point_to_attribute_vector,
-                                               point_to_labelling_vector,
-                                               positive_points);
-    if (positive_child == nullptr) {
-        return nullptr;
-    }
-    auto negative_child = learn_dt_for_ml_data(attribute_to_point_vector,
-                                               labelling_to_point_vector,
-                                               point_to_attribute_vector,
-                                               point_to_labelling_vector,
-                                               negative_points);
-    if (negative_child == nullptr) {
-        delete positive_child;
-        return nullptr;
-    }
-
-    return new DecisionTreeSplitNode(attribute_with_minimal_split_entropy,
-                                     positive_child, negative_child);
-}
-
 /**
-   Transposes an input vector.
+   Returns a copy of a bitset, over a universe of (at least) the same size.
  */
 
-static inline InputVector transpose_bitset_vector(const InputVector& input_vector)
+static inline BitSet* extended_copy(const BitSet* bitset, u64 new_size_of_universe)
 {
-    auto const num_input_bitsets = input_vector.size();
-    if (num_input_bitsets == 0) {
-        return InputVector();
-    }
-
-    auto const size_of_input_bitset_universe = input_vector[0]->get_size_of_universe();
-    if (size_of_input_bitset_universe == 0) {
-        return InputVector();
-    }
-
-    InputVector retval(size_of_input_bitset_universe, nullptr);
-    for (u64 i = 0; i < size_of_input_bitset_universe; ++i) {
-        auto cur_bitset = new BitSet(num_input_bitsets);
-        for (u64 j = 0; j < num_input_bitsets; ++j) {
-            if (input_vector[j]->test_bit(i)) {
-                cur_bitset->set_bit(j);
-            }
-        }
-        retval[i] = cur_bitset;
-    }
+    auto retval = new BitSet(new_size_of_universe);
+    retval->copy_in(bitset);
     return retval;
 }
 
@@ -453,6 +330,374 @@ const char* DecisionTreeException::what() const noexcept
 }
 
 
+// Implementation of EntropyCache
+EntropyCache::EntropyCache(u64 capacity)
+    : m_capacity(capacity), m_num_hits(0), m_num_misses(0), m_num_evictions(0)
+{
+    // Nothing here
+}
+
+EntropyCache::~EntropyCache()
+{
+    // Nothing here
+}
+
+void EntropyCache::evict_to(u64 num_entries)
+{
+    while (m_entries.size() > num_entries) {
+        m_entries.erase(m_lru_list.back());
+        m_lru_list.pop_back();
+        ++m_num_evictions;
+    }
+}
+
+bool EntropyCache::lookup(const BitSet& point_set, double& entropy)
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    auto it = m_entries.find(point_set);
+    if (it == m_entries.end()) {
+        ++m_num_misses;
+        return false;
+    }
+    ++m_num_hits;
+    m_lru_list.splice(m_lru_list.begin(), m_lru_list, it->second.m_lru_position);
+    entropy = it->second.m_entropy;
+    return true;
+}
+
+void EntropyCache::insert(const BitSet& point_set, double entropy)
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    if (m_capacity == 0 || m_entries.find(point_set) != m_entries.end()) {
+        return;
+    }
+    evict_to(m_capacity - 1);
+    m_lru_list.push_front(point_set);
+    Entry entry;
+    entry.m_entropy = entropy;
+    entry.m_lru_position = m_lru_list.begin();
+    m_entries.emplace(point_set, entry);
+}
+
+void EntropyCache::clear()
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    m_entries.clear();
+    m_lru_list.clear();
+}
+
+u64 EntropyCache::get_capacity() const
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_capacity;
+}
+
+void EntropyCache::set_capacity(u64 capacity)
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    m_capacity = capacity;
+    evict_to(capacity);
+}
+
+u64 EntropyCache::get_size() const
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_entries.size();
+}
+
+u64 EntropyCache::get_num_hits() const
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_num_hits;
+}
+
+u64 EntropyCache::get_num_misses() const
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_num_misses;
+}
+
+u64 EntropyCache::get_num_evictions() const
+{
+    std::lock_guard<std::mutex> lock(m_mutex);
+    return m_num_evictions;
+}
+
+
+// Implementation of IncrementalDecisionTreeLearner
+IncrementalDecisionTreeLearner::IncrementalDecisionTreeLearner(u64 num_points,
+                                                               u64 entropy_cache_capacity)
+    : m_num_points(num_points), m_entropy_cache(entropy_cache_capacity)
+{
+    for (u64 i = 0; i < num_points; ++i) {
+        m_point_to_attribute_vector.push_back(new BitSet(0));
+        m_point_to_labelling_vector.push_back(new BitSet(0));
+    }
+}
+
+IncrementalDecisionTreeLearner::~IncrementalDecisionTreeLearner()
+{
+    detail_::free_ptr_vector(m_attribute_to_point_vector);
+    detail_::free_ptr_vector(m_labelling_to_point_vector);
+    detail_::free_ptr_vector(m_point_to_attribute_vector);
+    detail_::free_ptr_vector(m_point_to_labelling_vector);
+}
+
+u64 IncrementalDecisionTreeLearner::get_num_points() const
+{
+    return m_num_points;
+}
+
+u64 IncrementalDecisionTreeLearner::get_num_attributes() const
+{
+    return m_attribute_to_point_vector.size();
+}
+
+u64 IncrementalDecisionTreeLearner::get_num_labels() const
+{
+    return m_labelling_to_point_vector.size();
+}
+
+EntropyCache& IncrementalDecisionTreeLearner::get_entropy_cache()
+{
+    return m_entropy_cache;
+}
+
+const EntropyCache& IncrementalDecisionTreeLearner::get_entropy_cache() const
+{
+    return m_entropy_cache;
+}
+
+void IncrementalDecisionTreeLearner::add_attributes(const std::vector<const BitSet*>&
+                                                    attribute_to_point_vector)
+{
+    for (auto const& bitset : attribute_to_point_vector) {
+        if (bitset->get_size_of_universe() != m_num_points) {
+            throw DecisionTreeException((std::string)"Inconsistent number of points in " +
+                                        "attribute vector provided to learn decision tree.");
+        }
+    }
+
+    auto const old_num_attributes = m_attribute_to_point_vector.size();
+    auto const num_new_attributes = attribute_to_point_vector.size();
+    for (auto const& bitset : attribute_to_point_vector) {
+        m_attribute_to_point_vector.push_back(bitset->clone());
+    }
+
+    for (u64 i = 0; i < m_num_points; ++i) {
+        auto cur_bitset = detail_::extended_copy(m_point_to_attribute_vector[i],
+                                                 old_num_attributes + num_new_attributes);
+        for (u64 j = 0; j < num_new_attributes; ++j) {
+            if (attribute_to_point_vector[j]->test_bit(i)) {
+                cur_bitset->set_bit(old_num_attributes + j);
+            }
+        }
+        delete m_point_to_attribute_vector[i];
+        m_point_to_attribute_vector[i] = cur_bitset;
+    }
+    // the splits already memoized remain the best among the attributes
+    // they were chosen from, the new attributes are scored lazily in learn()
+}
+
+void IncrementalDecisionTreeLearner::add_labels(const std::vector<const BitSet*>&
+                                                labelling_to_point_vector)
+{
+    for (auto const& bitset : labelling_to_point_vector) {
+        if (bitset->get_size_of_universe() != m_num_points) {
+            throw DecisionTreeException((std::string)"Inconsistent number of points in " +
+                                        "labelling vector provided to learn decision tree.");
+        }
+    }
+
+    auto const old_num_labels = m_labelling_to_point_vector.size();
+    auto const num_new_labels = labelling_to_point_vector.size();
+    for (auto const& bitset : labelling_to_point_vector) {
+        m_labelling_to_point_vector.push_back(bitset->clone());
+    }
+
+    for (u64 i = 0; i < m_num_points; ++i) {
+        auto cur_bitset = detail_::extended_copy(m_point_to_labelling_vector[i],
+                                                 old_num_labels + num_new_labels);
+        for (u64 j = 0; j < num_new_labels; ++j) {
+            if (labelling_to_point_vector[j]->test_bit(i)) {
+                cur_bitset->set_bit(old_num_labels + j);
+            }
+        }
+        delete m_point_to_labelling_vector[i];
+        m_point_to_labelling_vector[i] = cur_bitset;
+    }
+
+    if (num_new_labels > 0) {
+        m_split_memo.clear();
+        m_entropy_cache.clear();
+    }
+}
+
+void IncrementalDecisionTreeLearner::add_points(const std::vector<const BitSet*>&
+                                                point_to_attribute_vector,
+                                                const std::vector<const BitSet*>&
+                                                point_to_labelling_vector)
+{
+    auto const num_new_points = point_to_attribute_vector.size();
+    if (point_to_labelling_vector.size() != num_new_points) {
+        throw DecisionTreeException((std::string)"Inconsistent number of points in " +
+                                    "attribute and labelling vectors provided to " +
+                                    "learn decision tree.");
+    }
+    auto const num_attributes = m_attribute_to_point_vector.size();
+    auto const num_labels = m_labelling_to_point_vector.size();
+    for (u64 i = 0; i < num_new_points; ++i) {
+        if (point_to_attribute_vector[i]->get_size_of_universe() != num_attributes ||
+            point_to_labelling_vector[i]->get_size_of_universe() != num_labels) {
+            throw DecisionTreeException((std::string)"Inconsistent number of attributes " +
+                                        "or labels at point provided to learn decision tree.");
+        }
+    }
+
+    auto const old_num_points = m_num_points;
+    m_num_points += num_new_points;
+
+    for (u64 i = 0; i < num_attributes; ++i) {
+        auto cur_bitset = detail_::extended_copy(m_attribute_to_point_vector[i], m_num_points);
+        for (u64 j = 0; j < num_new_points; ++j) {
+            if (point_to_attribute_vector[j]->test_bit(i)) {
+                cur_bitset->set_bit(old_num_points + j);
+            }
+        }
+        delete m_attribute_to_point_vector[i];
+        m_attribute_to_point_vector[i] = cur_bitset;
+    }
+    for (u64 i = 0; i < num_labels; ++i) {
+        auto cur_bitset = detail_::extended_copy(m_labelling_to_point_vector[i], m_num_points);
+        for (u64 j = 0; j < num_new_points; ++j) {
+            if (point_to_labelling_vector[j]->test_bit(i)) {
+                cur_bitset->set_bit(old_num_points + j);
+            }
+        }
+        delete m_labelling_to_point_vector[i];
+        m_labelling_to_point_vector[i] = cur_bitset;
+    }
+
+    for (u64 j = 0; j < num_new_points; ++j) {
+        m_point_to_attribute_vector.push_back(point_to_attribute_vector[j]->clone());
+        m_point_to_labelling_vector.push_back(point_to_labelling_vector[j]->clone());
+    }
+
+    if (num_new_points > 0) {
+        m_split_memo.clear();
+        m_entropy_cache.clear();
+    }
+}
+
+const DecisionTreeNodeBase*
+IncrementalDecisionTreeLearner::learn_for_points(const BitSet& point_filter)
+{
+    // check if we can exit early, that is if we have a common label
+    auto common_labels = detail_::get_common_labels(m_point_to_labelling_vector, point_filter);
+    if (!common_labels.is_empty()) {
+        return new DecisionTreeLeafNode(common_labels);
+    }
+
+    // early exit not possible, determine the locally optimal split,
+    // resuming from the attributes scored for this set of points before
+    auto it = m_split_memo.find(point_filter);
+    if (it == m_split_memo.end()) {
+        SplitMemo new_memo;
+        new_memo.m_num_attributes_scored = 0;
+        new_memo.m_current_entropy = detail_::get_entropy_for_set(m_labelling_to_point_vector,
+                                                                  m_point_to_labelling_vector,
+                                                                  point_filter,
+                                                                  m_entropy_cache);
+        new_memo.m_min_split_entropy = std::numeric_limits<double>::max();
+        new_memo.m_best_attribute = -1;
+        it = m_split_memo.emplace(point_filter, new_memo).first;
+    }
+
+    auto& memo = it->second;
+    auto const current_entropy = memo.m_current_entropy;
+    const u64 first_attribute = memo.m_num_attributes_scored;
+    const u64 num_attributes = m_attribute_to_point_vector.size();
+
+    // score the attributes (possibly in parallel), then pick the
+    // best one in attribute order, so that ties are broken as usual
+    std::vector<double> split_entropies(num_attributes - first_attribute);
+    auto score_attributes = [&](u64 chunk_begin, u64 chunk_end) {
+        for (u64 i = chunk_begin; i < chunk_end; ++i) {
+            split_entropies[i - first_attribute] =
+                detail_::get_entropy_for_split_on_attribute(m_attribute_to_point_vector,
+                                                            m_labelling_to_point_vector,
+                                                            m_point_to_attribute_vector,
+                                                            m_point_to_labelling_vector,
+                                                            point_filter, i,
+                                                            m_entropy_cache);
+        }
+    };
+    if (num_attributes - first_attribute < sc_min_attributes_for_parallel_scoring) {
+        score_attributes(first_attribute, num_attributes);
+    } else {
+        m_thread_pool->parallel_for(first_attribute, num_attributes, score_attributes);
+    }
+
+    for (u64 i = first_attribute; i < num_attributes; ++i) {
+        auto const cur_split_entropy = split_entropies[i - first_attribute];
+        auto const info_gain = current_entropy - cur_split_entropy;
+        if ((info_gain / current_entropy >= detail_::sc_info_gain_threshold) &&
+            (cur_split_entropy < memo.m_min_split_entropy)) {
+            memo.m_min_split_entropy = cur_split_entropy;
+            memo.m_best_attribute = i;
+        }
+    }
+    memo.m_num_attributes_scored = num_attributes;
+    auto const best_attribute = memo.m_best_attribute;
+
+    if (best_attribute < 0) {
+        // no split possible, decision tree cannot be learned :-(
+        return nullptr;
+    }
+
+    // split on best attribute
+    BitSet positive_points(m_num_points);
+    BitSet negative_points(m_num_points);
+    for (auto point_id : point_filter) {
+        if (m_attribute_to_point_vector[best_attribute]->test_bit(point_id)) {
+            positive_points.set_bit(point_id);
+        } else {
+            negative_points.set_bit(point_id);
+        }
+    }
+
+    auto positive_child = learn_for_points(positive_points);
+    if (positive_child == nullptr) {
+        return nullptr;
+    }
+    auto negative_child = learn_for_points(negative_points);
+    if (negative_child == nullptr) {
+        delete positive_child;
+        return nullptr;
+    }
+
+    return new DecisionTreeSplitNode(best_attribute, positive_child, negative_child);
+}
+
+const DecisionTreeNodeBase* IncrementalDecisionTreeLearner::learn()
+{
+    if (m_num_points == 0) {
+        throw DecisionTreeException((std::string)"Cannot learn decision tree with zero " +
+                                    "sample points.");
+    }
+    if (m_attribute_to_point_vector.size() == 0 || m_labelling_to_point_vector.size() == 0) {
+        throw DecisionTreeException((std::string)"Inputs to decision tree learning cannot " +
+                                    "be empty.");
+    }
+
+    m_thread_pool = get_global_thread_pool();
+    BitSet sample_point_filter(m_num_points, true);
+    auto retval = learn_for_points(sample_point_filter);
+    m_thread_pool.reset();
+    return retval;
+}
+
+
 // Implementation of actual learning methods
 
 /**
@@ -469,23 +714,10 @@ learn_decision_tree_for_multi_labelled_data(const std::vector<const BitSet*>& at
 {
     detail_::check_dt_learning_inputs(attribute_to_point_vector,
                                       labelling_to_point_vector);
-    // std::cout << "MultiLabelDecisionTreeLearner: Transposing bitsets..." << std::endl;
-    auto point_to_attribute_vector = detail_::transpose_bitset_vector(attribute_to_point_vector);
-    auto point_to_labelling_vector = detail_::transpose_bitset_vector(labelling_to_point_vector);
-    // std::cout << "MultiLabelDecisionTreeLearner: Done Transposing bitsets!" << std::endl;
-    BitSet sample_point_filter(attribute_to_point_vector[0]->get_size_of_universe(), true);
-
-    auto retval = detail_::learn_dt_for_ml_data(attribute_to_point_vector,
-                                                labelling_to_point_vector,
-                                                point_to_attribute_vector,
-                                                point_to_labelling_vector,
-                                                sample_point_filter);
-    detail_::free_ptr_vector(point_to_attribute_vector);
-    detail_::free_ptr_vector(point_to_labelling_vector);
-    detail_::entropy_cache.clear();
-    // std::cout << "MultiLabelDecisionTreeLearner: returning decision tree:" << std::endl
-    //           << retval->to_string() << std::endl;
-    return retval;
+    IncrementalDecisionTreeLearner learner(attribute_to_point_vector[0]->get_size_of_universe());
+    learner.add_attributes(attribute_to_point_vector);
+    learner.add_labels(labelling_to_point_vector);
+    return learner.learn();
 }
 
 #undef EUSOLVER_DEBUG_DT_CHECK_INPUTS_
@@ -41,9 +41,14 @@
 #define EUSOLVER_MULTI_LABEL_DECISION_TREE_LEARNER_HPP_
 
 #include <vector>
+#include <list>
+#include <memory>
+#include <mutex>
+#include <unordered_map>
 
 #include "BitSet.hpp"
 #include "DecisionTree.hpp"
+#include "ThreadPool.hpp"
 
 namespace eusolver {
 namespace multilabel_decision_tree_learner {
@@ -66,6 +71,129 @@ public:
     virtual const char* what() const noexcept override;
 };
 
+class BitSetHasher
+{
+public:
+    inline u64 operator () (const BitSet& bitset) const
+    {
+        return bitset.hash();
+    }
+};
+
+/**
+   Memoizes the entropy of sets of points, for one learner. Holds at most
+   capacity entries, evicting the least recently used one when full; a
+   capacity of zero disables caching. The statistics are cumulative over
+   the lifetime of the cache, clear() only drops the entries. Safe to use
+   from the threads scoring splits in parallel.
+ */
+class EntropyCache
+{
+private:
+    struct Entry
+    {
+        double m_entropy;
+        std::list<BitSet>::iterator m_lru_position;
+    };
+
+    u64 m_capacity;
+    std::list<BitSet> m_lru_list;
+    std::unordered_map<BitSet, Entry, BitSetHasher> m_entries;
+    u64 m_num_hits;
+    u64 m_num_misses;
+    u64 m_num_evictions;
+    mutable std::mutex m_mutex;
+
+    void evict_to(u64 num_entries);
+
+public:
+    EntropyCache(u64 capacity);
+    EntropyCache(const EntropyCache& other) = delete;
+    EntropyCache(EntropyCache&& other) = delete;
+    ~EntropyCache();
+
+    EntropyCache& operator = (const EntropyCache& other) = delete;
+    EntropyCache& operator = (EntropyCache&& other) = delete;
+
+    bool lookup(const BitSet& point_set, double& entropy);
+    void insert(const BitSet& point_set, double entropy);
+    void clear();
+
+    u64 get_capacity() const;
+    void set_capacity(u64 capacity);
+    u64 get_size() const;
+    u64 get_num_hits() const;
+    u64 get_num_misses() const;
+    u64 get_num_evictions() const;
+};
+
+/**
+   A learner that retains its inputs across successive calls to learn(),
+   so that attributes, labels and points can be supplied as deltas. The
+   choice of split made at each node is memoized by the set of points
+   reaching that node: when only attributes have been added since the
+   last call, only the new attributes are scored at nodes seen before,
+   and subtrees whose point sets are unchanged are split exactly as
+   before. Adding labels or points changes the entropy of every set of
+   points, and discards the memoized splits and entropies. The attributes
+   at a node are scored in parallel on the global thread pool; the split
+   chosen does not depend on the number of threads. A learner must not be
+   used from more than one thread at a time.
+ */
+class IncrementalDecisionTreeLearner
+{
+private:
+    struct SplitMemo
+    {
+        u64 m_num_attributes_scored;
+        double m_current_entropy;
+        double m_min_split_entropy;
+        i64 m_best_attribute;
+    };
+
+    u64 m_num_points;
+    std::vector<const BitSet*> m_attribute_to_point_vector;
+    std::vector<const BitSet*> m_labelling_to_point_vector;
+    std::vector<const BitSet*> m_point_to_attribute_vector;
+    std::vector<const BitSet*> m_point_to_labelling_vector;
+    std::unordered_map<BitSet, SplitMemo, BitSetHasher> m_split_memo;
+    EntropyCache m_entropy_cache;
+    std::shared_ptr<ThreadPool> m_thread_pool;
+
+    const DecisionTreeNodeBase* learn_for_points(const BitSet& point_filter);
+
+public:
+    static constexpr u64 sc_default_entropy_cache_capacity = (1 << 16);
+    // fewer attributes than this are scored on the calling thread alone
+    static constexpr u64 sc_min_attributes_for_parallel_scoring = 64;
+
+    IncrementalDecisionTreeLearner(u64 num_points,
+                                   u64 entropy_cache_capacity = sc_default_entropy_cache_capacity);
+    IncrementalDecisionTreeLearner(const IncrementalDecisionTreeLearner& other) = delete;
+    IncrementalDecisionTreeLearner(IncrementalDecisionTreeLearner&& other) = delete;
+    ~IncrementalDecisionTreeLearner();
+
+    IncrementalDecisionTreeLearner&
+    operator = (const IncrementalDecisionTreeLearner& other) = delete;
+    IncrementalDecisionTreeLearner&
+    operator = (IncrementalDecisionTreeLearner&& other) = delete;
+
+    u64 get_num_points() const;
+    u64 get_num_attributes() const;
+    u64 get_num_labels() const;
+    EntropyCache& get_entropy_cache();
+    const EntropyCache& get_entropy_cache() const;
+
+    // each bitset is over the current set of points
+    void add_attributes(const std::vector<const BitSet*>& attribute_to_point_vector);
+    void add_labels(const std::vector<const BitSet*>& labelling_to_point_vector);
+    // one bitset per new point, over the current attributes and labels respectively
+    void add_points(const std::vector<const BitSet*>& point_to_attribute_vector,
+                    const std::vector<const BitSet*>& point_to_labelling_vector);
+
+    const DecisionTreeNodeBase* learn();
+};
+
 const DecisionTreeNodeBase*
 learn_decision_tree_for_multi_labelled_data(const std::vector<const BitSet*>& attribute_vector,
                                             const std::vector<const BitSet*>& labelling_vector);
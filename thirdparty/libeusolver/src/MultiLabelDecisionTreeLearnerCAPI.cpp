@@ -65,5 +65,124 @@ const void* eus_learn_decision_tree_for_ml_data(void** pred_signatures,
     return nullptr;
 }
 
+static inline eusolver::multilabel_decision_tree_learner::IncrementalDecisionTreeLearner*
+as_learner(void* ptr)
+{
+    return static_cast<eusolver::multilabel_decision_tree_learner::IncrementalDecisionTreeLearner*>(ptr);
+}
+
+static inline const eusolver::multilabel_decision_tree_learner::IncrementalDecisionTreeLearner*
+as_learner(const void* ptr)
+{
+    return static_cast<const eusolver::multilabel_decision_tree_learner::IncrementalDecisionTreeLearner*>(ptr);
+}
+
+static inline std::vector<const eusolver::BitSet*> as_bitset_vector(void** bitsets,
+                                                                    u64 num_bitsets)
+{
+    std::vector<const eusolver::BitSet*> retval(num_bitsets, nullptr);
+    for (u64 i = 0; i < num_bitsets; ++i) {
+        retval[i] = static_cast<eusolver::BitSet*>(bitsets[i]);
+    }
+    return retval;
+}
+
+void* eus_dt_learner_construct(u64 num_points)
+{
+    using eusolver::multilabel_decision_tree_learner::IncrementalDecisionTreeLearner;
+    EUS_BEGIN_CHECKED_BLOCK_;
+    return new IncrementalDecisionTreeLearner(num_points);
+    EUS_END_CHECKED_BLOCK_;
+    return nullptr;
+}
+
+void eus_dt_learner_destroy(void* learner)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    delete as_learner(learner);
+    EUS_END_CHECKED_BLOCK_;
+}
+
+u64 eus_dt_learner_get_num_points(const void* learner)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    return as_learner(learner)->get_num_points();
+    EUS_END_CHECKED_BLOCK_;
+    return 0;
+}
+
+u64 eus_dt_learner_get_num_attributes(const void* learner)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    return as_learner(learner)->get_num_attributes();
+    EUS_END_CHECKED_BLOCK_;
+    return 0;
+}
+
+u64 eus_dt_learner_get_num_labels(const void* learner)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    return as_learner(learner)->get_num_labels();
+    EUS_END_CHECKED_BLOCK_;
+    return 0;
+}
+
+void eus_dt_learner_add_attributes(void* learner, void** pred_signatures, u64 num_preds)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    as_learner(learner)->add_attributes(as_bitset_vector(pred_signatures, num_preds));
+    EUS_END_CHECKED_BLOCK_;
+}
+
+void eus_dt_learner_add_labels(void* learner, void** term_signatures, u64 num_terms)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    as_learner(learner)->add_labels(as_bitset_vector(term_signatures, num_terms));
+    EUS_END_CHECKED_BLOCK_;
+}
+
+void eus_dt_learner_add_points(void* learner, void** point_pred_signatures,
+                               void** point_term_signatures, u64 num_points)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    as_learner(learner)->add_points(as_bitset_vector(point_pred_signatures, num_points),
+                                    as_bitset_vector(point_term_signatures, num_points));
+    EUS_END_CHECKED_BLOCK_;
+}
+
+void eus_dt_learner_set_entropy_cache_capacity(void* learner, u64 capacity)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    as_learner(learner)->get_entropy_cache().set_capacity(capacity);
+    EUS_END_CHECKED_BLOCK_;
+}
+
+void eus_dt_learner_clear_entropy_cache(void* learner)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    as_learner(learner)->get_entropy_cache().clear();
+    EUS_END_CHECKED_BLOCK_;
+}
+
+void eus_dt_learner_get_entropy_cache_stats(const void* learner, u64* stats)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    auto const& entropy_cache = as_learner(learner)->get_entropy_cache();
+    stats[0] = entropy_cache.get_capacity();
+    stats[1] = entropy_cache.get_size();
+    stats[2] = entropy_cache.get_num_hits();
+    stats[3] = entropy_cache.get_num_misses();
+    stats[4] = entropy_cache.get_num_evictions();
+    EUS_END_CHECKED_BLOCK_;
+}
+
+const void* eus_dt_learner_learn(void* learner)
+{
+    EUS_BEGIN_CHECKED_BLOCK_;
+    return as_learner(learner)->learn();
+    EUS_END_CHECKED_BLOCK_;
+    return nullptr;
+}
+
 //
 // MultiLabelDecisionTreeLearnerCAPI.cpp ends here
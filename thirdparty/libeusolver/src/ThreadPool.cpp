@@ -0,0 +1,172 @@
+// ThreadPool.cpp ---
+//
+// Filename: ThreadPool.cpp
+//
+//
+// Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+// All rights reserved.
+//
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+// 1. Redistributions of source code must retain the above copyright
+//    notice, this list of conditions and the following disclaimer.
+// 2. Redistributions in binary form must reproduce the above copyright
+//    notice, this list of conditions and the following disclaimer in the
+//    documentation and/or other materials provided with the distribution.
+// 3. All advertising materials mentioning features or use of this software
+//    must display the following acknowledgement:
+//    This product includes software developed by The University of Pennsylvania
+// 4. Neither the name of the University of Pennsylvania nor the
+//    names of its contributors may be used to endorse or promote products
+//    derived from this software without specific prior written permission.
+//
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+// EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+// DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+// (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+// LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+// ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+// (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+// SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+//
+//
+
+// Code:
+
+#include <algorithm>
+#include <exception>
+
+#include "ThreadPool.hpp"
+
+namespace eusolver {
+
+ThreadPool::ThreadPool(u32 num_threads)
+    : m_shutting_down(false)
+{
+    for (u32 i = 1; i < num_threads; ++i) {
+        m_workers.emplace_back(&ThreadPool::run_worker, this);
+    }
+}
+
+ThreadPool::~ThreadPool()
+{
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        m_shutting_down = true;
+    }
+    m_task_available.notify_all();
+    for (auto& worker : m_workers) {
+        worker.join();
+    }
+}
+
+void ThreadPool::run_worker()
+{
+    while (true) {
+        std::function<void()> task;
+        {
+            std::unique_lock<std::mutex> lock(m_mutex);
+            m_task_available.wait(lock, [this] { return m_shutting_down || !m_tasks.empty(); });
+            if (m_tasks.empty()) {
+                return;
+            }
+            task = std::move(m_tasks.front());
+            m_tasks.pop_front();
+        }
+        task();
+    }
+}
+
+u32 ThreadPool::get_num_threads() const
+{
+    return m_workers.size() + 1;
+}
+
+void ThreadPool::parallel_for(u64 begin, u64 end, const std::function<void(u64, u64)>& body)
+{
+    if (begin >= end) {
+        return;
+    }
+    u64 const num_iterations = end - begin;
+    u64 const num_chunks = std::min((u64)get_num_threads(), num_iterations);
+    if (num_chunks == 1) {
+        body(begin, end);
+        return;
+    }
+
+    std::mutex done_mutex;
+    std::condition_variable all_done;
+    u64 num_pending = num_chunks - 1;
+    std::exception_ptr first_exception;
+
+    auto run_chunk = [&](u64 chunk_id) {
+        auto const chunk_begin = begin + (num_iterations * chunk_id) / num_chunks;
+        auto const chunk_end = begin + (num_iterations * (chunk_id + 1)) / num_chunks;
+        try {
+            body(chunk_begin, chunk_end);
+        } catch (...) {
+            std::lock_guard<std::mutex> lock(done_mutex);
+            if (!first_exception) {
+                first_exception = std::current_exception();
+            }
+        }
+    };
+
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        for (u64 i = 1; i < num_chunks; ++i) {
+            m_tasks.emplace_back([&, i] {
+                run_chunk(i);
+                std::lock_guard<std::mutex> done_lock(done_mutex);
+                if (--num_pending == 0) {
+                    all_done.notify_one();
+                }
+            });
+        }
+    }
+    m_task_available.notify_all();
+
+    run_chunk(0);
+    {
+        std::unique_lock<std::mutex> lock(done_mutex);
+        all_done.wait(lock, [&] { return num_pending == 0; });
+    }
+    if (first_exception) {
+        std::rethrow_exception(first_exception);
+    }
+}
+
+namespace detail_ {
+
+static std::mutex s_global_thread_pool_mutex;
+static std::shared_ptr<ThreadPool> s_global_thread_pool;
+
+} /* end namespace detail_ */
+
+std::shared_ptr<ThreadPool> get_global_thread_pool()
+{
+    std::lock_guard<std::mutex> lock(detail_::s_global_thread_pool_mutex);
+    if (!detail_::s_global_thread_pool) {
+        detail_::s_global_thread_pool = std::make_shared<ThreadPool>(1);
+    }
+    return detail_::s_global_thread_pool;
+}
+
+void set_global_num_threads(u32 num_threads)
+{
+    auto new_pool = std::make_shared<ThreadPool>(std::max(num_threads, (u32)1));
+    std::shared_ptr<ThreadPool> old_pool;
+    {
+        std::lock_guard<std::mutex> lock(detail_::s_global_thread_pool_mutex);
+        old_pool = detail_::s_global_thread_pool;
+        detail_::s_global_thread_pool = new_pool;
+    }
+    // old_pool, if no longer in use, is joined here, outside the lock
+}
+
+} /* end namespace eusolver */
+
+//
+// ThreadPool.cpp ends here
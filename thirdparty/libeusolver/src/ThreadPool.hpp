@@ -0,0 +1,97 @@
+// ThreadPool.hpp ---
+//
+// Filename: ThreadPool.hpp
+//
+//
+// Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+// All rights reserved.
+//
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+// 1. Redistributions of source code must retain the above copyright
+//    notice, this list of conditions and the following disclaimer.
+// 2. Redistributions in binary form must reproduce the above copyright
+//    notice, this list of conditions and the following disclaimer in the
+//    documentation and/or other materials provided with the distribution.
+// 3. All advertising materials mentioning features or use of this software
+//    must display the following acknowledgement:
+//    This product includes software developed by The University of Pennsylvania
+// 4. Neither the name of the University of Pennsylvania nor the
+//    names of its contributors may be used to endorse or promote products
+//    derived from this software without specific prior written permission.
+//
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+// EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+// DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+// (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+// LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+// ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+// (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+// SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+//
+//
+
+// Code:
+
+#if !defined EUSOLVER_THREAD_POOL_HPP_
+#define EUSOLVER_THREAD_POOL_HPP_
+
+#include <condition_variable>
+#include <deque>
+#include <functional>
+#include <memory>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+#include "EUSolverTypes.h"
+
+namespace eusolver {
+
+/**
+   A fixed set of worker threads, used to run the iterations of a loop in
+   parallel. A pool of n threads has n - 1 workers: the thread calling
+   parallel_for() runs a share of the iterations itself. Any number of
+   threads may call parallel_for() on the same pool concurrently.
+ */
+class ThreadPool
+{
+private:
+    std::vector<std::thread> m_workers;
+    std::deque<std::function<void()>> m_tasks;
+    std::mutex m_mutex;
+    std::condition_variable m_task_available;
+    bool m_shutting_down;
+
+    void run_worker();
+
+public:
+    ThreadPool(u32 num_threads);
+    ThreadPool(const ThreadPool& other) = delete;
+    ThreadPool(ThreadPool&& other) = delete;
+    ~ThreadPool();
+
+    ThreadPool& operator = (const ThreadPool& other) = delete;
+    ThreadPool& operator = (ThreadPool&& other) = delete;
+
+    u32 get_num_threads() const;
+
+    // calls body(chunk_begin, chunk_end) on disjoint chunks covering
+    // [begin, end), and returns once all of them are done. The first
+    // exception thrown by body, if any, is rethrown here.
+    void parallel_for(u64 begin, u64 end, const std::function<void(u64, u64)>& body);
+};
+
+// the pool shared by libeusolver, a single thread unless configured otherwise.
+// Replacing it does not disturb the loops running on the previous pool.
+std::shared_ptr<ThreadPool> get_global_thread_pool();
+void set_global_num_threads(u32 num_threads);
+
+} /* end namespace eusolver */
+
+#endif /* EUSOLVER_THREAD_POOL_HPP_ */
+
+//
+// ThreadPool.hpp ends here
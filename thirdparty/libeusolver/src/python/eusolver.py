@@ -50,6 +50,10 @@ class LibEUSolverException(Exception):
     def __str__(self):
         return 'LibEUSolverException: ' + self.error_msg
 
+class BitSetException(LibEUSolverException):
+    def __str__(self):
+        return 'BitSetException: ' + self.error_msg
+
 class BitSetObject(ctypes.c_void_p):
     def __init__(self, bitset_ptr):
         super().__init__(bitset_ptr)
@@ -58,6 +62,10 @@ class DecisionTreeNodeObject(ctypes.c_void_p):
     def __init__(self, decision_tree_node_ptr):
         super().__init__(decision_tree_node_ptr)
 
+class DecisionTreeLearnerObject(ctypes.c_void_p):
+    def __init__(self, decision_tree_learner_ptr):
+        super().__init__(decision_tree_learner_ptr)
+
 _loaded_lib = None
 
 def _lib():
@@ -69,6 +77,9 @@ def _lib():
             init(lib_dir)
             # also disable interception of SIGINT
             signal.signal(signal.SIGINT, signal.SIG_DFL)
+            num_threads = os.environ.get('EUSOLVER_NUM_THREADS', None)
+            if (num_threads != None):
+                eus_set_num_threads(int(num_threads))
         except Exception as e:
             print('Could not load libeusolver.so!')
             raise e
@@ -90,6 +101,8 @@ def _to_pystr(s):
 
 def init(path_to_lib):
     global _loaded_lib
+    # a CDLL (as opposed to a PyDLL) releases the GIL for the duration
+    # of every call, in particular while a decision tree is being learnt
     _loaded_lib = ctypes.CDLL(path_to_lib)
 
     _loaded_lib.eus_bitset_construct.argtypes = [ctypes.c_ulong, ctypes.c_bool]
@@ -208,12 +221,39 @@ def init(path_to_lib):
     _loaded_lib.eus_bitset_copy_in.argtypes = [BitSetObject, BitSetObject]
     _loaded_lib.eus_bitset_copy_in.restype = None
 
+    _loaded_lib.eus_bitset_construct_from_words.argtypes = [ctypes.c_ulong,
+                                                            ctypes.POINTER(ctypes.c_uint64),
+                                                            ctypes.c_ulong]
+    _loaded_lib.eus_bitset_construct_from_words.restype = BitSetObject
+
+    _loaded_lib.eus_bitset_construct_from_bools.argtypes = [ctypes.c_ulong, ctypes.c_char_p,
+                                                            ctypes.c_ulong]
+    _loaded_lib.eus_bitset_construct_from_bools.restype = BitSetObject
+
+    _loaded_lib.eus_bitset_get_num_words.argtypes = [BitSetObject]
+    _loaded_lib.eus_bitset_get_num_words.restype = ctypes.c_ulong
+
+    _loaded_lib.eus_bitset_export_words.argtypes = [BitSetObject,
+                                                    ctypes.POINTER(ctypes.c_uint64),
+                                                    ctypes.c_ulong]
+    _loaded_lib.eus_bitset_export_words.restype = None
+
+    _loaded_lib.eus_bitset_export_bools.argtypes = [BitSetObject, ctypes.c_char_p,
+                                                    ctypes.c_ulong]
+    _loaded_lib.eus_bitset_export_bools.restype = None
+
     _loaded_lib.eus_check_error.argtypes = []
     _loaded_lib.eus_check_error.restype = ctypes.c_bool
 
     _loaded_lib.eus_get_last_error_string.argtypes = []
     _loaded_lib.eus_get_last_error_string.restype = ctypes.c_char_p
 
+    _loaded_lib.eus_set_num_threads.argtypes = [ctypes.c_uint32]
+    _loaded_lib.eus_set_num_threads.restype = None
+
+    _loaded_lib.eus_get_num_threads.argtypes = []
+    _loaded_lib.eus_get_num_threads.restype = ctypes.c_uint32
+
     # decision tree traversal and ref counting
     _loaded_lib.eus_decision_tree_is_split_node.argtypes = [DecisionTreeNodeObject]
     _loaded_lib.eus_decision_tree_is_split_node.restype = ctypes.c_bool
@@ -250,6 +290,52 @@ def init(path_to_lib):
                                                                 ctypes.c_ulong, ctypes.c_ulong]
     _loaded_lib.eus_learn_decision_tree_for_ml_data.restype = DecisionTreeNodeObject
 
+    # incremental decision tree learning
+    _loaded_lib.eus_dt_learner_construct.argtypes = [ctypes.c_ulong]
+    _loaded_lib.eus_dt_learner_construct.restype = DecisionTreeLearnerObject
+
+    _loaded_lib.eus_dt_learner_destroy.argtypes = [DecisionTreeLearnerObject]
+    _loaded_lib.eus_dt_learner_destroy.restype = None
+
+    _loaded_lib.eus_dt_learner_get_num_points.argtypes = [DecisionTreeLearnerObject]
+    _loaded_lib.eus_dt_learner_get_num_points.restype = ctypes.c_ulong
+
+    _loaded_lib.eus_dt_learner_get_num_attributes.argtypes = [DecisionTreeLearnerObject]
+    _loaded_lib.eus_dt_learner_get_num_attributes.restype = ctypes.c_ulong
+
+    _loaded_lib.eus_dt_learner_get_num_labels.argtypes = [DecisionTreeLearnerObject]
+    _loaded_lib.eus_dt_learner_get_num_labels.restype = ctypes.c_ulong
+
+    _loaded_lib.eus_dt_learner_add_attributes.argtypes = [DecisionTreeLearnerObject,
+                                                          ctypes.POINTER(BitSetObject),
+                                                          ctypes.c_ulong]
+    _loaded_lib.eus_dt_learner_add_attributes.restype = None
+
+    _loaded_lib.eus_dt_learner_add_labels.argtypes = [DecisionTreeLearnerObject,
+                                                      ctypes.POINTER(BitSetObject),
+                                                      ctypes.c_ulong]
+    _loaded_lib.eus_dt_learner_add_labels.restype = None
+
+    _loaded_lib.eus_dt_learner_add_points.argtypes = [DecisionTreeLearnerObject,
+                                                      ctypes.POINTER(BitSetObject),
+                                                      ctypes.POINTER(BitSetObject),
+                                                      ctypes.c_ulong]
+    _loaded_lib.eus_dt_learner_add_points.restype = None
+
+    _loaded_lib.eus_dt_learner_set_entropy_cache_capacity.argtypes = [DecisionTreeLearnerObject,
+                                                                      ctypes.c_ulong]
+    _loaded_lib.eus_dt_learner_set_entropy_cache_capacity.restype = None
+
+    _loaded_lib.eus_dt_learner_clear_entropy_cache.argtypes = [DecisionTreeLearnerObject]
+    _loaded_lib.eus_dt_learner_clear_entropy_cache.restype = None
+
+    _loaded_lib.eus_dt_learner_get_entropy_cache_stats.argtypes = [DecisionTreeLearnerObject,
+                                                                   ctypes.POINTER(ctypes.c_uint64)]
+    _loaded_lib.eus_dt_learner_get_entropy_cache_stats.restype = None
+
+    _loaded_lib.eus_dt_learner_learn.argtypes = [DecisionTreeLearnerObject]
+    _loaded_lib.eus_dt_learner_learn.restype = DecisionTreeNodeObject
+
 def eus_check_error():
     return _lib().eus_check_error()
 
@@ -260,6 +346,16 @@ def _raise_exception_if_error():
     if (eus_check_error()):
         raise LibEUSolverException(eus_get_last_error_string())
 
+def eus_set_num_threads(a0):
+    r = _lib().eus_set_num_threads(a0)
+    _raise_exception_if_error()
+    return r
+
+def eus_get_num_threads():
+    r = _lib().eus_get_num_threads()
+    _raise_exception_if_error()
+    return r
+
 def eus_bitset_construct(a0, a1 = False):
     r = _lib().eus_bitset_construct(a0, a1)
     _raise_exception_if_error()
@@ -450,6 +546,31 @@ def eus_bitset_copy_in(a0, a1):
     _raise_exception_if_error()
     return r
 
+def eus_bitset_construct_from_words(a0, a1, a2):
+    r = _lib().eus_bitset_construct_from_words(a0, a1, a2)
+    _raise_exception_if_error()
+    return r
+
+def eus_bitset_construct_from_bools(a0, a1, a2):
+    r = _lib().eus_bitset_construct_from_bools(a0, a1, a2)
+    _raise_exception_if_error()
+    return r
+
+def eus_bitset_get_num_words(a0):
+    r = _lib().eus_bitset_get_num_words(a0)
+    _raise_exception_if_error()
+    return r
+
+def eus_bitset_export_words(a0, a1, a2):
+    r = _lib().eus_bitset_export_words(a0, a1, a2)
+    _raise_exception_if_error()
+    return r
+
+def eus_bitset_export_bools(a0, a1, a2):
+    r = _lib().eus_bitset_export_bools(a0, a1, a2)
+    _raise_exception_if_error()
+    return r
+
 def eus_decision_tree_is_split_node(a0):
     r = _lib().eus_decision_tree_is_split_node(a0)
     _raise_exception_if_error()
@@ -527,6 +648,84 @@ def eus_learn_decision_tree_for_ml_data(pred_signature_list,
 
     return DecisionTreeNode(r)
 
+def _to_bitset_object_array(bitset_list):
+    retval = (BitSetObject * len(bitset_list))()
+    for i in range(len(bitset_list)):
+        retval[i] = bitset_list[i].bitset_object
+    return retval
+
+def eus_dt_learner_construct(a0):
+    r = _lib().eus_dt_learner_construct(a0)
+    _raise_exception_if_error()
+    return r
+
+def eus_dt_learner_destroy(a0):
+    r = _lib().eus_dt_learner_destroy(a0)
+    _raise_exception_if_error()
+    return r
+
+def eus_dt_learner_get_num_points(a0):
+    r = _lib().eus_dt_learner_get_num_points(a0)
+    _raise_exception_if_error()
+    return r
+
+def eus_dt_learner_get_num_attributes(a0):
+    r = _lib().eus_dt_learner_get_num_attributes(a0)
+    _raise_exception_if_error()
+    return r
+
+def eus_dt_learner_get_num_labels(a0):
+    r = _lib().eus_dt_learner_get_num_labels(a0)
+    _raise_exception_if_error()
+    return r
+
+def eus_dt_learner_add_attributes(a0, pred_signature_list):
+    r = _lib().eus_dt_learner_add_attributes(a0, _to_bitset_object_array(pred_signature_list),
+                                             len(pred_signature_list))
+    _raise_exception_if_error()
+    return r
+
+def eus_dt_learner_add_labels(a0, term_signature_list):
+    r = _lib().eus_dt_learner_add_labels(a0, _to_bitset_object_array(term_signature_list),
+                                         len(term_signature_list))
+    _raise_exception_if_error()
+    return r
+
+def eus_dt_learner_add_points(a0, point_pred_signature_list, point_term_signature_list):
+    assert (len(point_pred_signature_list) == len(point_term_signature_list))
+    r = _lib().eus_dt_learner_add_points(a0,
+                                         _to_bitset_object_array(point_pred_signature_list),
+                                         _to_bitset_object_array(point_term_signature_list),
+                                         len(point_pred_signature_list))
+    _raise_exception_if_error()
+    return r
+
+def eus_dt_learner_set_entropy_cache_capacity(a0, a1):
+    r = _lib().eus_dt_learner_set_entropy_cache_capacity(a0, a1)
+    _raise_exception_if_error()
+    return r
+
+def eus_dt_learner_clear_entropy_cache(a0):
+    r = _lib().eus_dt_learner_clear_entropy_cache(a0)
+    _raise_exception_if_error()
+    return r
+
+_entropy_cache_stat_names = ['capacity', 'size', 'hits', 'misses', 'evictions']
+
+def eus_dt_learner_get_entropy_cache_stats(a0):
+    stats = (ctypes.c_uint64 * len(_entropy_cache_stat_names))()
+    _lib().eus_dt_learner_get_entropy_cache_stats(a0, stats)
+    _raise_exception_if_error()
+    return dict(zip(_entropy_cache_stat_names, stats))
+
+def eus_dt_learner_learn(a0):
+    r = _lib().eus_dt_learner_learn(a0)
+    _raise_exception_if_error()
+    if (r.value == None):
+        return None
+
+    return DecisionTreeNode(r)
+
 
 class BitSet(object):
     __slots__ = ['bitset_object', 'cached_hash_code']
@@ -719,6 +918,40 @@ class BitSet(object):
         self._check_mutability()
         eus_bitset_copy_in(self.bitset_object, other.bitset_object)
 
+    # Bulk construction and export. Words are 64-bit, with bit i of word j
+    # standing for element (64 * j + i); bools are one byte per element.
+    @classmethod
+    def from_words(cls, size_of_universe, words):
+        """words is either a sequence of ints or an object exporting a
+        buffer of 64-bit words (e.g., a numpy uint64 array)."""
+        if isinstance(words, (list, tuple)):
+            word_array = (ctypes.c_uint64 * len(words))(*words)
+        else:
+            raw = memoryview(words).cast('B')
+            assert (len(raw) % 8 == 0)
+            word_array = (ctypes.c_uint64 * (len(raw) // 8)).from_buffer_copy(raw)
+        return cls(eus_bitset_construct_from_words(size_of_universe, word_array,
+                                                   len(word_array)))
+
+    @classmethod
+    def from_bools(cls, size_of_universe, values):
+        """values is a bytes object, or anything bytes() accepts (a list of
+        bools, a numpy bool array, ...), with one entry per element."""
+        values = bytes(values)
+        return cls(eus_bitset_construct_from_bools(size_of_universe, values, len(values)))
+
+    def to_words(self):
+        num_words = eus_bitset_get_num_words(self.bitset_object)
+        word_array = (ctypes.c_uint64 * num_words)()
+        eus_bitset_export_words(self.bitset_object, word_array, num_words)
+        return list(word_array)
+
+    def to_bools(self):
+        size_of_universe = self.size_of_universe()
+        values = ctypes.create_string_buffer(size_of_universe)
+        eus_bitset_export_bools(self.bitset_object, values, size_of_universe)
+        return values.raw
+
 
 class DecisionTreeNode(object):
     def __init__(self, decision_tree_node_object):
@@ -773,6 +1006,67 @@ class DecisionTreeNode(object):
         return eus_decision_tree_to_string(self.decision_tree_node_object)
 
 
+class DecisionTreeLearner(object):
+    """A decision tree learner that retains the predicate and term signatures
+    it has been given, so that successive calls to learn() only need to be
+    passed what has been added since. Predicate (attribute) and term (label)
+    ids are assigned in the order in which they are added, and the tree
+    learnt is the one eus_learn_decision_tree_for_ml_data would learn on the
+    full lists.
+
+    Entropies of sets of points are memoized per learner, in a cache of
+    bounded capacity (entries, least recently used ones are evicted first;
+    zero disables the cache) that is dropped whenever labels or points are
+    added."""
+
+    __slots__ = ['learner_object']
+
+    def __init__(self, num_points, entropy_cache_capacity=None):
+        self.learner_object = eus_dt_learner_construct(num_points)
+        if entropy_cache_capacity is not None:
+            self.set_entropy_cache_capacity(entropy_cache_capacity)
+
+    def __del__(self):
+        eus_dt_learner_destroy(self.learner_object)
+
+    def num_points(self):
+        return eus_dt_learner_get_num_points(self.learner_object)
+
+    def num_attributes(self):
+        return eus_dt_learner_get_num_attributes(self.learner_object)
+
+    def num_labels(self):
+        return eus_dt_learner_get_num_labels(self.learner_object)
+
+    def add_attributes(self, pred_signature_list):
+        """Each signature is over the points currently known to the learner."""
+        eus_dt_learner_add_attributes(self.learner_object, pred_signature_list)
+
+    def add_labels(self, term_signature_list):
+        """Each signature is over the points currently known to the learner."""
+        eus_dt_learner_add_labels(self.learner_object, term_signature_list)
+
+    def add_points(self, point_pred_signature_list, point_term_signature_list):
+        """One bitset per new point, over the attributes and labels
+        currently known to the learner, respectively."""
+        eus_dt_learner_add_points(self.learner_object, point_pred_signature_list,
+                                  point_term_signature_list)
+
+    def set_entropy_cache_capacity(self, capacity):
+        eus_dt_learner_set_entropy_cache_capacity(self.learner_object, capacity)
+
+    def clear_entropy_cache(self):
+        eus_dt_learner_clear_entropy_cache(self.learner_object)
+
+    def get_entropy_cache_stats(self):
+        """Returns a dict with the capacity and size of the entropy cache,
+        and the number of hits, misses and evictions so far."""
+        return eus_dt_learner_get_entropy_cache_stats(self.learner_object)
+
+    def learn(self):
+        return eus_dt_learner_learn(self.learner_object)
+
+
 ################################################################################
 # TEST CASES
 ################################################################################
@@ -911,8 +1205,116 @@ def test_bitsets():
     a.add(0)
     assert (a.is_full())
 
+    a = BitSet(200)
+    a.add(0)
+    a.add(65)
+    a.add(199)
+    words = a.to_words()
+    assert (words == [1, 2, 0, 1 << 7])
+    assert (BitSet.from_words(200, words) == a)
+    assert (BitSet.from_words(200, [1]) == BitSet.from_bools(200, [True]))
+    bools = a.to_bools()
+    assert (len(bools) == 200 and bools[65] == 1 and bools[64] == 0)
+    assert (BitSet.from_bools(200, bools) == a)
+    assert (hash(BitSet.from_bools(200, bools)) == hash(a))
+    try:
+        BitSet.from_words(10, [1 << 10])
+        assert False
+    except LibEUSolverException as e:
+        pass
+
+def test_incremental_decision_tree_learning():
+    def bitset(size, elems):
+        return BitSet.from_bools(size, [i in elems for i in range(size)])
+
+    # points 0..5, terms each work on half the points
+    preds = [bitset(6, {0, 1, 2}), bitset(6, {0, 3}), bitset(6, {1, 3, 5})]
+    terms = [bitset(6, {0, 1, 2}), bitset(6, {3, 4, 5})]
+
+    learner = DecisionTreeLearner(6)
+    learner.add_attributes(preds[2:])
+    learner.add_labels(terms)
+    assert (learner.learn() is None)
+
+    learner.add_attributes(preds[:2])
+    dt = learner.learn()
+    assert (dt is not None and dt.is_split())
+    # attribute ids follow the order in which attributes were added
+    assert (dt.get_split_attribute_id() == 1)
+    expected = eus_learn_decision_tree_for_ml_data(preds[2:] + preds[:2], terms)
+    assert (str(dt) == str(expected))
+
+    # a new point, where only the first predicate holds and only the
+    # second term works
+    learner.add_points([bitset(3, {1})], [bitset(2, {1})])
+    assert (learner.num_points() == 7)
+    new_preds = [bitset(7, {1, 3, 5}), bitset(7, {0, 1, 2, 6}), bitset(7, {0, 3})]
+    new_terms = [bitset(7, {0, 1, 2}), bitset(7, {3, 4, 5, 6})]
+    new_term = bitset(7, {6})
+    learner.add_labels([new_term])
+    assert (learner.num_labels() == 3)
+    expected = eus_learn_decision_tree_for_ml_data(new_preds, new_terms + [new_term])
+    dt = learner.learn()
+    assert (str(dt) == str(expected))
+
+    try:
+        learner.add_attributes([bitset(6, {0})])
+        assert False
+    except LibEUSolverException as e:
+        pass
+
+    # the entropy cache is bounded, and is only an optimization
+    stats = learner.get_entropy_cache_stats()
+    assert (stats['misses'] > 0 and stats['size'] <= stats['capacity'])
+    learner.set_entropy_cache_capacity(1)
+    assert (learner.get_entropy_cache_stats()['size'] <= 1)
+    learner.add_attributes([bitset(7, {2, 4, 6})])
+    dt = learner.learn()
+    stats = learner.get_entropy_cache_stats()
+    assert (stats['size'] <= 1 and stats['evictions'] > 0)
+    learner.clear_entropy_cache()
+    assert (learner.get_entropy_cache_stats()['size'] == 0)
+    uncached_learner = DecisionTreeLearner(7, entropy_cache_capacity=0)
+    uncached_learner.add_attributes(new_preds + [bitset(7, {2, 4, 6})])
+    uncached_learner.add_labels(new_terms + [new_term])
+    assert (str(uncached_learner.learn()) == str(dt))
+    assert (uncached_learner.get_entropy_cache_stats()['size'] == 0)
+
+def test_parallel_decision_tree_learning():
+    import random
+    import threading
+    rng = random.Random(42)
+    num_points = 200
+    def random_bitset():
+        return BitSet.from_bools(num_points, [rng.random() < 0.5 for i in range(num_points)])
+    preds = [random_bitset() for i in range(300)]
+    # every point is covered by some term
+    terms = [random_bitset() for i in range(20)]
+    terms.append(BitSet.from_bools(num_points, [True] * (num_points // 2)))
+
+    old_num_threads = eus_get_num_threads()
+    eus_set_num_threads(1)
+    expected = str(eus_learn_decision_tree_for_ml_data(preds, terms))
+    eus_set_num_threads(4)
+    assert (eus_get_num_threads() == 4)
+    assert (str(eus_learn_decision_tree_for_ml_data(preds, terms)) == expected)
+
+    # learners used from several python threads at once
+    results = []
+    def learn():
+        results.append(str(eus_learn_decision_tree_for_ml_data(preds, terms)))
+    threads = [threading.Thread(target=learn) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert (results == [expected] * 3)
+    eus_set_num_threads(old_num_threads)
+
 if __name__ == '__main__':
     test_bitsets()
+    test_incremental_decision_tree_learning()
+    test_parallel_decision_tree_learning()
 
 
 #
@@ -91,6 +91,20 @@ static inline void run_bitset_tests(eusolver::BitSet* bitset)
 
     assert(!copy.is_full());
     assert(copy.is_empty());
+
+    // bulk import/export
+    std::vector<u64> words(bitset->get_num_words());
+    bitset->export_words(words.data(), words.size());
+    copy.assign_words(words.data(), words.size());
+    assert(copy == *bitset);
+
+    std::vector<eusolver::u08> values(bitset->get_size_of_universe());
+    bitset->export_bools(values.data(), values.size());
+    assert(values[0] == 1 && values[1] == 0 && values[3] == 1 && values[5] == 1);
+    copy.clear_all();
+    copy.assign_bools(values.data(), values.size());
+    assert(copy == *bitset);
+    assert(copy.hash() == bitset->hash());
 }
 
 int main()
@@ -98,6 +112,9 @@ int main()
     auto bitset_a = new eusolver::BitSet(96);
     run_bitset_tests(bitset_a);
 
+    auto bitset_c = new eusolver::BitSet(200);
+    run_bitset_tests(bitset_c);
+
     eusolver::BitSet bitset_b(1);
     bitset_b.set_bit(0);
     assert(bitset_b.is_full());